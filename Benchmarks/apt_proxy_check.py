@@ -0,0 +1,92 @@
+"""
+Checks a site apt cache against a local HTTP stand-in repository:
+
+    python -m Benchmarks.apt_proxy_check --proxy http://110.34.35.16:3142 \
+        --advertise 10.0.0.5
+
+The stand-in serves a Release file and a fake .deb from the control node,
+throttled to `--wan-kbps` like a site WAN link. Each file is fetched twice
+through the proxy, as the first and second host of a site would. With a working
+cache the stand-in serves every file once and the second fetch runs at LAN speed.
+Without --proxy the files are fetched directly, as a baseline.
+"""
+
+import argparse
+import http.server
+import os
+import threading
+import time
+import urllib.request
+
+FILES = {
+    "/ubuntu/dists/stable/Release": b"Origin: p100x stand-in\nSuite: stable\n",
+    "/ubuntu/pool/main/s/standin/standin_1.0_amd64.deb": os.urandom(4 * 1024**2),
+}
+
+
+class StandInRepo(http.server.BaseHTTPRequestHandler):
+    wan_kbps = 8000
+    served = {}
+
+    def do_GET(self):
+        body = FILES.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.served[self.path] = self.served.get(self.path, 0) + 1
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Last-Modified", self.date_time_string(0))
+        self.end_headers()
+
+        chunk = 64 * 1024
+        for start in range(0, len(body), chunk):
+            self.wfile.write(body[start : start + chunk])
+            time.sleep(chunk * 8 / 1000 / self.wan_kbps)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fetch(url, proxy):
+    handlers = [urllib.request.ProxyHandler({"http": proxy} if proxy else {})]
+    opener = urllib.request.build_opener(*handlers)
+    start = time.time()
+    with opener.open(url, timeout=120) as response:
+        size = len(response.read())
+    return size, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--proxy", help="apt cache URL, e.g. http://host:3142")
+    parser.add_argument(
+        "--advertise", default="127.0.0.1", help="Address the proxy reaches us on"
+    )
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--wan-kbps", type=int, default=8000)
+    args = parser.parse_args()
+
+    StandInRepo.wan_kbps = args.wan_kbps
+    server = http.server.ThreadingHTTPServer(("0.0.0.0", args.port), StandInRepo)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    origin = f"http://{args.advertise}:{server.server_address[1]}"
+
+    cached = True
+    for path in FILES:
+        for attempt in ("first host", "second host"):
+            size, seconds = fetch(origin + path, args.proxy)
+            print(f"{attempt:<12} {path}: {size} bytes in {seconds:.2f}s")
+        served = StandInRepo.served.get(path, 0)
+        print(f"{'':<12} served by the stand-in {served} time(s)")
+        cached = cached and served == 1
+
+    server.shutdown()
+    if args.proxy:
+        print("Cache OK" if cached else "Cache MISSED: the stand-in served repeats")
+    raise SystemExit(0 if cached or not args.proxy else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Measures how a playbook scales with the size of the fleet, against local stand-ins:
+
+    python -m Benchmarks.fleet_scaling Deploy/master_image_v3.3.py \
+        --hosts 1 8 32 --delay 40ms --rate 20mbit -- --data apt_coalesce=true
+    python -m Benchmarks.fleet_scaling Deploy/master_image_v3.3.py --hosts 8 --compare
+
+Every stand-in is a container of Benchmarks/fleet_host (sshd, passwordless sudo,
+Ubuntu 22.04) with netem on its interface for the delay and bandwidth of an edge
+box link. For each fleet size the stand-ins are started fresh and the playbook
+runs once through pyinfra over SSH, with OperationTimer on and every fact
+gathered again. The wall time, the per-host time from OperationTimer and the CPU
+time and peak memory of the pyinfra process are appended, with the git commit,
+to Benchmarks/results/fleet_scaling.jsonl.
+
+--compare checks each result against the latest one of another commit with the
+same playbook and settings, and exits 1 when one got slower than --threshold.
+
+Stand-ins have no GPU and no Docker daemon: playbooks needing them fail at their
+first such operation, which the results record in 'returncode'.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+RESULTS = ROOT / "Benchmarks/results/fleet_scaling.jsonl"
+HOST_IMAGE = "p100x-fleet-host:latest"
+HOST_LABEL = "p100x.fleet-bench"
+
+# Compared between commits, lower is better
+METRICS = ("wall_seconds", "host_seconds_max", "cpu_seconds", "max_rss_mb")
+
+
+def git_commit():
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    ).stdout.strip()
+    dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=ROOT).returncode
+    return f"{commit}-dirty" if dirty else commit
+
+
+def docker(*args):
+    return subprocess.run(
+        ["docker", *args], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def build_host_image():
+    docker("build", "-q", "-t", HOST_IMAGE, str(ROOT / "Benchmarks/fleet_host"))
+
+
+def remove_hosts():
+    containers = docker("ps", "-aq", "--filter", f"label={HOST_LABEL}").split()
+    if containers:
+        docker("rm", "-f", *containers)
+
+
+def start_hosts(count, public_key, delay=None, rate=None):
+    """Starts `count` stand-ins and returns their (name, address) pairs."""
+    netem = ["netem"]
+    if delay:
+        netem += ["delay", delay]
+    if rate:
+        netem += ["rate", rate]
+
+    hosts = []
+    for index in range(count):
+        name = f"p100x-bench-{index}"
+        options = ["--name", name, "--hostname", name, "--label", HOST_LABEL]
+        options += ["--cap-add", "NET_ADMIN", "-e", f"AUTHORIZED_KEY={public_key}"]
+        docker("run", "-d", *options, HOST_IMAGE)
+        if len(netem) > 1:
+            docker("exec", name, "tc", "qdisc", "add", "dev", "eth0", "root", *netem)
+        address = docker(
+            "inspect",
+            "-f",
+            "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}",
+            name,
+        )
+        hosts.append((name, address))
+    return hosts
+
+
+def wait_for_ssh(hosts, timeout=60):
+    deadline = time.time() + timeout
+    for name, address in hosts:
+        while True:
+            try:
+                socket.create_connection((address, 22), timeout=2).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError(f"{name} ({address}) did not start sshd")
+                time.sleep(0.5)
+
+
+def write_inventory(path, hosts, key_file):
+    data = {
+        "ssh_user": "bench",
+        "ssh_key": str(key_file),
+        "ssh_strict_host_key_checking": "no",
+        "ssh_known_hosts_file": "/dev/null",
+    }
+    inventory = [(name, {"ssh_hostname": address, **data}) for name, address in hosts]
+    Path(path).write_text(f"hosts = {inventory!r}\n")
+
+
+def run_playbook(inventory, deploy_file, timings_file, log_file, pyinfra_args):
+    """Runs pyinfra once and returns its exit code, wall time and rusage."""
+    env = {
+        **os.environ,
+        "P100X_OP_TIMING": "1",
+        "P100X_OP_TIMING_FILE": str(timings_file),
+        "P100X_OP_TIMING_PROM": str(Path(timings_file).with_suffix(".prom")),
+        "P100X_REFRESH_FACTS": "1",
+    }
+    command = [sys.executable, "-m", "pyinfra", "-y", str(inventory), deploy_file]
+    with open(log_file, "w") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            command + pyinfra_args, cwd=ROOT, env=env, stdout=log, stderr=log
+        )
+        # wait4 rather than wait, for the CPU time and peak RSS of the run
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, wall, usage
+
+
+def host_seconds(timings_file):
+    """Total operation time of each host, from the OperationTimer JSON lines."""
+    totals = {}
+    try:
+        lines = Path(timings_file).read_text().splitlines()
+    except OSError:
+        return totals
+    for line in lines:
+        record = json.loads(line)
+        totals[record["host"]] = totals.get(record["host"], 0) + record["duration"]
+    return totals
+
+
+def benchmark(count, args, pyinfra_args, workdir):
+    remove_hosts()
+    hosts = start_hosts(count, args.public_key, delay=args.delay, rate=args.rate)
+    try:
+        wait_for_ssh(hosts)
+        inventory = workdir / f"inventory_{count}.py"
+        timings_file = workdir / f"timings_{count}.jsonl"
+        write_inventory(inventory, hosts, args.key_file)
+        returncode, wall, usage = run_playbook(
+            inventory,
+            args.deploy_file,
+            timings_file,
+            workdir / f"pyinfra_{count}.log",
+            pyinfra_args,
+        )
+    finally:
+        remove_hosts()
+
+    per_host = host_seconds(timings_file)
+    return {
+        "deploy": args.deploy_file,
+        "hosts": count,
+        "delay": args.delay,
+        "rate": args.rate,
+        "pyinfra_args": pyinfra_args,
+        "returncode": returncode,
+        "wall_seconds": round(wall, 3),
+        "host_seconds_max": round(max(per_host.values(), default=0), 3),
+        "host_seconds_mean": round(statistics.fmean(per_host.values() or [0]), 3),
+        "hosts_timed": len(per_host),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        # ru_maxrss is in KiB on Linux
+        "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def same_settings(one, other):
+    keys = ("deploy", "hosts", "delay", "rate", "pyinfra_args")
+    return all(one.get(key) == other.get(key) for key in keys)
+
+
+def compare(results, previous, threshold):
+    """
+    Prints each result against the latest one of another commit with the same
+    settings. Returns False if any metric regressed by more than `threshold`.
+    """
+    passed = True
+    for result in results:
+        baselines = [
+            old
+            for old in previous
+            if same_settings(old, result) and old["commit"] != result["commit"]
+        ]
+        if not baselines:
+            print(f"{result['hosts']} hosts: no baseline from another commit")
+            continue
+        baseline = baselines[-1]
+        print(f"{result['hosts']} hosts, {baseline['commit']} -> {result['commit']}:")
+        for metric in METRICS:
+            before, after = baseline[metric], result[metric]
+            change = (after - before) / before if before else 0
+            regressed = change > threshold
+            passed = passed and not regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"  {metric:<18}{before:>10}{after:>10}{change:>+9.1%}{flag}")
+    return passed
+
+
+def load_results():
+    try:
+        lines = RESULTS.read_text().splitlines()
+    except OSError:
+        return []
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("deploy_file")
+    parser.add_argument("--hosts", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--delay", help="netem delay per host, e.g. 40ms")
+    parser.add_argument("--rate", help="netem bandwidth per host, e.g. 20mbit")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Slowdown counted as regression"
+    )
+    parser.add_argument(
+        "--skip-build", action="store_true", help=f"Reuse the {HOST_IMAGE} image"
+    )
+
+    # Everything after "--" is passed through to pyinfra
+    argv, pyinfra_args = sys.argv[1:], []
+    if "--" in argv:
+        argv, pyinfra_args = argv[: argv.index("--")], argv[argv.index("--") + 1 :]
+    args = parser.parse_args(argv)
+
+    if not args.skip_build:
+        build_host_image()
+
+    previous = load_results()
+    commit = git_commit()
+    timestamp = int(time.time())
+    results = []
+    with tempfile.TemporaryDirectory(prefix="p100x-fleet-") as workdir:
+        workdir = Path(workdir)
+        args.key_file = workdir / "id_ed25519"
+        subprocess.run(
+            ["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-f", str(args.key_file)],
+            check=True,
+        )
+        args.public_key = args.key_file.with_suffix(".pub").read_text().strip()
+
+        RESULTS.parent.mkdir(parents=True, exist_ok=True)
+        print(f"{'HOSTS':>6}{'WALL':>9}{'HOST MAX':>10}{'CPU':>8}{'RSS MB':>9}  EXIT")
+        for count in args.hosts:
+            result = benchmark(count, args, pyinfra_args, workdir)
+            result.update(commit=commit, timestamp=timestamp)
+            results.append(result)
+            with open(RESULTS, "a") as results_file:
+                results_file.write(json.dumps(result) + "\n")
+            print(
+                f"{count:>6}{result['wall_seconds']:>9.1f}"
+                f"{result['host_seconds_max']:>10.1f}{result['cpu_seconds']:>8.1f}"
+                f"{result['max_rss_mb']:>9.1f}  {result['returncode']}"
+            )
+            if result["returncode"]:
+                log = (workdir / f"pyinfra_{count}.log").read_text().splitlines()
+                print("\n".join(f"        {line}" for line in log[-5:]))
+
+    if args.compare and not compare(results, previous, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Measures what importing each Operations module costs on the control node, and
+how many remote calls a playbook makes before its first operation:
+
+    python -m Benchmarks.import_startup
+    python -m Benchmarks.import_startup --deploy Deploy/reconcile_apps.py
+
+Every module and playbook is loaded in a fresh interpreter, inside a pyinfra
+state holding a single @local host, counting Host.get_fact calls and the remote
+commands (Host.run_shell_command) they trigger. Results are appended to
+Benchmarks/results/import_startup.jsonl.
+
+Operations/openVPN_server/set_vpn_server.py is a playbook stored under
+Operations, not an importable module, so it is left out.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+RESULTS = ROOT / "Benchmarks/results/import_startup.jsonl"
+
+
+def operations_modules():
+    return sorted(
+        f"Operations.{path.stem}"
+        for path in (ROOT / "Operations").glob("*.py")
+        if path.stem != "__init__"
+    )
+
+
+def probe(target):
+    """
+    Loads one module ('module:Operations.X') or playbook ('deploy:path') and
+    returns its load time and call counts. Runs in the child interpreter.
+    """
+    from pyinfra.api import Config, Inventory, State
+    from pyinfra.api.connect import connect_all
+    from pyinfra.api.host import Host
+    from pyinfra.context import ctx_config, ctx_host, ctx_inventory, ctx_state
+    from pyinfra_cli.util import exec_file
+
+    inventory = Inventory((["@local"], {}))
+    state = State(inventory, Config())
+    connect_all(state)
+    local_host = inventory.get_host("@local")
+
+    counts = {"get_fact": 0, "run_shell_command": 0, "remote_before_first_op": 0}
+
+    def counting(method):
+        original = getattr(Host, method)
+
+        def wrapper(self, *args, **kwargs):
+            counts[method] += 1
+            if method == "run_shell_command" and not state.op_meta:
+                counts["remote_before_first_op"] += 1
+            return original(self, *args, **kwargs)
+
+        setattr(Host, method, wrapper)
+
+    counting("get_fact")
+    counting("run_shell_command")
+
+    kind, name = target.split(":", 1)
+    result = {"kind": kind, "name": name, "error": None}
+    start = time.perf_counter()
+    with ctx_state.use(state), ctx_inventory.use(inventory):
+        with ctx_config.use(state.config.copy()), ctx_host.use(local_host):
+            try:
+                if kind == "module":
+                    __import__(name)
+                else:
+                    exec_file(name, is_deploy_code=True)
+            except Exception as error:
+                result["error"] = f"{type(error).__name__}: {error}"
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    result["operations"] = len(state.op_meta)
+    result.update(counts)
+    return result
+
+
+def run_probe(target):
+    completed = subprocess.run(
+        [sys.executable, "-m", "Benchmarks.import_startup", "--probe", target],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode or not lines:
+        kind, name = target.split(":", 1)
+        error = (completed.stderr.strip().splitlines() or ["no output"])[-1]
+        return {"kind": kind, "name": name, "error": error}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--deploy", nargs="*", default=[], help="Playbooks to load")
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args.probe)))
+        return
+
+    targets = [f"module:{module}" for module in operations_modules()]
+    targets += [f"deploy:{deploy}" for deploy in args.deploy]
+
+    timestamp = int(time.time())
+    RESULTS.parent.mkdir(parents=True, exist_ok=True)
+    print(f"{'TARGET':<45}{'SECONDS':>9}{'FACTS':>7}{'REMOTE':>8}{'BEFORE OP':>11}")
+    with open(RESULTS, "a") as results:
+        for target in targets:
+            result = run_probe(target)
+            results.write(json.dumps({**result, "timestamp": timestamp}) + "\n")
+            if result["error"]:
+                print(f"{result['name']:<45} error: {result['error']}")
+                continue
+            print(
+                f"{result['name']:<45}{result['seconds']:>9.3f}"
+                f"{result['get_fact']:>7}{result['run_shell_command']:>8}"
+                f"{result['remote_before_first_op']:>11}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Stands up the site apt cache on the host named by `apt_proxy`, set per site in
+the inventory or for the whole run:
+
+    pyinfra Inventories/on_production.py Deploy/apt_cache_proxy.py \
+        --data apt_proxy=110.34.35.16
+
+Playbooks run afterwards with the same `apt_proxy` download through it, so only
+the first host of the site fetches a package over the WAN link.
+"""
+
+from pyinfra import host
+
+from Operations.AptCacheProxy import AptCacheProxy
+from Operations.FactCache import FactCache
+from Operations.OperationTimer import OperationTimer
+
+FactCache.install()
+OperationTimer.install()
+
+apt_proxy = host.data.get("apt_proxy")
+if apt_proxy:
+    AptCacheProxy(apt_proxy).install_server()
+else:
+    print(f"No apt_proxy set for {host.name}, nothing to do.")
@@ -0,0 +1,50 @@
+"""
+Builds p100x-app once, on a builder node, and ships that exact image to the fleet:
+
+    pyinfra Inventories/on_production.py Deploy/build_and_distribute.py \
+        --data builder=110.34.35.16 --data distribution_mode=stream
+
+The build context (Dockerfile, app/ and temp/deepstream_sdk.deb) is expected in
+~admin_sumato/akira-edge on the builder only. Every other host verifies the image
+ID recorded on the builder and tags it, it never builds.
+"""
+
+from pyinfra import host, inventory
+
+from Operations.akira_edge_manager import AkiraEdgeManager
+from Operations.FactCache import FactCache
+from Operations.ImageDistributor import ImageDistributor
+from Operations.OperationTimer import OperationTimer
+
+FactCache.install()
+OperationTimer.install()
+
+ALL_HOSTS = [fleet_host.name for fleet_host in inventory]
+BUILDER = host.data.get("builder", ALL_HOSTS[0])
+
+# direct needs the tar on the control node, so the builder ships it itself by default
+DISTRIBUTION_MODE = host.data.get("distribution_mode", "stream")
+
+distributor = ImageDistributor(
+    AkiraEdgeManager.DOCKER_IMAGE_NAME,
+    ALL_HOSTS,
+    source=BUILDER,
+    ssh_user=host.data.get("relay_ssh_user"),
+    registry_host=host.data.get("registry_host"),
+    apt_proxy=host.data.get("apt_proxy"),
+)
+
+# --- Build on the builder node only, skipped if the context did not change ---
+if host.name == BUILDER:
+    AkiraEdgeManager().build_image()
+
+distributor.record_image_id()
+
+# --- Ship the image to the rest of the fleet ---
+distributor.reset_log()
+distributor.start_benchmark()
+distributor.distribute(DISTRIBUTION_MODE)
+distributor.finish_benchmark(DISTRIBUTION_MODE)
+
+# --- Every host, builder included, checks it runs the recorded image ---
+distributor.verify_image_id()
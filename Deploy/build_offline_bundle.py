@@ -0,0 +1,47 @@
+"""
+Builds the offline provisioning bundle on a builder host with internet access,
+running the same Ubuntu release as the fleet and holding the p100x-app image:
+
+    pyinfra Inventories/on_production.py Deploy/build_offline_bundle.py \
+        --data builder=110.34.35.16
+
+The bundle lands in Bundles/p100x-bundle-<id>.tar on the control node, ready
+for Deploy/install_offline_bundle.py. The Azure assets fetched by
+fetch_sensitives.py are secrets and stay out of it, only azcopy is bundled.
+"""
+
+from pyinfra import host, inventory
+
+from Operations.AptTransaction import AptTransaction
+from Operations.DockerNvidiaSetup import DockerNvidiaSetup
+from Operations.FactCache import FactCache
+from Operations.OfflineBundle import OfflineBundle
+from Operations.OperationTimer import OperationTimer
+from Operations.TigerVNCServerSetup import TigerVNCServerSetup
+
+FactCache.install()
+OperationTimer.install()
+
+BUILDER = host.data.get("builder", [fleet_host.name for fleet_host in inventory][0])
+
+transaction = AptTransaction()
+DockerNvidiaSetup(host).declare_packages(transaction)
+TigerVNCServerSetup().declare_packages(transaction)
+
+# Dynamic wallpaper of master_image_v3.3
+transaction.add_packages(["imagemagick", "fonts-dejavu-core"])
+
+# azcopy, installed by fetch_sensitives.py from Microsoft's repository
+transaction.add_key(
+    "https://packages.microsoft.com/keys/microsoft.asc",
+    "/etc/apt/keyrings/microsoft.asc",
+)
+transaction.add_repo(
+    "microsoft-prod.list",
+    "deb [arch=amd64 signed-by=/etc/apt/keyrings/microsoft.asc] "
+    "https://packages.microsoft.com/ubuntu/22.04/prod jammy main",
+)
+transaction.add_packages(["azcopy"])
+
+if host.name == BUILDER:
+    OfflineBundle(transaction).build()
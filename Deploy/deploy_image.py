@@ -1,13 +1,12 @@
-import os
 from pyinfra import host
-from pyinfra.operations import files, server
+
+from Operations.ImageDistributor import ImageDistributor
+from Operations.OperationTimer import OperationTimer
 
 IMAGE_NAME = "p100x-app:2.0.0"
-TAR_FILENAME = f"{IMAGE_NAME.replace(':', '_')}.tar"
-TAR_PATH = os.path.join("/tmp", TAR_FILENAME)
 
 ALL_HOSTS = [
-    "110.34.35.16", #Cond
+    "110.34.35.16",  # Cond
     "110.70.35.252",
     "110.66.36.40",
     "10.113.134.34",
@@ -17,33 +16,27 @@ ALL_HOSTS = [
     "110.47.35.28",
 ]
 
-# --- Save the Docker image to a .tar file on the current host ---
-server.shell(
-    name=f"Save {IMAGE_NAME} to {TAR_FILENAME}",
-    commands=[f"docker save -o /tmp/{TAR_FILENAME} {IMAGE_NAME}"]
-)
+# direct, tree, delta, stream or registry, see ImageDistributor.distribute
+# pyinfra ... deploy_image.py --data distribution_mode=tree
+# registry mode: --data registry_host=<inventory host>, or the address the fleet
+# reaches the control node at to run the registry there
+DISTRIBUTION_MODE = host.data.get("distribution_mode", "direct")
 
-# --- Push the .tar file to all other hosts  ---
-for remote_host_name in ALL_HOSTS:
-    if remote_host_name != host.name:
-        files.put(
-            name=f"Push {IMAGE_NAME} to {remote_host_name}",
-            src=TAR_PATH,
-            dest=TAR_PATH,
-            _sudo=True
-        )
-
-# --- Load the image on all hosts ---
-server.shell(
-    name=f"Load {IMAGE_NAME} from {TAR_FILENAME}",
-    commands=[f"docker load -i {TAR_PATH} "]
-)
+OperationTimer.install()
 
-# --- Clean up the tar file to save disk space ---
-print(f"Cleaning up tar file on {host.name}...")
-files.file(
-    name=f"Remove {TAR_FILENAME}",
-    path=TAR_PATH,
-    present=False,
-    _sudo=True
+distributor = ImageDistributor(
+    IMAGE_NAME,
+    ALL_HOSTS,
+    ssh_user=host.data.get("relay_ssh_user"),
+    registry_host=host.data.get("registry_host"),
+    apt_proxy=host.data.get("apt_proxy"),
 )
+distributor.reset_log()
+distributor.start_benchmark()
+
+distributor.distribute(DISTRIBUTION_MODE)
+
+distributor.finish_benchmark(DISTRIBUTION_MODE)
+
+if DISTRIBUTION_MODE not in ("direct", "registry"):
+    distributor.report_throughput()
@@ -0,0 +1,32 @@
+"""
+Provisions hosts of an air-gapped site from an offline bundle, without any
+network access from the hosts:
+
+    pyinfra Inventories/on_production.py Deploy/install_offline_bundle.py \
+        --data bundle=Bundles/p100x-bundle-<id>.tar
+
+Without `bundle`, the most recent bundle of Bundles/ is used.
+"""
+
+from pathlib import Path
+
+from pyinfra import host
+
+from Operations.FactCache import FactCache
+from Operations.OfflineBundle import BUNDLES_DIR, OfflineBundle
+from Operations.OperationTimer import OperationTimer
+
+FactCache.install()
+OperationTimer.install()
+
+bundle = host.data.get("bundle")
+if not bundle:
+    bundles = sorted(
+        BUNDLES_DIR.glob("p100x-bundle-*.tar"), key=lambda p: p.stat().st_mtime
+    )
+    bundle = bundles[-1] if bundles else None
+
+if bundle and Path(bundle).exists():
+    OfflineBundle.install(bundle)
+else:
+    print(f"No offline bundle found for {host.name}, build one first.")
@@ -3,6 +3,14 @@ from pathlib import Path
 from pyinfra.operations import files
 
 from Operations.DeployService import DeployService
+from Operations.FactCache import FactCache
+from Operations.NetworkProfiles import NetworkProfiles
+from Operations.OperationTimer import OperationTimer
+
+# --data refresh_facts=true gathers every fact again
+FactCache.install()
+# --data op_timing=true times every operation on every host
+OperationTimer.install()
 
 script_dir = Path(__file__).parent
 current_script_dir = Path(__file__).parent
@@ -12,18 +20,23 @@ proj_root = current_script_dir.parent
 Deploy the on-startup network configuration script and systemd service.
 """
 
-script = str((proj_root / "Resources/set_network.sh").absolute())
+script = str((proj_root / "Resources/set_network_agent.py").absolute())
 service_src = str((proj_root / "Resources/set_network.service").absolute())
 net_config_file = str((proj_root / "Resources/network_config.csv").absolute())
 
-files.put(
-    name="Placing network conf file onto /usr/local/bin",
-    src=net_config_file,
-    dest="/usr/local/bin/network_config.csv",
-    _sudo=True,
-    mode="755",
-    force=True,
-)
+# Only this host's connections, as NetworkManager keyfiles
+profiles = NetworkProfiles(net_config_file).deploy()
 
-ip_automation = DeployService(shellFileSrc=script, serviceFileSrc=service_src)
+for former in ("set_network.sh", "network_config.csv"):
+    files.file(
+        name=f"Removing the former {former}",
+        path=f"/usr/local/bin/{former}",
+        present=False,
+        _sudo=True,
+    )
+
+# The agent only applies the profiles when it runs, restart it on a change
+ip_automation = DeployService(
+    shellFileSrc=script, serviceFileSrc=service_src, restart_on=profiles
+)
 ip_automation.deploy()
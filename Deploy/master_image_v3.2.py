@@ -1,21 +1,59 @@
 from pyinfra import host
 from pyinfra.operations import apt, server
 
+from Operations.AptTransaction import AptTransaction
 from Operations.DockerNvidiaSetup import DockerNvidiaSetup
+from Operations.FactCache import APT_FACTS, FactCache, invalidate_on_change
+from Operations.OperationTimer import OperationTimer
+from Operations.RebootManager import RebootManager
+from Operations.StepTimer import StepTimer
 
+# --data refresh_facts=true gathers every fact again
+FactCache.install()
+# --data op_timing=true times every operation on every host
+OperationTimer.install()
 
-docker_setup = DockerNvidiaSetup(host)
+# --data apt_coalesce=false runs the former step by step setup, to compare timings
+APT_COALESCE = str(host.data.get("apt_coalesce", True)).lower() not in ("false", "0")
 
-"""Run all Docker and NVIDIA setup tasks in order."""
-docker_setup.install_necessary_packages()
-docker_setup.add_docker_gpg_key()
-docker_setup.add_docker_repo()
-apt.packages(name="Package update", latest=True)
-docker_setup.install_docker_packages()
-docker_setup.add_user_docker_group()
+# --data apt_proxy=<site cache host> downloads through Deploy/apt_cache_proxy.py
+APT_PROXY = host.data.get("apt_proxy")
+
+# --data reboot=true reboots the hosts that need it once the driver and toolkit are
+# in. Batch it through the rollout to bound the downtime:
+#   python -m Deploy.rollout Deploy/master_image_v3.2.py -- --data reboot=true
+REBOOT = str(host.data.get("reboot", False)).lower() in ("1", "true", "yes")
 
-docker_setup.install_nvidia_driver()
+docker_setup = DockerNvidiaSetup(host, apt_proxy=APT_PROXY)
+timer = StepTimer()
 
-docker_setup.install_nvidia_container_toolkit()
+"""Run all Docker and NVIDIA setup tasks in order."""
+if APT_COALESCE:
+    # One repo setup, one apt-get update and one install for the whole image
+    timer.mark("apt transaction")
+    transaction = AptTransaction(apt_proxy=APT_PROXY)
+    docker_setup.declare_packages(transaction)
+    transaction.apply()
+else:
+    timer.mark("necessary packages")
+    docker_setup.install_necessary_packages()
+    timer.mark("docker repository")
+    docker_setup.add_docker_gpg_key()
+    docker_setup.add_docker_repo()
+    package_update = apt.packages(name="Package update", latest=True)
+    invalidate_on_change(package_update, *APT_FACTS)
+    timer.mark("docker packages")
+    docker_setup.install_docker_packages()
+    timer.mark("nvidia driver")
+    docker_setup.install_nvidia_driver()
+    timer.mark("nvidia container toolkit")
+    docker_setup.install_nvidia_container_toolkit()
+
+timer.mark("docker group")
+docker_setup.add_user_docker_group()
+timer.report()
 
-server.shell(name="A reboot is compulsory", commands=['echo "Reboot is a must"'])
+if REBOOT:
+    RebootManager().reboot(only_if_required=True)
+else:
+    server.shell(name="A reboot is compulsory", commands=['echo "Reboot is a must"'])
@@ -1,10 +1,20 @@
-from pyinfra.operations import apt, files, systemd
-from dotenv import load_dotenv
-from pathlib import Path
 import os
+from pathlib import Path
 
-from Operations.TigerVNCServerSetup import TigerVNCServerSetup
+from dotenv import load_dotenv
+from pyinfra import host
+from pyinfra.operations import apt, files, systemd
+
+from Operations.AptCacheProxy import use_apt_proxy
 from Operations.DeployService import DeployService
+from Operations.FactCache import APT_FACTS, FactCache, invalidate_on_change
+from Operations.OperationTimer import OperationTimer
+from Operations.TigerVNCServerSetup import TigerVNCServerSetup
+
+# --data refresh_facts=true gathers every fact again
+FactCache.install()
+# --data op_timing=true times every operation on every host
+OperationTimer.install()
 
 script_dir = Path(__file__).parent
 current_script_dir = Path(__file__).parent
@@ -30,6 +40,9 @@ def vnc_credentials():
 
 HOST_USER, VNC_PASSWORD = vnc_credentials()
 
+# --data apt_proxy=<site cache host> downloads through Deploy/apt_cache_proxy.py
+APT_PROXY = host.data.get("apt_proxy")
+
 
 ### TigerVNC Server Setup
 def vnc_configuration(tiger_vnc):
@@ -47,6 +60,7 @@ tiger_vnc = TigerVNCServerSetup(
     geometry="1920x1080",
     depth=24,
     password=VNC_PASSWORD,
+    apt_proxy=APT_PROXY,
 )
 vnc_configuration(tiger_vnc)
 
@@ -56,15 +70,16 @@ script = str((project_root / "Resources/turn_back_win.sh").absolute())
 service_src = str((project_root / "Resources/turn_back_win.service").absolute())
 
 panic_service = DeployService(shellFileSrc=script, serviceFileSrc=service_src)
-panic_service.deploy()
 
 ### Dynamic Wallpaper Setup
-apt.packages(
+use_apt_proxy(APT_PROXY)
+install_fonts = apt.packages(
     name="Install ImageMagick and DejaVu fonts",
     packages=["imagemagick", "fonts-dejavu-core"],
     update=True,
     _sudo=True,
 )
+invalidate_on_change(install_fonts, *APT_FACTS)
 
 script = str((project_root / "Resources/dynamic_wallpaper.sh").absolute())
 service_src = str((project_root / "Resources/dynamic_wallpaper.service").absolute())
@@ -81,6 +96,8 @@ files.put(
 wallpaper_service = DeployService(
     shellFileSrc=str(script), serviceFileSrc=str(service_src)
 )
-wallpaper_service.deploy()
+
+# Both services share one daemon-reload
+DeployService.deploy_all([panic_service, wallpaper_service])
 
 # assert False, f"DEBUGGING 'script' value: Type={type(script)}, Value='{script}'"
@@ -0,0 +1,72 @@
+"""
+Builds the master image as a DAG of stages, resuming each host where it stopped:
+
+    python -m Deploy.pipeline --inventory Inventories/on_production.py
+    python -m Deploy.pipeline --plan
+    python -m Deploy.pipeline --reset vnc wallpaper -- --data apt_proxy=110.34.35.16
+
+The stages are the deploy files of Deploy/stages, covering master_image_v2,
+v3.2 and v3.3. Each declares the stages it needs in DEPENDS and the host
+resources it holds in LOCKS, see Operations/StagePipeline.py. Completed stages
+are checkpointed per host under ~/.cache/deploy_manager/checkpoints.
+"""
+
+import argparse
+import sys
+
+from Operations.RolloutScheduler import load_inventory
+from Operations.StagePipeline import StagePipeline, load_stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--inventory", default="Inventories/on_production.py")
+    parser.add_argument("--stages-dir", default="Deploy/stages")
+    parser.add_argument("--hosts", nargs="+", help="Limit to these hosts")
+    parser.add_argument("--max-parallel", type=int, default=4, help="Hosts at once")
+    parser.add_argument(
+        "--stage-parallel", type=int, default=2, help="Stages at once per host"
+    )
+    parser.add_argument(
+        "--reset",
+        nargs="*",
+        metavar="STAGE",
+        help="Forget the checkpoints of these stages (all if none given) first",
+    )
+    parser.add_argument("--plan", action="store_true", help="Print the stages only")
+
+    # Everything after "--" is passed through to pyinfra
+    argv, pyinfra_args = sys.argv[1:], []
+    if "--" in argv:
+        argv, pyinfra_args = argv[: argv.index("--")], argv[argv.index("--") + 1 :]
+    args = parser.parse_args(argv)
+
+    hosts = args.hosts or [name for name, _ in load_inventory(args.inventory)]
+    pipeline = StagePipeline(
+        load_stages(args.stages_dir),
+        hosts,
+        max_parallel=args.max_parallel,
+        stage_parallel=args.stage_parallel,
+    )
+
+    if args.plan:
+        for name in pipeline.order:
+            stage = pipeline.stages[name]
+            print(
+                f"{name:<18} needs: {', '.join(stage['depends']) or '-':<22}"
+                f"locks: {', '.join(stage['locks']) or '-'}"
+            )
+        for host_name in hosts:
+            done = pipeline.completed(host_name)
+            print(f"[{host_name}] done: {', '.join(done) or '-'}")
+        return
+
+    if args.reset is not None:
+        pipeline.reset(args.reset or None)
+
+    completed = pipeline.run(args.inventory, pyinfra_args)
+    sys.exit(0 if completed else 1)
+
+
+if __name__ == "__main__":
+    main()
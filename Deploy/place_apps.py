@@ -0,0 +1,25 @@
+"""
+Places the pending p100x-app containers of Inventories/fleet_spec.py over the
+whole inventory and creates each one on the host and GPU it was assigned:
+
+    pyinfra Inventories/on_production.py Deploy/place_apps.py --data headroom=8g
+
+The plan is printed by the first host; apps that fit nowhere are reported and
+left out.
+"""
+
+from pyinfra import host
+
+from Inventories.fleet_spec import pending_apps
+from Operations.akira_edge_manager import AkiraEdgeManager
+from Operations.FactCache import FactCache
+from Operations.OperationTimer import OperationTimer
+from Operations.PlacementScheduler import plan_placement
+
+FactCache.install()
+OperationTimer.install()
+
+placements = plan_placement(pending_apps, headroom=host.data.get("headroom", "4g"))
+
+manager = AkiraEdgeManager()
+manager.create_containers(placements.get(host.name, []))
@@ -0,0 +1,26 @@
+"""
+Reboots hosts in batches, each batch ready again before the next one starts:
+
+    python -m Deploy.rollout Deploy/reboot.py --wave-size 2 --max-parallel 2 \
+        -- --data reboot_timeout=900 --data reboot_interval=10
+
+A host is ready once SSH is back, Docker is up and the p100x-app HTTP ports it
+served before the reboot answer again. A host not ready within reboot_timeout
+fails its wave, and the rollout stops at --failure-threshold.
+"""
+
+from pyinfra import host
+
+from Operations.OperationTimer import OperationTimer
+from Operations.RebootManager import RebootManager
+
+OperationTimer.install()
+
+# --data reboot_only_required=true skips hosts apt did not flag for a reboot
+ONLY_REQUIRED = str(host.data.get("reboot_only_required", "")).lower() in ("1", "true")
+
+RebootManager(
+    delay=int(host.data.get("reboot_delay", 10)),
+    interval=int(host.data.get("reboot_interval", 5)),
+    timeout=int(host.data.get("reboot_timeout", 600)),
+).reboot(only_if_required=ONLY_REQUIRED)
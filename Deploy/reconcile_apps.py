@@ -0,0 +1,17 @@
+"""
+Converges every host to the p100x-app containers listed for it in
+Inventories/fleet_spec.py. Hosts run in parallel and converged hosts get no
+container operation.
+"""
+
+from pyinfra import host
+
+from Inventories.fleet_spec import apps
+from Operations.akira_edge_manager import AkiraEdgeManager
+from Operations.FactCache import FactCache
+from Operations.OperationTimer import OperationTimer
+
+FactCache.install()
+OperationTimer.install()
+manager = AkiraEdgeManager()
+manager.reconcile(apps.get(host.name, []))
@@ -0,0 +1,52 @@
+"""
+Rolls a playbook out over the inventory in canary + waves, from the control node:
+
+    python -m Deploy.rollout Deploy/deploy_image.py --wave-size 2 \
+        --site-bandwidth 100 --host-bandwidth 40 -- --data distribution_mode=registry
+
+Every host gets its own pyinfra run, so playbooks that need the whole fleet in a
+single run (the tree, delta and stream distribution modes) do not fit here.
+"""
+
+import argparse
+import sys
+
+from Operations.RolloutScheduler import RolloutScheduler, load_inventory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("deploy_file")
+    parser.add_argument("--inventory", default="Inventories/on_production.py")
+    parser.add_argument("--canary", help="Host to deploy first (default: first)")
+    parser.add_argument("--wave-size", type=int, default=2)
+    parser.add_argument("--max-parallel", type=int, default=4)
+    parser.add_argument(
+        "--site-bandwidth", type=float, help="Uplink budget per site, in Mbit/s"
+    )
+    parser.add_argument(
+        "--host-bandwidth", type=float, help="Expected transfer rate per host, Mbit/s"
+    )
+    parser.add_argument("--failure-threshold", type=float, default=0.25)
+
+    # Everything after "--" is passed through to pyinfra
+    argv, pyinfra_args = sys.argv[1:], []
+    if "--" in argv:
+        argv, pyinfra_args = argv[: argv.index("--")], argv[argv.index("--") + 1 :]
+    args = parser.parse_args(argv)
+
+    scheduler = RolloutScheduler(
+        load_inventory(args.inventory),
+        canary=args.canary,
+        wave_size=args.wave_size,
+        max_parallel=args.max_parallel,
+        site_bandwidth_mbps=args.site_bandwidth,
+        host_bandwidth_mbps=args.host_bandwidth,
+        failure_threshold=args.failure_threshold,
+    )
+    completed = scheduler.run(args.inventory, args.deploy_file, pyinfra_args)
+    sys.exit(0 if completed else 1)
+
+
+if __name__ == "__main__":
+    main()
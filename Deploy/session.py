@@ -0,0 +1,90 @@
+"""
+Runs several playbooks in one pyinfra session, over a single SSH connection per host:
+
+    python -m Deploy.session --inventory Inventories/on_production.py -- -y
+    python -m Deploy.session Deploy/master_image_v3.3.py Deploy/deploy_image.py \
+        -- --data distribution_mode=stream
+
+Separate pyinfra invocations each handshake with every host again. Here pyinfra
+connects once, collects the playbooks in order and runs them over the same
+authenticated connections, every command a new channel of the host's transport.
+At the end, the handshake time of the session is reported with the time saved
+against one invocation per playbook.
+
+Playbooks run in the given order on each host. Their deploy-level code is
+collected up front, before any of them runs, while operations read their facts
+when they execute.
+
+Deploy/set_ssh.py is not part of the default bring-up: it imports `host` from
+pyinfra.operations and fails to load, so it still runs on its own.
+"""
+
+import argparse
+import sys
+import time
+
+from pyinfra.api.host import Host
+from pyinfra_cli.main import main as pyinfra_main
+
+BRING_UP = [
+    "Deploy/master_image_v2.py",
+    "Deploy/master_image_v3.2.py",
+    "Deploy/master_image_v3.3.py",
+    "Deploy/deploy_image.py",
+]
+
+# host name -> (start, end) of its handshake
+_handshakes = {}
+
+
+def time_handshakes():
+    """Records when each host connection starts and ends."""
+    connect = Host.connect
+
+    def timed_connect(self, *args, **kwargs):
+        connected = self.connected
+        start = time.perf_counter()
+        result = connect(self, *args, **kwargs)
+        if not connected and self.connected:
+            _handshakes[self.name] = (start, time.perf_counter())
+        return result
+
+    Host.connect = timed_connect
+
+
+def report(playbooks):
+    if not _handshakes:
+        return
+    starts, ends = zip(*_handshakes.values())
+    # Hosts connect in parallel, the session waits for the slowest
+    wall = max(ends) - min(starts)
+    total = sum(end - start for start, end in _handshakes.values())
+    saved = wall * (playbooks - 1)
+    print(
+        f"--> Handshakes: {len(_handshakes)} hosts in {wall:.2f}s "
+        f"({total:.2f}s summed over hosts), once for {playbooks} playbooks"
+    )
+    print(f"    about {saved:.2f}s saved against one pyinfra run per playbook")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("playbooks", nargs="*", default=BRING_UP)
+    parser.add_argument("--inventory", default="Inventories/on_production.py")
+
+    # Everything after "--" is passed through to pyinfra
+    argv, pyinfra_args = sys.argv[1:], []
+    if "--" in argv:
+        argv, pyinfra_args = argv[: argv.index("--")], argv[argv.index("--") + 1 :]
+    args = parser.parse_args(argv)
+
+    time_handshakes()
+    sys.argv = ["pyinfra", *pyinfra_args, args.inventory, *args.playbooks]
+    try:
+        pyinfra_main()
+    finally:
+        report(len(args.playbooks))
+
+
+if __name__ == "__main__":
+    main()
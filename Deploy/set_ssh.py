@@ -1,4 +1,5 @@
 from pyinfra.operations import host
+
 from Operations.SSHConfig import SSHConfig
 
 
@@ -0,0 +1,28 @@
+"""Helpers shared by the master image stages, not a stage itself."""
+
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from Operations.FactCache import FactCache
+from Operations.OperationTimer import OperationTimer
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+
+def install_hooks():
+    """Fact cache and operation timing, as in the other playbooks."""
+    FactCache.install()
+    OperationTimer.install()
+
+
+def vnc_credentials():
+    """
+    Loads HOST_USER and VNC_PASSWORD from Deploy/Config/.env, if present, or
+    from the environment.
+    """
+    dotenv_path = PROJECT_ROOT / "Deploy" / "Config" / ".env"
+    if dotenv_path.exists():
+        load_dotenv(dotenv_path)
+    return os.getenv("HOST_USER"), os.getenv("VNC_PASSWORD")
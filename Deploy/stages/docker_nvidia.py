@@ -0,0 +1,21 @@
+"""Master image stage: Docker, NVIDIA driver and container toolkit packages."""
+
+from pyinfra import host
+
+from Deploy.stages._common import install_hooks
+from Operations.AptTransaction import AptTransaction
+from Operations.DockerNvidiaSetup import DockerNvidiaSetup
+
+DEPENDS = ["docker_repo"]
+LOCKS = ["apt"]
+
+install_hooks()
+
+APT_PROXY = host.data.get("apt_proxy")
+
+docker_setup = DockerNvidiaSetup(host, apt_proxy=APT_PROXY)
+# The repository setup is already in place, it only checks it here
+transaction = AptTransaction(apt_proxy=APT_PROXY)
+docker_setup.declare_packages(transaction)
+transaction.apply()
+docker_setup.add_user_docker_group()
@@ -0,0 +1,28 @@
+"""Master image stage: Docker and NVIDIA apt keys and repositories."""
+
+from pyinfra import host
+from pyinfra.operations import server
+
+from Deploy.stages._common import install_hooks
+from Operations.AptCacheProxy import use_apt_proxy
+from Operations.AptTransaction import AptTransaction
+from Operations.DockerNvidiaSetup import DockerNvidiaSetup
+from Operations.FactCache import invalidate_on_change
+
+DEPENDS = []
+# Installs curl and gnupg first on hosts without them
+LOCKS = ["apt"]
+
+install_hooks()
+
+APT_PROXY = host.data.get("apt_proxy")
+use_apt_proxy(APT_PROXY)
+
+transaction = AptTransaction(apt_proxy=APT_PROXY)
+DockerNvidiaSetup(host, apt_proxy=APT_PROXY).declare_packages(transaction)
+setup = server.shell(
+    name="Set up the Docker and NVIDIA apt repositories",
+    commands=transaction.setup_commands(),
+    _sudo=True,
+)
+invalidate_on_change(setup, "AptSources", "AptKeys")
@@ -0,0 +1,28 @@
+"""Master image stage: on-startup network configuration script and service."""
+
+from pyinfra.operations import files
+
+from Deploy.stages._common import PROJECT_ROOT, install_hooks
+from Operations.DeployService import DeployService
+from Operations.NetworkProfiles import NetworkProfiles
+
+DEPENDS = []
+LOCKS = []
+
+install_hooks()
+
+profiles = NetworkProfiles(PROJECT_ROOT / "Resources/network_config.csv").deploy()
+
+for former in ("set_network.sh", "network_config.csv"):
+    files.file(
+        name=f"Removing the former {former}",
+        path=f"/usr/local/bin/{former}",
+        present=False,
+        _sudo=True,
+    )
+
+DeployService(
+    shellFileSrc=str(PROJECT_ROOT / "Resources/set_network_agent.py"),
+    serviceFileSrc=str(PROJECT_ROOT / "Resources/set_network.service"),
+    restart_on=profiles,
+).deploy()
@@ -0,0 +1,14 @@
+"""Master image stage: switch-panic script and service."""
+
+from Deploy.stages._common import PROJECT_ROOT, install_hooks
+from Operations.DeployService import DeployService
+
+DEPENDS = []
+LOCKS = []
+
+install_hooks()
+
+DeployService(
+    shellFileSrc=str(PROJECT_ROOT / "Resources/turn_back_win.sh"),
+    serviceFileSrc=str(PROJECT_ROOT / "Resources/turn_back_win.service"),
+).deploy()
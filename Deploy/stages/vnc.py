@@ -0,0 +1,22 @@
+"""Master image stage: TigerVNC server packages."""
+
+from pyinfra import host
+
+from Deploy.stages._common import install_hooks, vnc_credentials
+from Operations.TigerVNCServerSetup import TigerVNCServerSetup
+
+DEPENDS = []
+LOCKS = ["apt"]
+
+install_hooks()
+
+HOST_USER, VNC_PASSWORD = vnc_credentials()
+
+TigerVNCServerSetup(
+    vnc_user=HOST_USER,
+    vnc_display=":1",
+    geometry="1920x1080",
+    depth=24,
+    password=VNC_PASSWORD,
+    apt_proxy=host.data.get("apt_proxy"),
+).install_vnc_server()
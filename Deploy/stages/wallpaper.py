@@ -0,0 +1,38 @@
+"""Master image stage: dynamic wallpaper for the VNC desktop."""
+
+from pyinfra import host
+from pyinfra.operations import apt, files
+
+from Deploy.stages._common import PROJECT_ROOT, install_hooks, vnc_credentials
+from Operations.AptCacheProxy import use_apt_proxy
+from Operations.DeployService import DeployService
+from Operations.FactCache import APT_FACTS, invalidate_on_change
+
+DEPENDS = ["vnc"]
+LOCKS = ["apt"]
+
+install_hooks()
+
+HOST_USER, _ = vnc_credentials()
+
+use_apt_proxy(host.data.get("apt_proxy"))
+install_fonts = apt.packages(
+    name="Install ImageMagick and DejaVu fonts",
+    packages=["imagemagick", "fonts-dejavu-core"],
+    update=True,
+    _sudo=True,
+)
+invalidate_on_change(install_fonts, *APT_FACTS)
+
+files.put(
+    name="Background taking position",
+    src=str(PROJECT_ROOT / "Resources/background.png"),
+    dest=f"/home/{HOST_USER}/Pictures",
+    mode="755",
+    _sudo=True,
+)
+
+DeployService(
+    shellFileSrc=str(PROJECT_ROOT / "Resources/dynamic_wallpaper.sh"),
+    serviceFileSrc=str(PROJECT_ROOT / "Resources/dynamic_wallpaper.service"),
+).deploy()
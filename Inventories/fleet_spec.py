@@ -0,0 +1,44 @@
+import os
+
+# Desired p100x-app containers per inventory host, applied by
+# Deploy/reconcile_apps.py. Connection strings come from the environment, as
+# with the .env_connections file of Deploy/app/docker-compose.yaml.
+apps = {
+    "110.34.35.16": [
+        {
+            "name": "SRV-SOD-0XX-AKIRA1",
+            "host_port": 9595,
+            "mem_ram": "50g",
+            "conn_string": os.getenv("CONNECTION_HQ"),
+            "volumes": [
+                "/home/admin_sumato/akira-edge/Database:/app/Database",
+                "/home/admin_sumato/akira-edge/Config:/app/Config",
+                "/home/admin_sumato/akira-edge/auditory:/app/auditory",
+            ],
+        },
+        {
+            "name": "SRV-SOD-0XX-AKIRA2",
+            "host_port": 9696,
+            "mem_ram": "25g",
+            "conn_string": os.getenv("CONNECTION_VT"),
+            "volumes": [
+                "/home/admin_sumato/akira-edge/Database_vt:/app/Database",
+                "/home/admin_sumato/akira-edge/Config_vt:/app/Config",
+                "/home/admin_sumato/akira-edge/auditory_vt:/app/auditory",
+            ],
+        },
+    ],
+}
+
+# New p100x-app containers without a host yet. Deploy/place_apps.py picks the
+# host and GPU of each one from the free RAM and GPU memory of the fleet.
+# 'gpu_mem' is the GPU memory the app needs, 0 if left out, and 'host_port' is
+# allocated from the free ports of the host when left out.
+pending_apps = [
+    # {
+    #     "name": "SRV-SOD-0XX-AKIRA3",
+    #     "mem_ram": "25g",
+    #     "gpu_mem": "8g",
+    #     "conn_string": os.getenv("CONNECTION_AKIRA3"),
+    # },
+]
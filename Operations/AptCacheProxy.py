@@ -0,0 +1,91 @@
+from io import StringIO
+
+from pyinfra import host
+from pyinfra.operations import apt, files, systemd
+
+from Operations.FactCache import APT_FACTS, SYSTEMD_FACTS, invalidate_on_change
+
+APT_PROXY_PORT = 3142
+CLIENT_CONF = "/etc/apt/apt.conf.d/01p100x-proxy"
+SERVER_CONF = "/etc/apt-cacher-ng/zz_p100x.conf"
+
+# Hosts already pointed at their proxy during this run
+_configured = set()
+
+
+def proxied(line, apt_proxy):
+    """
+    Rewrites the https:// URLs of a repository line to apt-cacher-ng's
+    http://HTTPS/// form when a proxy is used, so HTTPS repositories (Docker,
+    NVIDIA) are cached too instead of tunnelled.
+    """
+    if not apt_proxy:
+        return line
+    return line.replace("https://", "http://HTTPS///")
+
+
+def use_apt_proxy(apt_proxy):
+    """Points apt on the current host at the site cache, once per host and run."""
+    if not apt_proxy or host.name in _configured:
+        return
+    _configured.add(host.name)
+    AptCacheProxy(apt_proxy).configure_client()
+
+
+class AptCacheProxy:
+    """
+    Runs an apt-cacher-ng caching proxy on one host per site, so only the first
+    host of the site downloads a package over the WAN link and the rest of the
+    site gets it from the LAN.
+    """
+
+    def __init__(self, proxy_host, port=APT_PROXY_PORT):
+        self.proxy_host = proxy_host
+        self.port = port
+        self.url = f"http://{proxy_host}:{port}"
+
+    def install_server(self):
+        """Installs apt-cacher-ng on the proxy host, listening on every interface."""
+        if host.name != self.proxy_host:
+            return
+
+        install = apt.packages(
+            name="Install apt-cacher-ng",
+            packages=["apt-cacher-ng"],
+            update=True,
+            _sudo=True,
+        )
+        invalidate_on_change(install, *APT_FACTS)
+
+        config = files.put(
+            name="Configure apt-cacher-ng",
+            src=StringIO(f"Port: {self.port}\nBindAddress: 0.0.0.0\n"),
+            dest=SERVER_CONF,
+            mode="644",
+            _sudo=True,
+        )
+        service = systemd.service(
+            name="Start apt-cacher-ng",
+            service="apt-cacher-ng",
+            running=True,
+            enabled=True,
+            _sudo=True,
+        )
+        invalidate_on_change(service, *SYSTEMD_FACTS)
+        systemd.service(
+            name="Restart apt-cacher-ng to apply its configuration",
+            service="apt-cacher-ng",
+            restarted=True,
+            _if=config.did_change,
+            _sudo=True,
+        )
+
+    def configure_client(self):
+        """Makes apt on the current host download through the proxy."""
+        files.put(
+            name=f"Use apt proxy {self.url}",
+            src=StringIO(f'Acquire::http::Proxy "{self.url}";\n'),
+            dest=CLIENT_CONF,
+            mode="644",
+            _sudo=True,
+        )
@@ -0,0 +1,89 @@
+import shlex
+
+from pyinfra.operations import apt, server
+
+from Operations.AptCacheProxy import proxied, use_apt_proxy
+from Operations.FactCache import APT_FACTS, invalidate_on_change
+
+# Needed to fetch keys, installed up front only on hosts that lack them
+BOOTSTRAP_PACKAGES = ["ca-certificates", "curl", "gnupg"]
+
+
+class AptTransaction:
+    """
+    Collects the apt keys, repositories and packages that Operations classes
+    declare, then applies them all at once: one repository setup, one
+    `apt-get update` and one install transaction per host.
+    """
+
+    def __init__(self, apt_proxy=None):
+        """
+        :param apt_proxy: Host running the site's AptCacheProxy, if any.
+        """
+        self.apt_proxy = apt_proxy
+        self.keys = {}
+        self.repos = {}
+        self.packages = []
+        self.latest = False
+
+    def add_key(self, url, dest, dearmor=False):
+        """Declares a signing key, downloaded to `dest` (dearmored if asked)."""
+        self.keys[dest] = (url, dearmor)
+
+    def add_repo(self, filename, line):
+        """
+        Declares a sources.list.d entry. `line` is expanded by the remote shell,
+        so it may use $(dpkg --print-architecture) and the like.
+        """
+        self.repos[filename] = line
+
+    def add_packages(self, packages, latest=False):
+        for package in packages:
+            if package not in self.packages:
+                self.packages.append(package)
+        self.latest = self.latest or latest
+
+    def setup_commands(self):
+        """Shell commands adding the declared keys and repositories."""
+        commands = [
+            "command -v curl >/dev/null && command -v gpg >/dev/null || "
+            "(apt-get update && apt-get install -y "
+            f"{' '.join(BOOTSTRAP_PACKAGES)})",
+            "install -m 0755 -d /etc/apt/keyrings",
+        ]
+        for dest, (url, dearmor) in self.keys.items():
+            fetch = f"curl -fsSL {url}"
+            if dearmor:
+                fetch = f"{fetch} | gpg --dearmor --batch --yes -o {dest}"
+            else:
+                fetch = f"{fetch} -o {dest}"
+            commands.append(f"[ -s {dest} ] || ({fetch} && chmod a+r {dest})")
+        for filename, line in self.repos.items():
+            path = f"/etc/apt/sources.list.d/{filename}"
+            # Only rewrite the list when the line changed, to keep the run idempotent
+            commands.append(
+                f'line="{proxied(line, self.apt_proxy)}" && '
+                f'[ "$(cat {path} 2>/dev/null)" = "$line" ] || '
+                f'echo "$line" > {shlex.quote(path)}'
+            )
+        return commands
+
+    def apply(self):
+        """Emits the repository setup, the apt update and the install."""
+        use_apt_proxy(self.apt_proxy)
+        if self.keys or self.repos:
+            setup = server.shell(
+                name=f"Set up {len(self.keys)} apt keys and {len(self.repos)} repos",
+                commands=self.setup_commands(),
+                _sudo=True,
+            )
+            invalidate_on_change(setup, "AptSources", "AptKeys")
+
+        install = apt.packages(
+            name=f"Install {len(self.packages)} packages in one transaction",
+            packages=self.packages,
+            latest=self.latest,
+            update=True,
+            _sudo=True,
+        )
+        invalidate_on_change(install, *APT_FACTS)
@@ -1,51 +1,98 @@
 from pyinfra import logger
 from pyinfra.operations import files, systemd
 
+from Operations.FactCache import SYSTEMD_FACTS, invalidate_on_change
+
 
 class DeployService:
     """
-    A class to deploy the panic switch script and systemd service.
+    A class to deploy a shell script and the systemd service running it.
+
+    The files are only uploaded when their checksum differs from the host's
+    (files.put compares sha1 sums), and the service is only restarted when one
+    of its files, or one of the `restart_on` operations, changed something.
     """
 
-    def __init__(self, shellFileSrc: str, serviceFileSrc: str):
+    def __init__(self, shellFileSrc: str, serviceFileSrc: str, restart_on=()):
+        """
+        :param restart_on: Other operations whose changes need a restart too,
+                           e.g. the configuration files the script reads.
+        """
         self.shellFileSrc = shellFileSrc
         self.serviceFileSrc = serviceFileSrc
         self.shellFileDest = f"/usr/local/bin/{shellFileSrc.split('/')[-1]}"
-        serviceFileName = serviceFileSrc.split("/")[-1]
-        self.serviceFileDest = f"/etc/systemd/system/{serviceFileName}"
-        pass
+        self.serviceName = serviceFileSrc.split("/")[-1]
+        self.serviceFileDest = f"/etc/systemd/system/{self.serviceName}"
+        self.restart_on = list(restart_on)
 
-    def deploy(self):
-        """
-        Executes the deployment tasks for the panic switch script and service.
-        """
-
-        files.put(
-            name="Placing shell script",
+    def _place_files(self):
+        self.script = files.put(
+            name=f"Placing shell script {self.shellFileDest}",
             src=self.shellFileSrc,
             dest=self.shellFileDest,
             mode="755",
-            force=True,
             _sudo=True,
         )
-
-        files.put(
-            name="Placing systemd service",
+        self.unit = files.put(
+            name=f"Placing systemd service {self.serviceName}",
             src=self.serviceFileSrc,
             dest=self.serviceFileDest,
             mode="755",
-            force=True,
             _sudo=True,
         )
 
+    def _changed(self):
+        return any(
+            operation.did_change()
+            for operation in [self.script, self.unit, *self.restart_on]
+        )
+
+    def _start(self):
+        # A stopped service is started instead of restarted. Run-once units need
+        # Type=oneshot with RemainAfterExit=yes: they then stay active once done,
+        # so the start below is a no-op and only a change reruns them. Without it
+        # they show as stopped and every deploy starts them again.
         systemd.service(
-            name="Enabling and starting service",
-            service=self.serviceFileSrc.split("/")[-1],
-            daemon_reload=True,
+            name=f"Restarting {self.serviceName}, its files changed",
+            service=self.serviceName,
             restarted=True,
+            _if=self._changed,
+            _sudo=True,
+        )
+        service = systemd.service(
+            name=f"Enabling and starting {self.serviceName}",
+            service=self.serviceName,
             enabled=True,
             running=True,
             _sudo=True,
         )
+        invalidate_on_change(service, *SYSTEMD_FACTS)
 
-        logger.info("Service deployed and started.")
+    @classmethod
+    def deploy_all(cls, services):
+        """
+        Deploys several services with a single daemon-reload, issued only if one
+        of their unit files changed.
+        """
+        for service in services:
+            service._place_files()
+
+        systemd.daemon_reload(
+            name="Reloading systemd units",
+            _if=lambda: any(service.unit.did_change() for service in services),
+            _sudo=True,
+        )
+
+        for service in services:
+            service._start()
+
+        logger.info(
+            f"Services deployed and started: "
+            f"{', '.join(service.serviceName for service in services)}."
+        )
+
+    def deploy(self):
+        """
+        Executes the deployment tasks for the script and service.
+        """
+        self.deploy_all([self])
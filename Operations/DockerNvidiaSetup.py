@@ -1,22 +1,74 @@
-from pyinfra.operations import apt, server, files, docker
-from pyinfra.facts.server import User
 from pyinfra import logger
+from pyinfra.facts.server import User
+from pyinfra.operations import apt, docker, files, server
+
+from Operations.AptCacheProxy import proxied, use_apt_proxy
+from Operations.FactCache import APT_FACTS, invalidate_on_change
+
+DOCKER_PACKAGES = [
+    "docker-ce",
+    "docker-ce-cli",
+    "containerd.io",
+    "docker-buildx-plugin",
+    "docker-compose-plugin",
+]
+
+DOCKER_REPO = (
+    "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] "
+    "https://download.docker.com/linux/ubuntu "
+    '$(. /etc/os-release && echo "${UBUNTU_CODENAME:-$VERSION_CODENAME}") stable'
+)
+
+NVIDIA_TOOLKIT_KEYRING = "/usr/share/keyrings/nvidia-container-toolkit-keyring.gpg"
+NVIDIA_TOOLKIT_REPO = (
+    f"deb [signed-by={NVIDIA_TOOLKIT_KEYRING}] "
+    "https://nvidia.github.io/libnvidia-container/stable/deb/\\$(ARCH) /"
+)
 
 
 class DockerNvidiaSetup:
-    def __init__(self, host):
+    def __init__(self, host, apt_proxy=None):
+        """
+        :param apt_proxy: Host running the site's AptCacheProxy, if any. apt then
+                          downloads through it, HTTPS repositories included.
+        """
         self.host = host
+        self.apt_proxy = apt_proxy
+
+    def declare_packages(self, transaction, driver_version="535"):
+        """
+        Declares the keys, repositories and packages of the Docker and NVIDIA
+        setup on an AptTransaction, instead of running them step by step.
+        """
+        transaction.add_packages(["ca-certificates", "curl"], latest=True)
+        transaction.add_key(
+            "https://download.docker.com/linux/ubuntu/gpg",
+            "/etc/apt/keyrings/docker.asc",
+        )
+        transaction.add_repo("docker.list", DOCKER_REPO)
+        transaction.add_packages(DOCKER_PACKAGES)
+        transaction.add_packages([f"nvidia-driver-{driver_version}"])
+        transaction.add_key(
+            "https://nvidia.github.io/libnvidia-container/gpgkey",
+            NVIDIA_TOOLKIT_KEYRING,
+            dearmor=True,
+        )
+        transaction.add_repo("nvidia-container-toolkit.list", NVIDIA_TOOLKIT_REPO)
+        transaction.add_packages(["nvidia-container-toolkit"])
 
     def install_necessary_packages(self):
-        apt.packages(
+        use_apt_proxy(self.apt_proxy)
+        install = apt.packages(
             name="Install necessary packages",
             packages=["ca-certificates", "curl"],
             latest=True,
             force=True,
             _sudo=True,
         )
+        invalidate_on_change(install, *APT_FACTS)
 
-    def add_docker_gpg_key(sTruelf):
+    def add_docker_gpg_key(self):
+        use_apt_proxy(self.apt_proxy)
         server.shell(
             name="Create directory for Docker's GPG key to the apt keyring",
             commands=["install -m 0755 -d /etc/apt/keyrings"],
@@ -36,26 +88,23 @@ class DockerNvidiaSetup:
         apt.packages(name="Updating source docker list", update=True, _sudo=True)
 
     def add_docker_repo(self):
-        repo_command = 'echo "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/linux/ubuntu $(. /etc/os-release && echo "${UBUNTU_CODENAME:-$VERSION_CODENAME}") stable" | sudo tee /etc/apt/sources.list.d/docker.list > /dev/null'
-        server.shell(
+        repo_command = f'echo "{proxied(DOCKER_REPO, self.apt_proxy)}" | sudo tee /etc/apt/sources.list.d/docker.list > /dev/null'
+        add_repo = server.shell(
             name="Add Docker repository to apt sources",
             commands=[repo_command],
             _sudo=True,
         )
+        invalidate_on_change(add_repo, "AptSources")
 
     def install_docker_packages(self):
-        apt.packages(
+        use_apt_proxy(self.apt_proxy)
+        install = apt.packages(
             name="Install Docker and dependencies",
-            packages=[
-                "docker-ce",
-                "docker-ce-cli",
-                "containerd.io",
-                "docker-buildx-plugin",
-                "docker-compose-plugin",
-            ],
+            packages=DOCKER_PACKAGES,
             update=True,
             _sudo=True,
         )
+        invalidate_on_change(install, *APT_FACTS)
 
     def run_docker_hello_world(self):
         # server.shell(
@@ -73,11 +122,13 @@ class DockerNvidiaSetup:
         )
 
     def install_nvidia_driver(self, driver_version="535"):
-        apt.packages(
+        use_apt_proxy(self.apt_proxy)
+        install = apt.packages(
             name=f"Install NVIDIA driver {driver_version}",
             packages=[f"nvidia-driver-{driver_version}"],
             _sudo=True,
         )
+        invalidate_on_change(install, *APT_FACTS)
 
     def add_user_docker_group(self):
         username = self.host.get_fact(
@@ -96,20 +147,23 @@ class DockerNvidiaSetup:
         server.shell(name="Check NVIDIA driver installation", commands=["nvidia-smi"])
 
     def install_nvidia_container_toolkit(self):
+        use_apt_proxy(self.apt_proxy)
+        repo_url = proxied("https://", self.apt_proxy)
         server.shell(
             name="Add NVIDIA Container Toolkit repository",
             commands=[
                 "curl -fsSL https://nvidia.github.io/libnvidia-container/gpgkey | sudo gpg --dearmor --batch --yes -o /usr/share/keyrings/nvidia-container-toolkit-keyring.gpg && "
                 "curl -s -L https://nvidia.github.io/libnvidia-container/stable/deb/nvidia-container-toolkit.list | "
-                "sed 's#deb https://#deb [signed-by=/usr/share/keyrings/nvidia-container-toolkit-keyring.gpg] https://#g' | "
+                f"sed 's#deb https://#deb [signed-by=/usr/share/keyrings/nvidia-container-toolkit-keyring.gpg] {repo_url}#g' | "
                 "sudo tee /etc/apt/sources.list.d/nvidia-container-toolkit.list"
             ],
             _sudo=True,
         )
         # Update apt and install the toolkit
         apt.update(name="Update packages for nvidia toolkit", _sudo=True)
-        apt.packages(
+        install = apt.packages(
             name="Install NVIDIA container toolkit",
             packages=["nvidia-container-toolkit"],
             _sudo=True,
         )
+        invalidate_on_change(install, *APT_FACTS)
@@ -0,0 +1,213 @@
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from pyinfra import host, logger
+from pyinfra.api.host import Host
+from pyinfra.operations import python
+
+CACHE_FILE = Path.home() / ".cache/deploy_manager/facts.json"
+
+# Seconds a gathered fact stays valid, by fact class name. Facts not listed here
+# are never cached.
+TTLS = {
+    "Home": 7 * 24 * 3600,
+    "User": 7 * 24 * 3600,
+    "DebPackages": 3600,
+    "AptSources": 3600,
+    "AptKeys": 3600,
+    "SystemdStatus": 600,
+    "SystemdEnabled": 600,
+}
+
+# Fact classes whose state the apt and systemd operations change
+APT_FACTS = ("DebPackages", "AptSources", "AptKeys")
+SYSTEMD_FACTS = ("SystemdStatus", "SystemdEnabled")
+
+
+def _encode(value):
+    if isinstance(value, (set, frozenset)):
+        return {"__set__": sorted(_encode(item) for item in value)}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {"__set__"}:
+            return set(_decode(item) for item in value["__set__"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def _flag(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+
+class FactCache:
+    """
+    Control node cache of pyinfra facts, keyed by host, fact and arguments and
+    kept on disk between runs, each entry expiring after the TTL of its fact.
+
+    Installed, it answers Host.get_fact for the facts of TTLS, so playbooks and
+    pyinfra's own operations skip the SSH round trip on repeat runs. Facts are
+    refreshed with --data refresh_facts=true or P100X_REFRESH_FACTS=1.
+    """
+
+    _installed = None
+
+    def __init__(self, path=CACHE_FILE, ttls=None, refresh=False):
+        self.path = Path(path)
+        self.ttls = ttls or TTLS
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        # Values handed out this run: pyinfra operations update the facts they
+        # get in place, so every caller must share the same object
+        self._live = {}
+        # What this run changed, the only part save() merges into the file
+        self._set = set()
+        self._invalidated = []
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(host_name, fact_cls, args, kwargs):
+        arguments = json.dumps([args, kwargs], sort_keys=True, default=str)
+        return f"{host_name}|{fact_cls.__module__}.{fact_cls.__name__}|{arguments}"
+
+    def get(self, fact_host, fact_cls, args, kwargs, gather):
+        """Returns the cached fact, gathering and storing it when missing or stale."""
+        key = self.key(fact_host.name, fact_cls, args, kwargs)
+        if key in self._live:
+            return self._live[key]
+
+        entry = self.entries.get(key)
+        refresh = self.refresh or _flag(fact_host.data.get("refresh_facts", False))
+        if entry and not refresh and entry["expires"] > time.time():
+            self.hits += 1
+            value = _decode(entry["value"])
+        else:
+            self.misses += 1
+            value = gather()
+            self._set.add(key)
+            self.entries[key] = {
+                "value": _encode(value),
+                "expires": time.time() + self.ttls[fact_cls.__name__],
+            }
+
+        self._live[key] = value
+        return value
+
+    def invalidate(self, host_name, *fact_names):
+        """Drops the entries of a host, only those of `fact_names` if given."""
+        self._invalidated.append((host_name, fact_names))
+        for key in list(self.entries):
+            if self._matches(key, host_name, fact_names):
+                self.entries.pop(key)
+                self._live.pop(key, None)
+                self._set.discard(key)
+
+    @staticmethod
+    def _matches(key, host_name, fact_names):
+        entry_host, fact, _ = key.split("|", 2)
+        return entry_host == host_name and (
+            not fact_names or fact.rsplit(".", 1)[-1] in fact_names
+        )
+
+    def save(self):
+        """
+        Merges the facts this run gathered or invalidated into the file. Rollout
+        waves and pipeline stages run several pyinfra processes against the same
+        file, so it is re-read under a lock and replaced atomically, keeping the
+        entries the other processes wrote meanwhile.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(f"{self.path.name}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entries = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                entries = {}
+
+            for host_name, fact_names in self._invalidated:
+                for key in list(entries):
+                    if self._matches(key, host_name, fact_names):
+                        entries.pop(key)
+            for key in self._set:
+                entries[key] = self.entries[key]
+
+            now = time.time()
+            entries = {
+                key: entry for key, entry in entries.items() if entry["expires"] > now
+            }
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.path.parent, prefix=".facts-", delete=False
+            ) as partial:
+                partial.write(json.dumps(entries))
+            os.replace(partial.name, self.path)
+
+    def report(self):
+        total = self.hits + self.misses
+        if total:
+            logger.info(
+                f"Fact cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hits / total:.0%} hit rate)"
+            )
+
+    @classmethod
+    def install(cls, path=CACHE_FILE):
+        """
+        Routes Host.get_fact through the cache for the rest of the run. Safe to
+        call from every host's deploy code, only the first call installs it.
+        """
+        if cls._installed is None:
+            cache = cls(path, refresh=_flag(os.getenv("P100X_REFRESH_FACTS", "")))
+            get_fact = Host.get_fact
+
+            def cached_get_fact(self, name_or_cls, *args, **kwargs):
+                if getattr(name_or_cls, "__name__", None) not in cache.ttls:
+                    return get_fact(self, name_or_cls, *args, **kwargs)
+                return cache.get(
+                    self,
+                    name_or_cls,
+                    args,
+                    kwargs,
+                    lambda: get_fact(self, name_or_cls, *args, **kwargs),
+                )
+
+            Host.get_fact = cached_get_fact
+            atexit.register(cache.report)
+            atexit.register(cache.save)
+            cls._installed = cache
+        return cls._installed
+
+
+def invalidate_on_change(operation, *fact_names):
+    """
+    Drops the cached facts of the current host once `operation` has changed
+    something, so the next run gathers them again.
+    """
+    cache = FactCache._installed
+    if cache is None:
+        return
+
+    def _invalidate(host_name=host.name):
+        cache.invalidate(host_name, *fact_names)
+
+    python.call(
+        name=f"Invalidate cached {', '.join(fact_names)}",
+        function=_invalidate,
+        _if=operation.did_change,
+    )
@@ -28,9 +28,3 @@ class HostnameManager:
             hostname=self.hostname,
             sudo=True,
         )
-
-
-# Example usage:
-new_hostname = "NEW_CUSTOMIZED_HOSTNAME"
-manager = HostnameManager(new_hostname)
-manager.apply()
@@ -0,0 +1,611 @@
+import atexit
+import json
+import os
+import subprocess
+import time
+from io import StringIO
+from pathlib import Path
+
+from pyinfra import host, inventory, logger
+from pyinfra.facts.files import FileContents
+from pyinfra.operations import apt, docker, files, python, server, systemd
+
+from Operations.AptCacheProxy import use_apt_proxy
+from Operations.docker_facts import DockerImageLayers, DockerLayerChains
+from Operations.FactCache import APT_FACTS, SYSTEMD_FACTS, invalidate_on_change
+
+DISTRIBUTION_LOG = "/tmp/p100x-distribution.log"
+REGISTRY_CONTAINER = "p100x-registry"
+BENCHMARK_LOG = (
+    Path(__file__).parent.parent / "Benchmarks/results/image_distribution.jsonl"
+)
+
+# Wall clock of the distribution run, shared by the callbacks of every host.
+_benchmark = {}
+
+# Image IDs recorded on the source host, checked on every target.
+_image_ids = {}
+
+# Run on the source from an unpacked `docker save`: prints the config and every
+# layer whose chain ID is not in the file given as argument, one per line.
+MISSING_LAYERS_SCRIPT = """\
+import hashlib, json, sys
+
+manifest = json.load(open("manifest.json"))[0]
+held = set(open(sys.argv[1]).read().split())
+diff_ids = json.load(open(manifest["Config"]))["rootfs"]["diff_ids"]
+print(manifest["Config"])
+chain = None
+for layer, diff_id in zip(manifest["Layers"], diff_ids):
+    if chain:
+        digest = hashlib.sha256(f"{chain} {diff_id}".encode()).hexdigest()
+        diff_id = f"sha256:{digest}"
+    chain = diff_id
+    if chain not in held:
+        print(layer)
+"""
+
+
+def tree_schedule(source, targets):
+    """
+    Plans a relay tree: on every round each host already holding the archive sends
+    it to one host that does not, so the holders double and the whole fleet is
+    covered in ceil(log2(n)) rounds.
+
+    Returns a list of rounds, each one a list of (sender, receiver) pairs.
+    """
+    holders = [source]
+    pending = [target for target in targets if target != source]
+    rounds = []
+
+    while pending:
+        hops = [(sender, pending.pop(0)) for sender in holders[: len(pending)]]
+        holders.extend(receiver for _, receiver in hops)
+        rounds.append(hops)
+
+    return rounds
+
+
+def bounded_parallel(commands, limit):
+    """
+    Returns a bash script running the commands in background subshells, at most
+    `limit` at a time, and failing if any of them failed.
+    """
+    lines = ["failed=0", "running=0"]
+    wait_one = "{ wait -n || failed=1; running=$((running - 1)); }"
+    for command in commands:
+        lines += [
+            f'[ "$running" -lt {limit} ] || {wait_one}',
+            f"( {command} ) &",
+            "running=$((running + 1))",
+        ]
+    lines += [f'while [ "$running" -gt 0 ]; do {wait_one}; done', 'exit "$failed"']
+    return "\n".join(lines)
+
+
+class ImageDistributor:
+    """
+    Ships a saved Docker image from a source host to the rest of the fleet.
+    """
+
+    SSH_OPTIONS = "-o BatchMode=yes -o StrictHostKeyChecking=accept-new"
+
+    def __init__(
+        self,
+        image_name,
+        hosts,
+        source=None,
+        ssh_user=None,
+        workdir="/tmp",
+        compression_level=3,
+        registry_host=None,
+        registry_port=5000,
+        apt_proxy=None,
+        delta_parallel=4,
+    ):
+        self.image_name = image_name
+        self.hosts = list(hosts)
+        self.source = source or self.hosts[0]
+        self.ssh_user = ssh_user
+        self.compression_level = compression_level
+        self.registry_host = registry_host or self.source
+        self.registry_port = registry_port
+        self.registry = f"{self.registry_host}:{registry_port}"
+        self.apt_proxy = apt_proxy
+        self.delta_parallel = delta_parallel
+        self.tar_filename = f"{image_name.replace(':', '_')}.tar"
+        self.tar_path = os.path.join(workdir, self.tar_filename)
+
+    @property
+    def targets(self):
+        return [name for name in self.hosts if name != self.source]
+
+    def _remote(self, name):
+        return f"{self.ssh_user}@{name}" if self.ssh_user else name
+
+    def reset_log(self):
+        """Clears the transfer log left by a previous run."""
+        files.file(
+            name="Reset distribution log",
+            path=DISTRIBUTION_LOG,
+            present=False,
+        )
+
+    def save_image(self):
+        """Saves the image to a tar file on the source host."""
+        if host.name == self.source:
+            server.shell(
+                name=f"Save {self.image_name} to {self.tar_filename}",
+                commands=[f"docker save -o {self.tar_path} {self.image_name}"],
+            )
+
+    def fetch_image(self):
+        """Downloads the tar file from the source host to the control node."""
+        if host.name == self.source:
+            files.get(
+                name=f"Fetch {self.tar_filename} from {self.source}",
+                src=self.tar_path,
+                dest=self.tar_path,
+                add_deploy_dir=False,
+            )
+
+    def push_direct(self):
+        """Pushes the tar file from the control node to every target host."""
+        if host.name in self.targets:
+            files.put(
+                name=f"Push {self.image_name} to {host.name}",
+                src=self.tar_path,
+                dest=self.tar_path,
+                add_deploy_dir=False,
+                # Fetched from the source by an earlier operation of this run
+                assume_exists=True,
+                _sudo=True,
+            )
+
+    def _timed_transfer(self, transfer, size_command, hop):
+        """Wraps a transfer command so it logs bytes, duration and throughput."""
+        return (
+            f"start=$(date +%s.%N) && {transfer} && end=$(date +%s.%N) && "
+            f"size=$({size_command}) && "
+            f'awk -v s="$start" -v e="$end" -v b="$size" -v hop="{hop}" '
+            "'BEGIN { t = e - s; "
+            'printf "%s: %d bytes in %.1fs (%.1f MB/s)\\n", hop, b, t, b / t / 1e6 }\' '
+            f">> {DISTRIBUTION_LOG}"
+        )
+
+    def _relay_command(self, sender, receiver):
+        return self._timed_transfer(
+            f"scp -q {self.SSH_OPTIONS} {self.tar_path} "
+            f"{self._remote(receiver)}:{self.tar_path}",
+            f"stat -c %s {self.tar_path}",
+            f"{sender} -> {receiver}",
+        )
+
+    def _stream_command(self, sender, receiver):
+        count_bytes = "LC_ALL=C dd bs=1M 2>"
+        read_count = "awk '/bytes/ { print $1 }'"
+        return (
+            "set -o pipefail && counters=$(mktemp -d) && start=$(date +%s.%N) && "
+            f"docker save {self.image_name} | {count_bytes} $counters/raw | "
+            f"zstd -q -T0 -{self.compression_level} | {count_bytes} $counters/zst | "
+            f"ssh {self.SSH_OPTIONS} {self._remote(receiver)} "
+            "'zstd -dcq | docker load' && "
+            "end=$(date +%s.%N) && "
+            f"raw=$({read_count} $counters/raw) && "
+            f"zst=$({read_count} $counters/zst) && "
+            "rm -rf $counters && "
+            'awk -v s="$start" -v e="$end" -v r="$raw" -v z="$zst" '
+            f'-v hop="{sender} -> {receiver}" '
+            "'BEGIN { t = e - s; "
+            'printf "%s: %d -> %d bytes (ratio %.2f) in %.1fs '
+            '(%.1f MB/s image, %.1f MB/s wire)\\n", '
+            "hop, r, z, r / z, t, r / t / 1e6, z / t / 1e6 }' "
+            f">> {DISTRIBUTION_LOG}"
+        )
+
+    def ensure_zstd(self):
+        """Installs zstd, needed on both ends of a streamed transfer."""
+        use_apt_proxy(self.apt_proxy)
+        install = apt.packages(
+            name="Install zstd",
+            packages=["zstd"],
+            _sudo=True,
+        )
+        invalidate_on_change(install, *APT_FACTS)
+
+    def relay_tree(self, stream=False):
+        """
+        Relays the image host to host following `tree_schedule`, so every host
+        that already received the image forwards it on the next round.
+
+        With `stream` the image is never staged on disk: `docker save` is piped
+        through multi-threaded zstd over SSH straight into `docker load`, and each
+        hop records its compression ratio next to the throughput.
+        """
+        rounds = tree_schedule(self.source, self.targets)
+        logger.info(
+            f"Distributing {self.image_name} to {len(self.targets)} hosts "
+            f"in {len(rounds)} relay rounds"
+        )
+
+        for number, hops in host.loop(enumerate(rounds, start=1)):
+            for sender, receiver in hops:
+                if host.name == sender:
+                    if stream:
+                        command = self._stream_command(sender, receiver)
+                    else:
+                        command = self._relay_command(sender, receiver)
+                    server.shell(
+                        name=f"Relay round {number}: {sender} -> {receiver}",
+                        commands=[command],
+                        _shell_executable="bash",
+                    )
+
+    @property
+    def layers_dir(self):
+        return self.tar_path[: -len(".tar")]
+
+    def _delta_command(self, receiver, chains_file):
+        members = "manifest.json $members"
+        return (
+            f"set -o pipefail && cd {self.layers_dir} && "
+            f"members=$(python3 {self.missing_layers_script} {chains_file}) && "
+            'missing=$(($(echo "$members" | wc -l) - 1)) && '
+        ) + (
+            self._timed_transfer(
+                f"tar -cf - {members} | "
+                f"ssh {self.SSH_OPTIONS} {self._remote(receiver)} docker load",
+                f"du -cb {members} | tail -n 1 | cut -f 1",
+                f"{self.source} -> {receiver} ($missing layers)",
+            )
+        )
+
+    @property
+    def missing_layers_script(self):
+        return f"{self.layers_dir}.missing-layers.py"
+
+    def ship_delta(self):
+        """
+        Ships each target only the image layers it does not hold yet. The partial
+        archive keeps the full manifest, `docker load` skips every layer whose
+        chain ID is already in the target's image store.
+
+        The layers are read from the image as saved when the transfer runs, after
+        a build earlier in the same deploy, and compared on the source with the
+        chain IDs each target held when the deploy started. Up to `delta_parallel`
+        targets are shipped at once, the source's uplink being shared by them.
+        """
+        if host.name != self.source:
+            return
+
+        files.put(
+            name="Upload missing layers helper",
+            src=StringIO(MISSING_LAYERS_SCRIPT),
+            dest=self.missing_layers_script,
+        )
+        server.shell(
+            name=f"Unpack {self.image_name} layers",
+            commands=[
+                f"rm -rf {self.layers_dir} && mkdir -p {self.layers_dir} && "
+                f"docker save {self.image_name} | tar -x -C {self.layers_dir}"
+            ],
+        )
+
+        deltas = []
+        for target in self.targets:
+            target_chains = inventory.get_host(target).get_fact(DockerLayerChains)
+            chains_file = f"{self.layers_dir}.{target}.chains"
+            files.put(
+                name=f"Record the layers {target} holds",
+                src=StringIO("\n".join(sorted(target_chains)) + "\n"),
+                dest=chains_file,
+            )
+            deltas.append(self._delta_command(target, chains_file))
+
+        server.shell(
+            name=f"Ship missing layers to {len(deltas)} hosts",
+            commands=[bounded_parallel(deltas, self.delta_parallel)],
+            _shell_executable="bash",
+        )
+
+        server.shell(
+            name=f"Remove {self.image_name} layers",
+            commands=[f"rm -rf {self.layers_dir} {self.layers_dir}.*"],
+        )
+
+    @property
+    def registry_on_control_node(self):
+        """A registry host outside the inventory is the control node's address."""
+        return self.registry_host not in self.hosts
+
+    def _run_local_registry(self):
+        def docker_cli(*args):
+            return subprocess.run(["docker", *args], capture_output=True, text=True)
+
+        if docker_cli("container", "inspect", REGISTRY_CONTAINER).returncode == 0:
+            docker_cli("start", REGISTRY_CONTAINER)
+            return
+        if docker_cli("image", "inspect", "registry:2").returncode != 0:
+            logger.warning(
+                "registry:2 is not loaded on the control node, "
+                "docker will try to pull it from Docker Hub."
+            )
+        result = docker_cli(
+            "run",
+            "-d",
+            "--name",
+            REGISTRY_CONTAINER,
+            "--restart",
+            "unless-stopped",
+            "-p",
+            f"{self.registry_port}:5000",
+            "-v",
+            f"{REGISTRY_CONTAINER}:/var/lib/registry",
+            "registry:2",
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Local registry failed to start: {result.stderr}")
+        logger.info(f"Local registry started, reachable at {self.registry}")
+
+    def run_registry(self):
+        """
+        Runs a `registry:2` container on the registry host. The registry image has
+        to be present there already (pulled once or shipped with `docker load`),
+        so the mirror works without internet access.
+
+        A registry host that is not in the inventory is taken as the address the
+        fleet reaches the control node at: the registry then runs on the control
+        node, started once, on the source host's turn.
+        """
+        if self.registry_on_control_node:
+            if host.name == self.source:
+                python.call(
+                    name=f"Run local registry on the control node ({self.registry})",
+                    function=self._run_local_registry,
+                )
+            return
+
+        if host.name != self.registry_host:
+            return
+
+        if not host.get_fact(DockerImageLayers, image="registry:2"):
+            logger.warning(
+                f"registry:2 is not loaded on {host.name}, "
+                "docker will try to pull it from Docker Hub."
+            )
+
+        docker.container(
+            name=f"Run local registry on {self.registry}",
+            container=REGISTRY_CONTAINER,
+            image="registry:2",
+            ports=[f"{self.registry_port}:5000"],
+            volumes=[f"{REGISTRY_CONTAINER}:/var/lib/registry"],
+            present=True,
+            start=True,
+        )
+
+    def trust_registry(self):
+        """
+        Adds the plain HTTP registry to the docker daemon's insecure registries,
+        merging with the existing daemon.json (it carries the nvidia runtime).
+        Docker, and so every running app container, is only restarted when
+        daemon.json actually changed.
+        """
+        daemon_json = "/etc/docker/daemon.json"
+        current = host.get_fact(FileContents, path=daemon_json, _sudo=True)
+        config = json.loads("\n".join(current)) if current else {}
+
+        registries = config.setdefault("insecure-registries", [])
+        if self.registry in registries:
+            return
+        registries.append(self.registry)
+
+        update_config = files.put(
+            name=f"Trust registry {self.registry}",
+            src=StringIO(json.dumps(config, indent=2) + "\n"),
+            dest=daemon_json,
+            mode="644",
+            _sudo=True,
+        )
+        restart = systemd.service(
+            name="Restart docker to apply daemon.json",
+            service="docker",
+            restarted=True,
+            _if=lambda: update_config.changed,
+            _sudo=True,
+        )
+        invalidate_on_change(restart, *SYSTEMD_FACTS)
+
+    def push_to_registry(self):
+        """Pushes the image from the source host to the registry, once."""
+        if host.name == self.source:
+            server.shell(
+                name=f"Push {self.image_name} to {self.registry}",
+                commands=[
+                    f"docker tag {self.image_name} {self.registry}/{self.image_name}",
+                    f"docker push {self.registry}/{self.image_name}",
+                ],
+            )
+
+    def pull_from_registry(self):
+        """
+        Pulls the image on every target host, in parallel across the fleet and
+        with docker's concurrent layer downloads.
+        """
+        if host.name in self.targets:
+            server.shell(
+                name=f"Pull {self.image_name} from {self.registry}",
+                commands=[
+                    f"docker pull {self.registry}/{self.image_name}",
+                    f"docker tag {self.registry}/{self.image_name} {self.image_name}",
+                ],
+            )
+
+    def load_image(self):
+        """Loads the image from the tar file on every target host."""
+        if host.name in self.targets:
+            server.shell(
+                name=f"Load {self.image_name} from {self.tar_filename}",
+                commands=[f"docker load -i {self.tar_path}"],
+            )
+
+    def cleanup(self, control_node=False):
+        """
+        Removes the tar file to save disk space, with `control_node` also the copy
+        fetched to the control node once the targets have it.
+        """
+        files.file(
+            name=f"Remove {self.tar_filename}",
+            path=self.tar_path,
+            present=False,
+            _sudo=True,
+        )
+
+        def _remove_local():
+            Path(self.tar_path).unlink(missing_ok=True)
+
+        if control_node and host.name == self.source:
+            python.call(
+                name=f"Remove {self.tar_filename} from the control node",
+                function=_remove_local,
+            )
+
+    def distribute(self, mode="direct"):
+        """
+        Ships the image from the source to every target with one of the modes:
+
+        direct: the source's tar is fetched to the control node, which pushes it
+            to every host.
+        tree: hosts that already hold the tar relay it to the next ones.
+        delta: the source ships each host only the layers it is missing.
+        stream: like tree, but docker save | zstd | ssh | docker load, no tar on disk.
+        registry: push once to a local registry:2 mirror, every host pulls in parallel.
+        """
+        if mode == "registry":
+            # daemon.json changes restart docker: trust the registry before running it
+            self.trust_registry()
+            self.run_registry()
+            self.push_to_registry()
+            self.pull_from_registry()
+        elif mode == "delta":
+            self.ship_delta()
+        elif mode == "stream":
+            self.ensure_zstd()
+            self.relay_tree(stream=True)
+        else:
+            # --- Save the Docker image to a .tar file on the source host ---
+            self.save_image()
+
+            # --- Spread the .tar file across the fleet ---
+            if mode == "tree":
+                self.relay_tree()
+            else:
+                self.fetch_image()
+                self.push_direct()
+
+            # --- Load the image on all hosts ---
+            self.load_image()
+
+            # --- Clean up the tar file to save disk space ---
+            self.cleanup(control_node=mode != "tree")
+
+    def _image_id(self):
+        status, output = host.run_shell_command(
+            f"docker image inspect --format '{{{{.Id}}}}' {self.image_name}"
+        )
+        return output.stdout.strip() if status else None
+
+    def record_image_id(self):
+        """
+        Records the ID of the image on the source host, the digest of its config,
+        which save/load and registry push/pull both preserve.
+        """
+
+        def _record():
+            image_id = self._image_id()
+            if not image_id:
+                raise RuntimeError(f"Image {self.image_name} not found on {host.name}")
+            _image_ids[self.image_name] = image_id
+            logger.info(f"Distributing {self.image_name} as {image_id}")
+
+        if host.name == self.source:
+            python.call(name=f"Record {self.image_name} image ID", function=_record)
+
+    def verify_image_id(self):
+        """
+        Checks that every target runs the exact image recorded on the source, then
+        tags it with the short image ID so hosts can be compared at a glance.
+        """
+
+        def _verify():
+            expected = _image_ids.get(self.image_name)
+            image_id = self._image_id()
+            if image_id != expected:
+                raise RuntimeError(
+                    f"{self.image_name} on {host.name} is {image_id}, "
+                    f"expected {expected}"
+                )
+            repository = self.image_name.split(":")[0]
+            build_tag = f"{repository}:build-{image_id.split(':')[-1][:12]}"
+            host.run_shell_command(f"docker tag {self.image_name} {build_tag}")
+            logger.info(f"[{host.name}] {self.image_name} verified, tagged {build_tag}")
+
+        python.call(name=f"Verify {self.image_name} image ID", function=_verify)
+
+    def report_throughput(self):
+        """Logs the per-hop throughput recorded by the transfer commands."""
+
+        def _report():
+            status, output = host.run_shell_command(f"cat {DISTRIBUTION_LOG}")
+            if status:
+                for line in output.stdout_lines:
+                    logger.info(f"[{host.name}] {line}")
+
+        python.call(name="Report per-hop throughput", function=_report)
+
+    def start_benchmark(self):
+        """Records when the first host starts distributing."""
+
+        def _start():
+            _benchmark.setdefault("start", time.time())
+
+        python.call(name="Start distribution timer", function=_start)
+
+    def finish_benchmark(self, mode):
+        """
+        Records when the last host finishes and, once the run is over, appends the
+        wall time to BENCHMARK_LOG so every mode can be compared with the tar path.
+        """
+
+        def _finish():
+            _benchmark["end"] = time.time()
+            if "mode" not in _benchmark:
+                _benchmark.update(
+                    mode=mode, image=self.image_name, hosts=len(self.hosts)
+                )
+                atexit.register(_write_benchmark)
+
+        python.call(name="Stop distribution timer", function=_finish)
+
+
+def _write_benchmark():
+    record = {
+        "mode": _benchmark["mode"],
+        "image": _benchmark.get("image"),
+        "hosts": _benchmark["hosts"],
+        "wall_seconds": round(_benchmark["end"] - _benchmark["start"], 2),
+        "timestamp": int(_benchmark["end"]),
+    }
+    BENCHMARK_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with open(BENCHMARK_LOG, "a") as log:
+        log.write(json.dumps(record) + "\n")
+
+    latest = {}
+    with open(BENCHMARK_LOG) as log:
+        for line in log:
+            entry = json.loads(line)
+            latest[entry["mode"]] = entry["wall_seconds"]
+
+    logger.info(f"Distribution wall time ({record['mode']}): {record['wall_seconds']}s")
+    for mode, seconds in sorted(latest.items(), key=lambda item: item[1]):
+        logger.info(f"  latest {mode}: {seconds}s")
@@ -0,0 +1,150 @@
+import uuid
+from io import StringIO
+from pathlib import Path
+
+from pyinfra import host, logger
+from pyinfra.api import FactBase
+from pyinfra.facts.files import FindFiles
+from pyinfra.operations import files
+
+# Keyfiles of the host's connections, installed by Resources/set_network_agent.py
+STAGING_DIR = "/etc/p100x/network"
+
+CONFIG_FILE = Path(__file__).parent.parent / "Resources/network_config.csv"
+
+
+class NetworkMacs(FactBase):
+    """
+    Returns the MAC addresses of the host's network interfaces, lower case.
+    """
+
+    command = "cat /sys/class/net/*/address"
+
+    @staticmethod
+    def default():
+        return set()
+
+    def process(self, output):
+        return {line.strip().lower() for line in output if line.strip()}
+
+
+def parse_config(lines):
+    """
+    Parses network_config.csv lines (name;mac;ip;gw;dns;iface, header first)
+    into connection dicts, skipping incomplete lines.
+    """
+    connections = []
+    for line in list(lines)[1:]:
+        fields = [field.strip() for field in line.rstrip("\n").split(";")]
+        name, mac, ip, gw, dns, iface = (fields + [""] * 6)[:6]
+        if not all((name, mac, ip, gw, dns)):
+            if line.strip():
+                logger.warning(f"Skipping invalid network_config.csv line: {line}")
+            continue
+        connections.append(
+            {
+                "name": name,
+                "mac": mac.lower(),
+                "ip": ip,
+                "gw": gw,
+                "dns": dns,
+                "iface": iface,
+            }
+        )
+    return connections
+
+
+def render_keyfile(connection):
+    """
+    Renders a NetworkManager keyfile for a connection, bound to its MAC address.
+    The UUID derives from the name, so a rendering never changes unless the
+    connection does.
+    """
+    connection_uuid = uuid.uuid5(
+        uuid.NAMESPACE_DNS, f"p100x-network.{connection['name']}"
+    )
+    dns = ";".join(connection["dns"].replace(",", " ").split())
+    return (
+        "[connection]\n"
+        f"id={connection['name']}\n"
+        f"uuid={connection_uuid}\n"
+        "type=ethernet\n"
+        "autoconnect=true\n"
+        "\n"
+        "[ethernet]\n"
+        f"mac-address={connection['mac'].upper()}\n"
+        "\n"
+        "[ipv4]\n"
+        "method=manual\n"
+        f"address1={connection['ip']},{connection['gw']}\n"
+        f"dns={dns};\n"
+        "\n"
+        "[ipv6]\n"
+        "method=auto\n"
+    )
+
+
+class NetworkProfiles:
+    """
+    Ships each host only the connections of network_config.csv whose MAC it
+    has, as NetworkManager keyfiles in STAGING_DIR. The agent on the host then
+    installs just the profiles that differ from NetworkManager's.
+    """
+
+    def __init__(self, config_file=CONFIG_FILE, staging_dir=STAGING_DIR):
+        self.config_file = Path(config_file)
+        self.staging_dir = staging_dir
+        with open(self.config_file) as config:
+            connections = parse_config(config)
+        # Indexed by MAC, the last line wins as with the former script
+        self.by_mac = {connection["mac"]: connection for connection in connections}
+
+    def for_host(self, macs):
+        return [self.by_mac[mac] for mac in sorted(macs) if mac in self.by_mac]
+
+    def deploy(self):
+        """
+        Stages the host's keyfiles. Returns the staging operations, for the agent
+        to be restarted when one of them changed.
+        """
+        connections = self.for_host(host.get_fact(NetworkMacs))
+        if not connections:
+            logger.warning(f"[{host.name}] no network_config.csv line for its MACs")
+
+        files.directory(
+            name="Network profiles staging directory",
+            path=self.staging_dir,
+            mode="700",
+            _sudo=True,
+        )
+        keyfiles, operations = [], []
+        for connection in connections:
+            keyfile = f"{connection['name']}.nmconnection"
+            keyfiles.append(keyfile)
+            staging = files.put(
+                name=f"Stage network profile {connection['name']}",
+                src=StringIO(render_keyfile(connection)),
+                dest=f"{self.staging_dir}/{keyfile}",
+                mode="600",
+                _sudo=True,
+            )
+            operations.append(staging)
+
+        # Profiles of connections no longer in the CSV, for the agent to drop
+        staged = host.get_fact(
+            FindFiles,
+            path=self.staging_dir,
+            maxdepth=1,
+            fname="*.nmconnection",
+            _sudo=True,
+        )
+        for path in staged or []:
+            if Path(path).name not in keyfiles:
+                unstaging = files.file(
+                    name=f"Unstage network profile {Path(path).stem}",
+                    path=path,
+                    present=False,
+                    _sudo=True,
+                )
+                operations.append(unstaging)
+        return operations
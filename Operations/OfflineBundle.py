@@ -0,0 +1,159 @@
+import os
+import shlex
+from pathlib import Path
+
+from pyinfra import host, logger
+from pyinfra.operations import apt, files, python, server
+
+from Operations.FactCache import APT_FACTS, invalidate_on_change
+
+BUNDLES_DIR = Path(__file__).parent.parent / "Bundles"
+INSTALL_DIR = "/opt/p100x-bundle"
+OFFLINE_LIST = "/etc/apt/sources.list.d/p100x-offline.list"
+
+# Build and install tools the bundle itself relies on
+BUNDLE_PACKAGES = ["zstd"]
+
+
+def bundle_id(bundle_path):
+    """Reads the content ID out of a bundle name, p100x-bundle-<id>.tar."""
+    return Path(bundle_path).name[len("p100x-bundle-") : -len(".tar")]
+
+
+class OfflineBundle:
+    """
+    Builds and installs a self-contained provisioning bundle for air-gapped
+    sites: the .debs of the full dependency closure of the declared packages,
+    their GPG keys and the p100x-app image, in one archive named after the
+    SHA-256 of its contents.
+
+    The builder needs internet access and must run the fleet's Ubuntu release,
+    the closure is resolved against its apt indexes.
+    """
+
+    def __init__(self, transaction, image_name="p100x-app:latest", workdir=None):
+        """
+        :param transaction: AptTransaction holding the keys, repositories and
+                            packages to bundle, as declared by Operations classes.
+        """
+        self.transaction = transaction
+        self.transaction.add_packages(BUNDLE_PACKAGES)
+        self.image_name = image_name
+        self.workdir = workdir or "/var/tmp/p100x-bundle"
+
+    def _build_script(self):
+        packages = " ".join(self.transaction.packages)
+        keys = "\n".join(
+            f"{dest} {os.path.basename(dest)}" for dest in self.transaction.keys
+        )
+        stage = f"{self.workdir}/stage"
+        return [
+            f"rm -rf {stage} && mkdir -p {stage}/debs {stage}/keys",
+            # Full closure, virtual packages (<...>) dropped
+            f"cd {stage}/debs && apt-cache depends --recurse --no-recommends "
+            "--no-suggests --no-conflicts --no-breaks --no-replaces --no-enhances "
+            f"{packages} | grep '^[a-zA-Z0-9]' | sort -u > ../closure.txt",
+            # One download for the whole closure, one by one if a name has no
+            # candidate (e.g. a package only provided by another)
+            f"cd {stage}/debs && (xargs -a ../closure.txt apt-get download -q || "
+            "xargs -a ../closure.txt -n1 sh -c "
+            '\'apt-get download -q "$0" || echo "$0" >> ../missing.txt\')',
+            f"cd {stage}/debs && dpkg-scanpackages --multiversion . /dev/null "
+            "| gzip -9n > Packages.gz",
+            *(f"cp {dest} {stage}/keys/" for dest in self.transaction.keys),
+            f"printf '%s\\n' {shlex.quote(keys)} > {stage}/keys.list",
+            f"printf '%s\\n' {packages} > {stage}/packages.list",
+            f"docker save {self.image_name} | zstd -q -T0 -19 > {stage}/image.tar.zst",
+            f"cd {stage} && find . -type f ! -name MANIFEST.sha256 | LC_ALL=C sort "
+            "| xargs sha256sum > MANIFEST.sha256",
+            # Content address: the hash of the manifest covers every file
+            f"cd {stage} && id=$(sha256sum MANIFEST.sha256 | cut -c1-16) && "
+            "echo $id > ../bundle.id && "
+            f"tar -cf ../bundle.tar --sort=name --mtime=@0 --owner=0 --group=0 .",
+        ]
+
+    def build(self):
+        """
+        Resolves, downloads and packs the bundle on the current host, then fetches
+        it to Bundles/p100x-bundle-<id>.tar on the control node.
+        """
+        setup = server.shell(
+            name="Set up the repositories to bundle",
+            commands=self.transaction.setup_commands(),
+            _sudo=True,
+        )
+        invalidate_on_change(setup, "AptSources", "AptKeys")
+
+        tools = apt.packages(
+            name="Install bundle build tools",
+            packages=["dpkg-dev", "zstd"],
+            update=True,
+            _sudo=True,
+        )
+        invalidate_on_change(tools, *APT_FACTS)
+
+        server.shell(
+            name=f"Build offline bundle of {len(self.transaction.packages)} packages",
+            commands=self._build_script(),
+            _sudo=True,
+        )
+
+        def _fetch():
+            status, output = host.run_shell_command(f"cat {self.workdir}/bundle.id")
+            content_id = output.stdout.strip()
+            if not status or not content_id:
+                raise RuntimeError(f"No bundle built on {host.name}")
+
+            BUNDLES_DIR.mkdir(parents=True, exist_ok=True)
+            local_path = BUNDLES_DIR / f"p100x-bundle-{content_id}.tar"
+            if local_path.exists():
+                logger.info(f"{local_path.name} already fetched")
+                return
+            host.get_file(f"{self.workdir}/bundle.tar", str(local_path))
+            logger.info(f"Offline bundle saved to {local_path}")
+
+        python.call(name="Fetch offline bundle", function=_fetch)
+
+    @staticmethod
+    def _install_script(remote_archive, content_id):
+        target = f"{INSTALL_DIR}/{content_id}"
+        offline_apt = (
+            f"-o Dir::Etc::sourcelist={OFFLINE_LIST} -o Dir::Etc::sourceparts=- "
+            "-o APT::Get::List-Cleanup=0"
+        )
+        return [
+            f"[ -f {target}/MANIFEST.sha256 ] || "
+            f"(mkdir -p {target} && tar -xf {remote_archive} -C {target})",
+            f"cd {target} && sha256sum -c --quiet MANIFEST.sha256",
+            # Keep the keys where the online setup expects them
+            f"cd {target} && while read -r dest name; do "
+            '[ -n "$dest" ] && install -D -m 644 "keys/$name" "$dest"; '
+            "done < keys.list; true",
+            f'echo "deb [trusted=yes] file:{target}/debs ./" > {OFFLINE_LIST}',
+            f"apt-get update {offline_apt}",
+            f"DEBIAN_FRONTEND=noninteractive apt-get install -y {offline_apt} "
+            f"$(cat {target}/packages.list)",
+            f"zstd -dcq {target}/image.tar.zst | docker load",
+        ]
+
+    @classmethod
+    def install(cls, bundle_path):
+        """
+        Provisions the current host from a bundle built by build(), without any
+        network access: apt only reads the bundle's file: repository.
+        """
+        content_id = bundle_id(bundle_path)
+        remote_archive = f"/var/tmp/p100x-bundle-{content_id}.tar"
+
+        files.put(
+            name=f"Upload offline bundle {content_id}",
+            src=str(bundle_path),
+            dest=remote_archive,
+            _sudo=True,
+        )
+        install = server.shell(
+            name=f"Provision from offline bundle {content_id}",
+            commands=cls._install_script(remote_archive, content_id),
+            _sudo=True,
+        )
+        invalidate_on_change(install, *APT_FACTS)
@@ -0,0 +1,224 @@
+import atexit
+import io
+import json
+import os
+import time
+from pathlib import Path
+
+from pyinfra import host, logger, state
+from pyinfra.api.host import Host
+from pyinfra.api.state import BaseStateCallback
+
+RESULTS_DIR = Path(__file__).parent.parent / "Benchmarks/results"
+RESULTS_FILE = RESULTS_DIR / "operation_timings.jsonl"
+# P100X_OP_TIMING_PROM takes a file path or the node exporter's textfile collector
+# directory, written to as <dir>/operation_timings.prom
+PROM_FILE = RESULTS_DIR / "operation_timings.prom"
+
+# Rows of the end of run summary
+SUMMARY_ROWS = 10
+
+
+def _flag(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _size(filename_or_io):
+    """Size of a local file path or file-like object, None if unknown."""
+    if isinstance(filename_or_io, (str, os.PathLike)):
+        try:
+            return os.path.getsize(filename_or_io)
+        except OSError:
+            return None
+    if isinstance(filename_or_io, (io.StringIO, io.BytesIO)):
+        value = filename_or_io.getvalue()
+        return len(value.encode() if isinstance(value, str) else value)
+    try:
+        return os.fstat(filename_or_io.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class OperationTimer(BaseStateCallback):
+    """
+    Records, for every operation on every host, when it started and ended,
+    whether it changed anything and how many bytes it uploaded or downloaded.
+
+    At the end of the run the records are appended to RESULTS_FILE as JSON lines,
+    written as a Prometheus textfile and summarised as the slowest operations and
+    hosts. Enabled with --data op_timing=true or P100X_OP_TIMING=1, otherwise
+    install() returns without registering anything.
+    """
+
+    _installed = None
+
+    def __init__(self, results_file=RESULTS_FILE, prom_file=PROM_FILE):
+        self.results_file = Path(results_file)
+        self.prom_file = Path(prom_file)
+        if self.prom_file.is_dir():
+            self.prom_file = self.prom_file / PROM_FILE.name
+        self.run_started = time.time()
+        self.records = []
+        # (host name, op hash) -> record of the operation running there
+        self._running = {}
+        # host name -> op hash, to attribute file transfers
+        self._current = {}
+
+    # pyinfra callbacks
+
+    def operation_host_start(self, state, host, op_hash):
+        self._current[host.name] = op_hash
+        self._running[(host.name, op_hash)] = {
+            "host": host.name,
+            "op_hash": op_hash,
+            "start": time.time(),
+            "end": None,
+            "bytes": 0,
+        }
+
+    def _host_done(self, host, op_hash, success, retry_count):
+        record = self._running.get((host.name, op_hash))
+        if record is not None:
+            record["end"] = time.time()
+            record["success"] = success
+            record["retries"] = retry_count
+        self._current.pop(host.name, None)
+
+    def operation_host_success(self, state, host, op_hash, retry_count=0):
+        self._host_done(host, op_hash, True, retry_count)
+
+    def operation_host_error(self, state, host, op_hash, retry_count=0, max_retries=0):
+        self._host_done(host, op_hash, False, retry_count)
+
+    def operation_end(self, state, op_hash):
+        # Hosts only know whether they changed something once the operation has
+        # completed everywhere
+        name = ", ".join(sorted(state.get_op_meta(op_hash).names))
+        for key in [key for key in self._running if key[1] == op_hash]:
+            record = self._running.pop(key)
+            if record["end"] is None:
+                # Operation not part of this host's deploy
+                continue
+            op_host = state.inventory.get_host(record["host"])
+            meta = state.get_op_data_for_host(op_host, op_hash).operation_meta
+            record.update(
+                operation=name,
+                duration=round(record["end"] - record["start"], 4),
+                changed=meta.is_complete() and meta.did_change(),
+            )
+            self.records.append(record)
+
+    def count_bytes(self, host_name, size):
+        op_hash = self._current.get(host_name)
+        record = self._running.get((host_name, op_hash))
+        if record is not None and size:
+            record["bytes"] += size
+
+    # Outputs
+
+    def save(self):
+        if not self.records:
+            return
+        self.results_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.results_file, "a") as results:
+            for record in self.records:
+                results.write(
+                    json.dumps({**record, "run_started": self.run_started}) + "\n"
+                )
+
+    def write_prometheus(self):
+        if not self.records:
+            return
+        metrics = {
+            "p100x_operation_duration_seconds": ("gauge", "duration"),
+            "p100x_operation_changed": ("gauge", "changed"),
+            "p100x_operation_bytes_transferred": ("gauge", "bytes"),
+        }
+        lines = []
+        for metric, (kind, field) in metrics.items():
+            lines.append(f"# TYPE {metric} {kind}")
+            for record in self.records:
+                labels = (
+                    f'host="{_label(record["host"])}",'
+                    f'operation="{_label(record["operation"])}",'
+                    f'op_hash="{record["op_hash"]}"'
+                )
+                lines.append(f"{metric}{{{labels}}} {float(record[field])}")
+        lines.append("# TYPE p100x_operation_run_timestamp_seconds gauge")
+        lines.append(f"p100x_operation_run_timestamp_seconds {self.run_started}")
+
+        # Written aside then renamed, so the node exporter never reads half a file
+        self.prom_file.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.prom_file.with_suffix(".prom.tmp")
+        partial.write_text("\n".join(lines) + "\n")
+        partial.replace(self.prom_file)
+
+    def report(self, rows=SUMMARY_ROWS):
+        if not self.records:
+            return
+        slowest = sorted(self.records, key=lambda record: -record["duration"])
+        logger.info(f"Slowest operations (of {len(self.records)}):")
+        logger.info(
+            f"{'SECONDS':>9}  {'CHANGED':<8}{'BYTES':>12}  {'HOST':<18}OPERATION"
+        )
+        for record in slowest[:rows]:
+            logger.info(
+                f"{record['duration']:>9.2f}  {str(record['changed']):<8}"
+                f"{record['bytes']:>12}  {record['host']:<18}{record['operation']}"
+            )
+
+        hosts = {}
+        for record in self.records:
+            total = hosts.setdefault(record["host"], [0.0, 0, 0])
+            total[0] += record["duration"]
+            total[1] += record["changed"]
+            total[2] += record["bytes"]
+        logger.info("Slowest hosts:")
+        logger.info(f"{'SECONDS':>9}  {'CHANGED':<8}{'BYTES':>12}  HOST")
+        ranked = sorted(hosts.items(), key=lambda item: -item[1][0])
+        for host_name, (seconds, changed, size) in ranked[:rows]:
+            logger.info(f"{seconds:>9.2f}  {changed:<8}{size:>12}  {host_name}")
+
+    @classmethod
+    def install(cls):
+        """
+        Registers the timer with the current pyinfra state when timing is enabled.
+        Safe to call from every host's deploy code, only the first call installs it.
+        """
+        if cls._installed is not None:
+            return cls._installed
+        if not (
+            _flag(os.getenv("P100X_OP_TIMING", ""))
+            or _flag(host.data.get("op_timing", False))
+        ):
+            return None
+
+        timer = cls(
+            results_file=os.getenv("P100X_OP_TIMING_FILE", RESULTS_FILE),
+            prom_file=os.getenv("P100X_OP_TIMING_PROM", PROM_FILE),
+        )
+        put_file = Host.put_file
+        get_file = Host.get_file
+
+        def timed_put_file(self, filename_or_io, *args, **kwargs):
+            done = put_file(self, filename_or_io, *args, **kwargs)
+            timer.count_bytes(self.name, _size(filename_or_io))
+            return done
+
+        def timed_get_file(self, remote_filename, filename_or_io, *args, **kwargs):
+            done = get_file(self, remote_filename, filename_or_io, *args, **kwargs)
+            timer.count_bytes(self.name, _size(filename_or_io))
+            return done
+
+        Host.put_file = timed_put_file
+        Host.get_file = timed_get_file
+        state.add_callback_handler(timer)
+        atexit.register(timer.report)
+        atexit.register(timer.write_prometheus)
+        atexit.register(timer.save)
+        cls._installed = timer
+        return timer
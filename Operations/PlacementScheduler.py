@@ -0,0 +1,200 @@
+from pyinfra import inventory, logger
+from pyinfra.api import FactBase
+
+from Operations.docker_facts import DockerContainerReservations
+
+NVIDIA_SMI_QUERY = "index,uuid,name,memory.total,memory.used,memory.free"
+
+UNITS = {"b": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+# Shared by every host of the run: the fleet is planned once, on the first host
+_plans = {}
+
+
+def parse_size(value):
+    """
+    Parses a docker memory string ('50g', '512m'), a /proc/meminfo value
+    ('65536 kB') or an nvidia-smi value ('81920 MiB') into bytes.
+    """
+    value = str(value).strip().lower().replace("ib", "").replace(" ", "")
+    if value[-1:] == "b" and value[-2:-1] in UNITS:
+        value = value[:-1]
+    if value[-1:] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(float(value))
+
+
+def parse_nvidia_smi_csv(output, query=NVIDIA_SMI_QUERY):
+    """
+    Parses `nvidia-smi --query-gpu=<query> --format=csv[,noheader][,nounits]`
+    output into one dict per GPU, keyed by the query fields. Memory fields are
+    returned in bytes, MiB being nvidia-smi's unit when `nounits` is set.
+    """
+    fields = query.split(",")
+    gpus = []
+    for line in output:
+        values = [value.strip() for value in line.split(",")]
+        if not line.strip() or values[0] == fields[0]:
+            continue
+        gpu = dict(zip(fields, values))
+        for field in fields:
+            if field.startswith("memory."):
+                size = gpu[field]
+                if size.startswith("[") or not size:
+                    gpu[field] = 0
+                else:
+                    gpu[field] = parse_size(size if " " in size else f"{size}m")
+        gpu["index"] = int(gpu["index"])
+        gpus.append(gpu)
+    return gpus
+
+
+class GpuInventory(FactBase):
+    """
+    Returns the GPUs of the host with their memory in bytes, empty without
+    nvidia-smi.
+    """
+
+    @staticmethod
+    def default():
+        return []
+
+    def command(self):
+        return (
+            f"nvidia-smi --query-gpu={NVIDIA_SMI_QUERY} "
+            "--format=csv,noheader,nounits 2>/dev/null || true"
+        )
+
+    def process(self, output):
+        return parse_nvidia_smi_csv(output)
+
+
+class MemoryInfo(FactBase):
+    """
+    Returns MemTotal and MemAvailable of the host, in bytes.
+    """
+
+    def command(self):
+        return "grep -E '^Mem(Total|Available):' /proc/meminfo"
+
+    def process(self, output):
+        info = {}
+        for line in output:
+            key, value = line.split(":", 1)
+            info[key] = parse_size(value)
+        return {"total": info["MemTotal"], "available": info["MemAvailable"]}
+
+
+class PlacementScheduler:
+    """
+    Places new p100x-app containers over the fleet with best-fit decreasing bin
+    packing: the largest apps go first, each to the host, and then the GPU, that
+    it leaves with the least spare memory. A host's free memory is what neither
+    the containers' --memory reservations nor the kernel's MemAvailable rule out,
+    less `headroom`.
+
+    `nodes` maps host names to {'memory': MemoryInfo, 'gpus': GpuInventory,
+    'reservations': DockerContainerReservations}.
+    """
+
+    def __init__(self, nodes, headroom="4g"):
+        self.headroom = parse_size(headroom)
+        self.free_memory = {}
+        self.gpus = {}
+
+        for name, node in nodes.items():
+            reserved = sum(
+                container["memory"] for container in node["reservations"].values()
+            )
+            self.free_memory[name] = (
+                min(node["memory"]["total"] - reserved, node["memory"]["available"])
+                - self.headroom
+            )
+
+            # Containers started with --gpus all count on every GPU of the host
+            gpus, indexes = {}, {}
+            for gpu in node["gpus"]:
+                gpus[gpu["index"]] = {"free": gpu["memory.free"], "apps": 0}
+                indexes[gpu["index"]] = indexes[gpu["uuid"]] = gpu["index"]
+            for container in node["reservations"].values():
+                devices = container["gpus"]
+                for device in gpus if devices == "all" else devices:
+                    if device in indexes:
+                        gpus[indexes[device]]["apps"] += 1
+            self.gpus[name] = gpus
+
+    @classmethod
+    def from_inventory(cls, hosts=None, headroom="4g"):
+        """Gathers the placement facts of `hosts`, every inventory host by default."""
+        hosts = hosts or [fleet_host.name for fleet_host in inventory]
+        nodes = {}
+        for name in hosts:
+            fleet_host = inventory.get_host(name)
+            nodes[name] = {
+                "memory": fleet_host.get_fact(MemoryInfo),
+                "gpus": fleet_host.get_fact(GpuInventory),
+                "reservations": fleet_host.get_fact(DockerContainerReservations),
+            }
+        return cls(nodes, headroom=headroom)
+
+    def _pick_gpu(self, name, gpu_memory):
+        """Best fit on GPU memory, then the GPU serving the fewest apps."""
+        fitting = [
+            (gpu["free"] - gpu_memory, gpu["apps"], index)
+            for index, gpu in self.gpus[name].items()
+            if gpu["free"] >= gpu_memory
+        ]
+        return min(fitting)[2] if fitting else None
+
+    def place(self, apps):
+        """
+        Assigns every app a host and a GPU. Apps carry 'mem_ram' and optionally
+        'gpu_mem' (e.g. '8g'), the GPU memory they need.
+
+        Returns ({host: [app configs with 'gpu_device' set]}, [unplaced apps]).
+        """
+        placements = {}
+        unplaced = []
+
+        for app in sorted(apps, key=lambda app: -parse_size(app["mem_ram"])):
+            memory = parse_size(app["mem_ram"])
+            gpu_memory = parse_size(app.get("gpu_mem", 0))
+
+            candidates = []
+            for name, free in self.free_memory.items():
+                if free < memory:
+                    continue
+                gpu = self._pick_gpu(name, gpu_memory)
+                if gpu is not None:
+                    candidates.append((free - memory, name, gpu))
+
+            if not candidates:
+                logger.warning(
+                    f"No host can fit {app['name']} "
+                    f"({app['mem_ram']} RAM, {app.get('gpu_mem', 0)} GPU memory)"
+                )
+                unplaced.append(app)
+                continue
+
+            _, name, gpu = min(candidates)
+            self.free_memory[name] -= memory
+            self.gpus[name][gpu]["free"] -= gpu_memory
+            self.gpus[name][gpu]["apps"] += 1
+            placements.setdefault(name, []).append({**app, "gpu_device": gpu})
+            logger.info(f"Placing {app['name']} on {name}, GPU {gpu}")
+
+        return placements, unplaced
+
+
+def plan_placement(apps, hosts=None, headroom="4g"):
+    """
+    Plans the placement of `apps` once per run, so every host of the deploy
+    acts on the same plan.
+    """
+    if "placements" not in _plans:
+        scheduler = PlacementScheduler.from_inventory(hosts, headroom=headroom)
+        _plans["placements"], _plans["unplaced"] = scheduler.place(apps)
+        if _plans["unplaced"]:
+            names = ", ".join(app["name"] for app in _plans["unplaced"])
+            logger.error(f"Could not place: {names}")
+    return _plans["placements"]
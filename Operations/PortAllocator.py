@@ -0,0 +1,113 @@
+import re
+import shlex
+import threading
+
+from pyinfra.api import FactBase
+
+# Set on every p100x-app container, so stopped containers keep their port
+HTTP_PORT_LABEL = "akira.http-port"
+
+# Serializes the last-moment port check and `docker run` between concurrent runs
+PORT_LOCK_FILE = "/tmp/p100x-ports.lock"
+
+DEFAULT_PORT_RANGE = (9500, 9999)
+
+
+def parse_ss_ports(output):
+    """Parses the local ports of `ss -ltnH` lines ('LISTEN 0 4096 [::]:22 [::]:*')."""
+    ports = set()
+    for line in output:
+        columns = line.split()
+        if len(columns) >= 4:
+            port = columns[3].rsplit(":", 1)[-1]
+            if port.isdigit():
+                ports.add(int(port))
+    return ports
+
+
+def published_ports(ports):
+    """Parses the host ports of a `docker ps` ports column (0.0.0.0:9595->9595/tcp)."""
+    return {int(port) for port in re.findall(r":(\d+)->", ports)}
+
+
+class ListeningPorts(FactBase):
+    """
+    Returns the TCP ports the host listens on.
+    """
+
+    @staticmethod
+    def default():
+        return set()
+
+    def command(self):
+        return "ss -ltnH"
+
+    def process(self, output):
+        return parse_ss_ports(output)
+
+
+class PortAllocator:
+    """
+    Hands out free host ports from `port_range` for AKIRAEDGE_HTTP_PORT.
+
+    A port is bound if a socket listens on it, a container publishes it, or a
+    container, running or not, was created with it (HTTP_PORT_LABEL). Ports handed
+    out during the run are reserved per host under a lock, so concurrent create
+    operations on the same host never get the same port.
+    """
+
+    _lock = threading.Lock()
+    _reserved = {}
+
+    def __init__(self, port_range=DEFAULT_PORT_RANGE):
+        self.first, self.last = port_range
+
+    @staticmethod
+    def bound_ports(containers, listening):
+        """
+        Indexes the bound ports of a host in one pass over its container snapshot
+        and its ListeningPorts fact.
+        """
+        bound = set(listening)
+        for container in containers.values():
+            bound.update(published_ports(container["ports"]))
+            port = container["labels"].get(HTTP_PORT_LABEL, "")
+            if port.isdigit():
+                bound.add(int(port))
+        return bound
+
+    def allocate(self, host_name, bound):
+        """Reserves and returns the lowest free port of the range, None if full."""
+        with self._lock:
+            reserved = self._reserved.setdefault(host_name, set())
+            for port in range(self.first, self.last + 1):
+                if port not in bound and port not in reserved:
+                    reserved.add(port)
+                    return port
+        return None
+
+    def reserve(self, host_name, port):
+        """
+        Reserves a port chosen by the operator. Returns False if another create
+        operation of the run already holds it.
+        """
+        with self._lock:
+            reserved = self._reserved.setdefault(host_name, set())
+            if port in reserved:
+                return False
+            reserved.add(port)
+            return True
+
+    @staticmethod
+    def guarded(port, command):
+        """
+        Wraps a `docker run` so it fails with a clear message, instead of a bind
+        error, if the port got taken since the index was built (another run, a
+        host-network container starting up).
+        """
+        check = (
+            f'if ss -ltnH "sport = :{port}" | grep -q . || '
+            f'[ -n "$(docker ps -aq --filter label={HTTP_PORT_LABEL}={port})" ]; '
+            f'then echo "Port {port} is already in use" >&2; exit 1; fi; '
+        )
+        return f"flock {PORT_LOCK_FILE} sh -c {shlex.quote(check + command)}"
@@ -0,0 +1,130 @@
+import shlex
+import time
+
+from gevent import sleep
+from pyinfra import host, logger
+from pyinfra.operations import python, server
+
+from Operations.PortAllocator import HTTP_PORT_LABEL, published_ports
+
+REBOOT_REQUIRED_FILE = "/var/run/reboot-required"
+
+DOCKER_READY = "systemctl is-active --quiet docker && docker info >/dev/null 2>&1"
+
+APP_IMAGE = "p100x-app"
+
+# Image, HTTP port label and published ports of every running container
+RUNNING_CONTAINERS = (
+    f'docker ps --format \'{{{{.Image}}}}|{{{{.Label "{HTTP_PORT_LABEL}"}}}}|'
+    "{{.Ports}}'"
+)
+
+
+def http_ready(port):
+    """Any HTTP answer counts, the app may well reply 404 on /."""
+    return f"curl -s -o /dev/null --max-time 3 http://127.0.0.1:{port}/"
+
+
+def app_http_ports(lines):
+    """
+    Returns the HTTP ports of the p100x-app containers from RUNNING_CONTAINERS
+    lines: the labelled port, or for containers created before the label the
+    ports they publish.
+    """
+    ports = set()
+    for line in lines:
+        image, _, rest = line.strip().partition("|")
+        label, _, published = rest.partition("|")
+        if label.isdigit():
+            ports.add(int(label))
+        elif image.rsplit("/", 1)[-1].split(":")[0] == APP_IMAGE:
+            ports |= published_ports(published)
+    return sorted(ports)
+
+
+class RebootManager:
+    """
+    Reboots the current host and waits until it serves again: SSH back, the
+    Docker daemon up and every p100x-app HTTP port that answered before the
+    reboot answering again.
+
+    Batches come from running the playbook through Deploy/rollout.py, a wave of
+    hosts rebooting together and the next wave starting once they are all ready,
+    which bounds how much of the fleet is down at once.
+    """
+
+    def __init__(self, delay=10, interval=5, timeout=600, ports=None):
+        """
+        :param delay: Seconds to wait after issuing the reboot.
+        :param interval: Seconds between two readiness probes.
+        :param timeout: Seconds allowed for SSH, then again for the services.
+        :param ports: HTTP ports to wait for, by default those of the p100x-app
+                      containers running before the reboot.
+        """
+        self.delay = delay
+        self.interval = interval
+        self.timeout = timeout
+        self.ports = ports
+        self.required = True
+
+    def _record_ports(self):
+        if self.ports is not None:
+            return
+        status, output = host.run_shell_command(RUNNING_CONTAINERS, _sudo=True)
+        self.ports = app_http_ports(output.stdout_lines) if status else []
+
+    def _check_required(self):
+        status, _ = host.run_shell_command(f"test -f {REBOOT_REQUIRED_FILE}")
+        self.required = status
+        if not status:
+            logger.info(f"[{host.name}] no reboot required")
+
+    def wait_ready(self):
+        """Probes the host until Docker and the HTTP ports answer, or times out."""
+        checks = [DOCKER_READY] + [http_ready(port) for port in self.ports or []]
+        command = " && ".join(f"({check})" for check in checks)
+        start = time.time()
+        while True:
+            status, _ = host.run_shell_command(
+                f"sh -c {shlex.quote(command)}", _sudo=True
+            )
+            if status:
+                logger.info(
+                    f"[{host.name}] ready after {time.time() - start:.0f}s "
+                    f"(docker, ports {self.ports or '-'})"
+                )
+                return
+            if time.time() - start > self.timeout:
+                raise RuntimeError(
+                    f"{host.name} not ready {self.timeout}s after reboot "
+                    f"(docker, ports {self.ports or '-'})"
+                )
+            sleep(self.interval)
+
+    def reboot(self, only_if_required=False):
+        """
+        Reboots the host and waits for it to be ready. With only_if_required,
+        only hosts flagged by the package manager (REBOOT_REQUIRED_FILE) reboot.
+        """
+        if only_if_required:
+            python.call(
+                name="Check whether a reboot is required", function=self._check_required
+            )
+        python.call(
+            name="Record the HTTP ports to wait for",
+            function=self._record_ports,
+            _if=lambda: self.required,
+        )
+        server.reboot(
+            name="Reboot",
+            delay=self.delay,
+            interval=self.interval,
+            reboot_timeout=self.timeout,
+            _if=lambda: self.required,
+            _sudo=True,
+        )
+        python.call(
+            name="Wait for Docker and the p100x-app ports",
+            function=self.wait_ready,
+            _if=lambda: self.required,
+        )
@@ -0,0 +1,130 @@
+import runpy
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def load_inventory(inventory_file):
+    """
+    Loads the `hosts` list of a pyinfra inventory file as (name, data) pairs.
+    Entries may be plain names or (name, data) tuples carrying e.g. a `site`.
+    """
+    hosts = runpy.run_path(inventory_file)["hosts"]
+    return [entry if isinstance(entry, tuple) else (entry, {}) for entry in hosts]
+
+
+class RolloutScheduler:
+    """
+    Rolls a deploy out over the inventory in waves: a canary host first, then
+    waves of `wave_size` hosts, each host in its own pyinfra run.
+
+    At most `max_parallel` hosts run at once, and at most
+    site_bandwidth_mbps / host_bandwidth_mbps hosts of the same site, so parallel
+    pushes cannot saturate a site uplink. A wave stops starting new hosts, and no
+    later wave runs, once its failure rate crosses `failure_threshold`.
+    """
+
+    def __init__(
+        self,
+        hosts,
+        canary=None,
+        wave_size=2,
+        max_parallel=4,
+        site_bandwidth_mbps=None,
+        host_bandwidth_mbps=None,
+        failure_threshold=0.25,
+    ):
+        self.hosts = list(hosts)
+        self.canary = canary or self.hosts[0][0]
+        self.wave_size = wave_size
+        self.max_parallel = max_parallel
+        self.failure_threshold = failure_threshold
+
+        self.site_parallel = max_parallel
+        if site_bandwidth_mbps and host_bandwidth_mbps:
+            self.site_parallel = max(1, int(site_bandwidth_mbps // host_bandwidth_mbps))
+
+        self.sites = {name: data.get("site", "default") for name, data in self.hosts}
+        self._site_slots = {
+            site: threading.BoundedSemaphore(self.site_parallel)
+            for site in set(self.sites.values())
+        }
+
+    def plan(self):
+        """Returns the waves to run, the canary alone in the first one."""
+        rest = [name for name, _ in self.hosts if name != self.canary]
+        waves = [[self.canary]]
+        waves.extend(
+            rest[start : start + self.wave_size]
+            for start in range(0, len(rest), self.wave_size)
+        )
+        return waves
+
+    def _run_host(self, name, command, wave_state):
+        with self._site_slots[self.sites[name]]:
+            with wave_state["lock"]:
+                if wave_state["stopped"]:
+                    print(f"[{name}] skipped, wave stopped")
+                    return None
+
+            start = time.time()
+            result = subprocess.run(
+                command + ["--limit", name],
+                # pyinfra logs to stderr, kept in order with its output
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            )
+            duration = time.time() - start
+
+        succeeded = result.returncode == 0
+        print(f"[{name}] {'ok' if succeeded else 'FAILED'} in {duration:.1f}s")
+        if not succeeded:
+            for line in result.stdout.splitlines()[-20:]:
+                print(f"[{name}]   {line}")
+
+        with wave_state["lock"]:
+            if not succeeded:
+                wave_state["failed"] += 1
+            if wave_state["failed"] / wave_state["size"] > self.failure_threshold:
+                wave_state["stopped"] = True
+        return succeeded
+
+    def run(self, inventory_file, deploy_file, pyinfra_args=()):
+        """
+        Runs `deploy_file` wave by wave. Returns True if every wave completed
+        under the failure threshold.
+        """
+        command = ["pyinfra", inventory_file, deploy_file, "-y", *pyinfra_args]
+        waves = self.plan()
+
+        for number, wave in enumerate(waves, start=1):
+            print(
+                f"--- Wave {number}/{len(waves)}: {', '.join(wave)} "
+                f"(max {self.max_parallel} parallel, {self.site_parallel} per site)"
+            )
+            wave_state = {
+                "lock": threading.Lock(),
+                "size": len(wave),
+                "failed": 0,
+                "stopped": False,
+            }
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+                list(
+                    executor.map(
+                        lambda name: self._run_host(name, command, wave_state),
+                        wave,
+                    )
+                )
+
+            failure_rate = wave_state["failed"] / wave_state["size"]
+            if failure_rate > self.failure_threshold:
+                print(
+                    f"Wave {number} failure rate {failure_rate:.0%} is above "
+                    f"{self.failure_threshold:.0%}. Rollout stopped."
+                )
+                return False
+
+        print("Rollout completed.")
+        return True
@@ -0,0 +1,280 @@
+import ast
+import hashlib
+import json
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+CHECKPOINT_DIR = Path.home() / ".cache/deploy_manager/checkpoints"
+PROJECT_ROOT = Path(__file__).parent.parent
+# Files a stage uploads are referenced by their path from the project root
+UPLOADED_DIRS = ("Resources/", "Templates/")
+
+
+def _module_file(name, project_root):
+    base = Path(project_root, *name.split("."))
+    for candidate in (base.with_suffix(".py"), base / "__init__.py"):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def stage_inputs(path, project_root=PROJECT_ROOT):
+    """
+    Returns the files a stage depends on besides its own: the project modules it
+    imports, followed transitively (Operations/*, Deploy/stages/_common.py...),
+    and the Resources/ and Templates/ files any of them references.
+    """
+    inputs, queue = set(), [Path(path)]
+    while queue:
+        tree = ast.parse(queue.pop().read_text())
+        for node in ast.walk(tree):
+            modules = []
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module] + [
+                    f"{node.module}.{alias.name}" for alias in node.names
+                ]
+            elif (
+                isinstance(node, ast.Constant)
+                and isinstance(node.value, str)
+                and node.value.startswith(UPLOADED_DIRS)
+            ):
+                uploaded = Path(project_root, node.value)
+                if uploaded.is_dir():
+                    inputs.update(
+                        file
+                        for file in uploaded.rglob("*")
+                        if file.is_file() and "__pycache__" not in file.parts
+                    )
+                elif uploaded.is_file():
+                    inputs.add(uploaded)
+            for module in modules:
+                module_file = _module_file(module, project_root)
+                if module_file and module_file not in inputs:
+                    inputs.add(module_file)
+                    queue.append(module_file)
+    inputs.discard(Path(path))
+    return sorted(str(file) for file in inputs)
+
+
+def load_stages(stages_dir, project_root=PROJECT_ROOT):
+    """
+    Reads the stages of a directory, one deploy file each, as
+    {name: {"path", "depends", "locks", "inputs"}}. A stage declares the stages
+    it needs with a module level DEPENDS list and the host resources it holds
+    with LOCKS; both are read without running the file, as are its inputs (see
+    stage_inputs). Files starting with _ are helpers.
+    """
+    stages = {}
+    for path in sorted(Path(stages_dir).glob("*.py")):
+        if path.name.startswith("_"):
+            continue
+        declared = {"DEPENDS": [], "LOCKS": []}
+        for node in ast.parse(path.read_text()).body:
+            if isinstance(node, ast.Assign) and len(node.targets) == 1:
+                target = node.targets[0]
+                if isinstance(target, ast.Name) and target.id in declared:
+                    declared[target.id] = list(ast.literal_eval(node.value))
+        stages[path.stem] = {
+            "path": str(path),
+            "depends": declared["DEPENDS"],
+            "locks": declared["LOCKS"],
+            "inputs": stage_inputs(path, project_root),
+        }
+    return stages
+
+
+def stage_digest(stage):
+    """Digest of a stage's file and its inputs, a removed input counting too."""
+    digest = hashlib.sha256()
+    for file in [stage["path"], *stage.get("inputs", [])]:
+        digest.update(Path(file).name.encode() + b"\0")
+        try:
+            digest.update(Path(file).read_bytes())
+        except FileNotFoundError:
+            digest.update(b"\0missing")
+    return digest.hexdigest()[:16]
+
+
+class StagePipeline:
+    """
+    Runs deploy stages as a DAG on every host: a stage starts on a host once the
+    stages it depends on completed there, so independent stages run side by side,
+    each in its own pyinfra run limited to the host. Stages sharing a lock (e.g.
+    "apt", as dpkg allows one writer) never overlap on a host.
+
+    Every completed stage is checkpointed per host, with a digest of its file and
+    inputs, so a rerun resumes each host from its first incomplete stage and a
+    stage whose file, imported modules or uploaded resources changed runs again.
+    """
+
+    def __init__(
+        self,
+        stages,
+        hosts,
+        max_parallel=4,
+        stage_parallel=2,
+        checkpoint_dir=CHECKPOINT_DIR,
+    ):
+        self.stages = stages
+        self.hosts = list(hosts)
+        self.max_parallel = max_parallel
+        self.stage_parallel = stage_parallel
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.order = self.plan()
+
+    def plan(self):
+        """Returns the stages in dependency order, rejecting unknown or cyclic ones."""
+        order, visiting = [], set()
+
+        def visit(name, chain):
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name!r} needed by {chain[-1]!r}")
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage cycle: {' -> '.join(chain + [name])}")
+            visiting.add(name)
+            for dependency in self.stages[name]["depends"]:
+                visit(dependency, chain + [name])
+            visiting.discard(name)
+            order.append(name)
+
+        for name in sorted(self.stages):
+            visit(name, [])
+        return order
+
+    def _checkpoint_file(self, host_name):
+        return self.checkpoint_dir / f"{host_name}.json"
+
+    def completed(self, host_name):
+        """Stages checkpointed on a host whose file and inputs did not change since."""
+        try:
+            checkpoint = json.loads(self._checkpoint_file(host_name).read_text())
+        except (OSError, ValueError):
+            return {}
+        return {
+            name: entry
+            for name, entry in checkpoint.items()
+            if name in self.stages
+            and entry["digest"] == stage_digest(self.stages[name])
+        }
+
+    def _checkpoint(self, host_name, name, duration):
+        checkpoint = self.completed(host_name)
+        checkpoint[name] = {
+            "digest": stage_digest(self.stages[name]),
+            "finished": time.time(),
+            "duration": round(duration, 1),
+        }
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        path = self._checkpoint_file(host_name)
+        partial = path.with_suffix(".json.tmp")
+        partial.write_text(json.dumps(checkpoint, indent=2))
+        partial.replace(path)
+
+    def reset(self, names=None):
+        """Forgets the checkpoints of `names` (every stage if None) on all hosts."""
+        for host_name in self.hosts:
+            path = self._checkpoint_file(host_name)
+            if names is None:
+                path.unlink(missing_ok=True)
+                continue
+            checkpoint = self.completed(host_name)
+            for name in names:
+                checkpoint.pop(name, None)
+            if path.exists():
+                path.write_text(json.dumps(checkpoint, indent=2))
+
+    def _run_stage(self, host_name, name, command):
+        start = time.time()
+        result = subprocess.run(
+            command + [self.stages[name]["path"], "--limit", host_name],
+            # pyinfra logs to stderr, kept in order with its output
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        duration = time.time() - start
+
+        succeeded = result.returncode == 0
+        print(
+            f"[{host_name}] {name} {'ok' if succeeded else 'FAILED'} in {duration:.1f}s"
+        )
+        if not succeeded:
+            for line in result.stdout.splitlines()[-20:]:
+                print(f"[{host_name}]   {line}")
+        return succeeded, duration
+
+    def _run_host(self, host_name, command):
+        done = set(self.completed(host_name))
+        if done:
+            print(f"[{host_name}] resuming, done: {', '.join(sorted(done))}")
+        failed, running, held = set(), {}, set()
+
+        def blocked(name):
+            stage = self.stages[name]
+            return any(dep in failed for dep in stage["depends"])
+
+        def ready(name):
+            stage = self.stages[name]
+            return all(dep in done for dep in stage["depends"]) and not (
+                held & set(stage["locks"])
+            )
+
+        with ThreadPoolExecutor(max_workers=self.stage_parallel) as executor:
+            while True:
+                pending = [
+                    name
+                    for name in self.order
+                    if name not in done | failed and name not in running.values()
+                ]
+                for name in pending:
+                    if blocked(name):
+                        print(f"[{host_name}] {name} skipped, a dependency failed")
+                        failed.add(name)
+                    elif ready(name) and len(running) < self.stage_parallel:
+                        held |= set(self.stages[name]["locks"])
+                        future = executor.submit(
+                            self._run_stage, host_name, name, command
+                        )
+                        running[future] = name
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    held -= set(self.stages[name]["locks"])
+                    succeeded, duration = future.result()
+                    if succeeded:
+                        done.add(name)
+                        self._checkpoint(host_name, name, duration)
+                    else:
+                        failed.add(name)
+        return not failed
+
+    def run(self, inventory_file, pyinfra_args=()):
+        """
+        Runs every stage not yet checkpointed on every host. Returns True if
+        all of them completed.
+        """
+        command = ["pyinfra", inventory_file, "-y", *pyinfra_args]
+        print(
+            f"--- Stages: {' -> '.join(self.order)} on {len(self.hosts)} hosts "
+            f"(max {self.max_parallel} hosts, {self.stage_parallel} stages per host)"
+        )
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            results = list(
+                executor.map(lambda name: self._run_host(name, command), self.hosts)
+            )
+
+        failed = [name for name, ok in zip(self.hosts, results) if not ok]
+        if failed:
+            print(f"Stages incomplete on {', '.join(failed)}. Rerun to resume.")
+            return False
+        print("Pipeline completed.")
+        return True
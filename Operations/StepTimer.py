@@ -0,0 +1,35 @@
+import time
+
+from pyinfra import host, logger
+from pyinfra.operations import python
+
+
+class StepTimer:
+    """
+    Times the steps of a playbook on the current host with python.call marks,
+    so two ways of provisioning can be compared step by step. Operations run in
+    lockstep across hosts by default, so a step lasts as long as its slowest host.
+    """
+
+    def __init__(self):
+        self.marks = []
+
+    def mark(self, step):
+        """Starts `step`, ending the previous one."""
+
+        def _mark():
+            self.marks.append((step, time.time()))
+
+        python.call(name=f"Start timing: {step}", function=_mark)
+
+    def report(self):
+        """Ends the last step and logs every step duration."""
+
+        def _report():
+            self.marks.append((None, time.time()))
+            for (step, start), (_, end) in zip(self.marks, self.marks[1:]):
+                logger.info(f"[{host.name}] {step}: {end - start:.1f}s")
+            total = self.marks[-1][1] - self.marks[0][1]
+            logger.info(f"[{host.name}] total: {total:.1f}s")
+
+        python.call(name="Report step timings", function=_report)
@@ -1,6 +1,16 @@
-from pyinfra.operations import apt, files, server, systemd
 from io import StringIO
 
+from pyinfra.operations import apt, files, server, systemd
+
+from Operations.AptCacheProxy import use_apt_proxy
+from Operations.FactCache import APT_FACTS, SYSTEMD_FACTS, invalidate_on_change
+
+VNC_PACKAGES = [
+    "tigervnc-standalone-server",
+    "tigervnc-xorg-extension",
+    "tigervnc-viewer",
+]
+
 
 class TigerVNCServerSetup:
     """
@@ -14,26 +24,30 @@ class TigerVNCServerSetup:
         geometry="1920x1080",
         depth=24,
         password="yourpassword",
+        apt_proxy=None,
     ):
         self.vnc_user = vnc_user
         self.vnc_display = vnc_display
         self.geometry = geometry
         self.depth = depth
         self.password = password
+        self.apt_proxy = apt_proxy
+
+    def declare_packages(self, transaction):
+        """Declares the TigerVNC packages on an AptTransaction."""
+        transaction.add_packages(VNC_PACKAGES)
 
     def install_vnc_server(self):
         """Install the TigerVNC server and its dependencies."""
-        apt.packages(
+        use_apt_proxy(self.apt_proxy)
+        install = apt.packages(
             name="Install TigerVNC server packages",
-            packages=[
-                "tigervnc-standalone-server",
-                "tigervnc-xorg-extension",
-                "tigervnc-viewer",
-            ],
+            packages=VNC_PACKAGES,
             update=True,
             present=True,
             _sudo=True,
         )
+        invalidate_on_change(install, *APT_FACTS)
 
     def set_vnc_password(self):
         """Set the VNC password for the user."""
@@ -101,7 +115,7 @@ WantedBy=multi-user.target
 
     def enable_and_start_vnc_service(self):
         """Enable and start the VNC systemd service."""
-        systemd.service(
+        service = systemd.service(
             name=f"Enable and start VNC service for display {self.vnc_display}",
             service=f"vncserver@{self.vnc_display}.service",
             daemon_reload=True,
@@ -110,3 +124,4 @@ WantedBy=multi-user.target
             running=True,
             # _sudo=True
         )
+        invalidate_on_change(service, *SYSTEMD_FACTS)
@@ -1,350 +1,535 @@
-from pyinfra import host, logger
-from pyinfra.operations import docker, files, server, systemd
-from pyinfra.facts import server as server_facts
-
-
-class AkiraEdgeManager:
-    """
-    Manages Docker applications on the remote host.
-    """
-
-    DOCKER_IMAGE_NAME = "p100x-app:latest"
-    DOCKERFILE_DIR = f"{host.get_fact(server_facts.Home, user='admin_sumato')}/akira-edge"  # Use host.data.home to get user's home directory
-    DOCKERFILE_PATH = f"{DOCKERFILE_DIR}/Dockerfile"
-
-    def __init__(self):
-        # Ensure Docker is installed (can be moved to a separate setup operation if preferred)
-        logger.info(
-            f">>>>>>>>    This is the docker file path dir {self.DOCKERFILE_DIR}"
-        )
-        self._ensure_docker_installation()
-
-    def _ensure_docker_installation(self):
-
-        check_docker_systemd = files.file(
-            name="Check if Docker systemd service file exists",
-            path="/lib/systemd/system/docker.service",
-            present=True,
-        )
-
-        if not check_docker_systemd.changed:
-            systemd.service(
-                name="Starting docker service",
-                service="docker",
-                running=True,
-                _sudo=True,
-                # running=True,
-                # reloaded=True,
-                # _if=remove_default_site.did_change,
-            )
-
-    def build_image(self):
-        """Builds the Docker image 'p100x-app:latest'."""
-        logger.info(
-            f">>>>>>> Attempting to build Docker image '{self.DOCKER_IMAGE_NAME}'..."
-        )
-
-        if files.file(self.DOCKERFILE_PATH):
-            logger.info(f"Dockerfile found at '{self.DOCKERFILE_PATH}'.")
-            logger.info(f"Navigating to '{self.DOCKERFILE_DIR}' and building image...")
-            # docker.build(
-            #    name=f"Build Docker image {self.DOCKER_IMAGE_NAME}",
-            #    path=self.DOCKERFILE_DIR,
-            #    tag=self.DOCKER_IMAGE_NAME,
-            #    _sudo=False,
-            # )
-            server.shell(
-                name="Building the docker image.",
-                commands=[
-                    f"docker build -t {self.DOCKER_IMAGE_NAME} {self.DOCKERFILE_DIR}"
-                ],
-            )
-            print(
-                f"Docker image '{self.DOCKER_IMAGE_NAME}' build operation initiated. Check logs for status."
-            )
-
-
-'''
-    def _ensure_docker_installed(self):
-        """Ensures Docker is installed on the host."""
-        server.packages(
-            name="Install Docker prerequisites",
-            packages=["apt-transport-https", "ca-certificates", "curl", "gnupg-agent", "software-properties-common"],
-            present=True,
-            _sudo=True,
-        )
-
-        server.script(
-            name="Add Docker GPG key",
-            src="curl -fsSL https://download.docker.com/linux/ubuntu/gpg | sudo apt-key add -",
-            _sudo=True,
-        )
-
-        server.shell(
-            name="Add Docker APT repository",
-            commands="sudo add-apt-repository 'deb [arch=amd64] https://download.docker.com/linux/ubuntu $(lsb_release -cs) stable'",
-            _sudo=True,
-        )
-
-        server.packages(
-            name="Install Docker Engine",
-            packages=["docker-ce", "docker-ce-cli", "containerd.io"],
-            present=True,
-            _sudo=True,
-        )
-
-        server.shell(
-            name="Add current user to docker group",
-            commands=f"sudo usermod -aG docker {host.data.user}",
-            _sudo=True,
-            _reboot_after=True, # A reboot is often required for group changes to take effect
-        )
-
-    def show_running_apps(self):
-        """Displays currently running Docker applications."""
-        docker.ps(
-            name="Show running Docker apps",
-            all=True,
-            format="table {{.Names}}\t{{.ID}}\t{{.Image}}\t{{.Status}}\t{{.Ports}}",
-            _sudo=False, # No sudo needed for docker ps
-            _quiet=True # Suppress verbose pyinfra output
-        )
-
-    def show_all_apps(self):
-        """Displays all Docker applications (running and stopped)."""
-        docker.ps(
-            name="Show all Docker apps (running & stopped)",
-            all=True,
-            format="table {{.Names}}\t{{.ID}}\t{{.Image}}\t{{.Status}}\t{{.Ports}}",
-            _sudo=False,
-            _quiet=True
-        )
-
-    def _get_container_names(self, running_only=False):
-        """
-        Helper to get a list of Docker container names.
-        :param running_only: If True, only returns running container names.
-        """
-        command = "docker ps --format '{{.Names}}'" if running_only else "docker ps -a --format '{{.Names}}'"
-        result = host.run_shell_command(command, _sudo=False)
-        if result.success:
-            return result.stdout.strip().splitlines()
-        return []
-
-    def create_containers(self, app_configs):
-        """
-        Creates new Docker containers based on provided configurations.
-        :param app_configs: A list of dictionaries, each containing:
-                            {'name', 'host_port', 'conn_string', 'mem_ram'}
-        """
-        if not app_configs:
-            print("No app configurations provided. Skipping container creation.")
-            return
-
-        # Verify that the required image exists
-        result = host.run_shell_command(f"docker images -q {self.DOCKER_IMAGE_NAME}", _sudo=False)
-        if not result.stdout.strip():
-            print(f"Error: Docker image '{self.DOCKER_IMAGE_NAME}' not found.")
-            print("Please build the image first.")
-            return
-
-        print("\nStarting new app(s)...")
-        existing_container_names = self._get_container_names()
-
-        for i, config in enumerate(app_configs):
-            app_name = config.get('name')
-            host_port = config.get('host_port')
-            conn_string = config.get('conn_string')
-            mem_ram = config.get('mem_ram')
-
-            print(f"--- Configuration for New App #{i+1} ---")
-
-            if not all([app_name, host_port, conn_string, mem_ram]):
-                print(f"Skipping app due to missing configuration: {config}")
-                continue
-
-            # Validate input types if necessary (PyInfra will handle some validation)
-            try:
-                host_port = int(host_port)
-                # mem_ram validation is more complex, docker expects string like '2g' '512m'
-                if not isinstance(mem_ram, str) or not (mem_ram.endswith('g') or mem_ram.endswith('m')):
-                    raise ValueError("Memory RAM must be a string like '2g' or '512m'")
-            except ValueError as e:
-                print(f"Invalid input for app '{app_name}': {e}. Skipping this app.")
-                continue
-
-            if app_name in existing_container_names:
-                print(f"Error: Container with name '{app_name}' already exists. Skipping this app.")
-                continue
-
-            print(f"Setting up '{app_name}' with host/container port {host_port} and connection string: {conn_string}")
-
-            docker.container(
-                name=f"Create and start {app_name}",
-                image=self.DOCKER_IMAGE_NAME,
-                command=None, # The Dockerfile's CMD will be used
-                running=True,
-                detach=True,
-                hostname=app_name, # Set hostname for the container
-                gpus="all",
-                memory=mem_ram,
-                name_=app_name, # Use name_ for the container name parameter in pyinfra
-                ports=[f"{host_port}:{host_port}"],
-                restart_policy="unless-stopped",
-                volumes=[
-                    "/etc/localtime:/etc/localtime:ro",
-                    "/etc/timezone:/etc/timezone:ro",
-                ],
-                environment={
-                    "TZ": "America/Santiago",
-                    "AKIRAEDGE_HTTP_PORT": str(host_port),
-                    "AKIRAEDGE_IOT_CONN_STRING": conn_string,
-                },
-                _sudo=False, # No sudo needed if user is in docker group
-            )
-            print("---")
-        print("New app creation process completed. Check 'show running containers' to confirm.")
-
-    def stop_containers(self, app_names):
-        """
-        Stops Docker containers.
-        :param app_names: A list of container names to stop. Use ['all'] to stop all running.
-        """
-        if not app_names:
-            print("No app names provided. Skipping stop operation.")
-            return
-
-        running_container_names = self._get_container_names(running_only=True)
-
-        if 'all' in [name.lower() for name in app_names]:
-            print("Stopping all running containers...")
-            containers_to_stop = running_container_names
-        else:
-            containers_to_stop = [name for name in app_names if name in running_container_names]
-            missing_apps = [name for name in app_names if name not in running_container_names]
-            if missing_apps:
-                print(f"Warning: Containers {', '.join(missing_apps)} are not running or do not exist.")
-
-        for name in containers_to_stop:
-            print(f"Stopping '{name}'...")
-            docker.container(
-                name=f"Stop {name}",
-                name_=name,
-                running=False,
-                _sudo=False,
-            )
-        print("Stop operation completed.")
-
-    def remove_containers(self, app_names):
-        """
-        Removes Docker containers.
-        :param app_names: A list of container names to remove. Use ['all'] to remove all.
-        """
-        if not app_names:
-            print("No app names provided. Skipping remove operation.")
-            return
-
-        all_container_names = self._get_container_names()
-
-        if 'all' in [name.lower() for name in app_names]:
-            print("Removing all Docker containers...")
-            containers_to_remove = all_container_names
-        else:
-            containers_to_remove = [name for name in app_names if name in all_container_names]
-            missing_apps = [name for name in app_names if name not in all_container_names]
-            if missing_apps:
-                print(f"Warning: Containers {', '.join(missing_apps)} do not exist.")
-
-        for name in containers_to_remove:
-            print(f"Stopping and removing '{name}'...")
-            # Ensure container is stopped before removal
-            docker.container(
-                name=f"Ensure {name} is stopped before removal",
-                name_=name,
-                running=False,
-                _sudo=False,
-                _ignore_errors=True # Ignore if it's already stopped
-            )
-            docker.container(
-                name=f"Remove {name}",
-                name_=name,
-                present=False,
-                _sudo=False,
-            )
-        print("Remove operation completed.")
-
-    def restart_containers(self, app_names):
-        """
-        Restarts Docker containers.
-        :param app_names: A list of container names to restart. Use ['all'] to restart all running.
-        """
-        if not app_names:
-            print("No app names provided. Skipping restart operation.")
-            return
-
-        running_container_names = self._get_container_names(running_only=True)
-
-        if 'all' in [name.lower() for name in app_names]:
-            print("Restarting all running containers...")
-            containers_to_restart = running_container_names
-        else:
-            containers_to_restart = [name for name in app_names if name in running_container_names]
-            missing_apps = [name for name in app_names if name not in running_container_names]
-            if missing_apps:
-                print(f"Warning: Containers {', '.join(missing_apps)} are not running or do not exist.")
-
-        for name in containers_to_restart:
-            print(f"Restarting '{name}'...")
-            docker.container(
-                name=f"Restart {name}",
-                name_=name,
-                running=True, # Set to running=True to restart
-                _sudo=False,
-            )
-        print("Restart operation completed.")
-
-    def start_containers(self, app_names):
-        """
-        Starts Docker containers.
-        :param app_names: A list of container names to start. Use ['all'] to start all stopped.
-        """
-        if not app_names:
-            print("No app names provided. Skipping start operation.")
-            return
-
-        all_container_names = self._get_container_names()
-
-        if 'all' in [name.lower() for name in app_names]:
-            print("Starting all stopped containers...")
-            # Get all containers, then filter for stopped ones
-            stopped_containers = [
-                name for name in all_container_names
-                if not host.run_shell_command(f"docker ps -q -f name={name}").stdout.strip()
-            ]
-            containers_to_start = stopped_containers
-        else:
-            containers_to_start = [
-                name for name in app_names
-                if name in all_container_names and not host.run_shell_command(f"docker ps -q -f name={name}").stdout.strip()
-            ]
-            missing_apps = [name for name in app_names if name not in all_container_names]
-            if missing_apps:
-                print(f"Warning: Containers {', '.join(missing_apps)} do not exist.")
-            running_apps = [
-                name for name in app_names
-                if name in all_container_names and host.run_shell_command(f"docker ps -q -f name={name}").stdout.strip()
-            ]
-            if running_apps:
-                print(f"Warning: Containers {', '.join(running_apps)} are already running and will not be started.")
-
-
-        for name in containers_to_start:
-            print(f"Starting '{name}'...")
-            docker.container(
-                name=f"Start {name}",
-                name_=name,
-                running=True,
-                _sudo=False,
-            )
-        print("Start operation completed.")
-'''
+import hashlib
+import json
+import shlex
+
+from pyinfra import host, logger
+from pyinfra.facts import server as server_facts
+from pyinfra.operations import files, python, server, systemd
+
+from Operations.docker_facts import (
+    BuildContextHash,
+    DockerContainerSnapshot,
+    DockerImageLayers,
+)
+from Operations.DockerEngineClient import DockerEngineClient
+from Operations.FactCache import SYSTEMD_FACTS, invalidate_on_change
+from Operations.PortAllocator import (
+    DEFAULT_PORT_RANGE,
+    HTTP_PORT_LABEL,
+    ListeningPorts,
+    PortAllocator,
+)
+
+# Set on the containers created by reconcile(), to detect configuration drift
+CONFIG_HASH_LABEL = "akira.config-hash"
+
+# App keys reconcile() cannot create a container without
+REQUIRED_APP_KEYS = ("name", "host_port", "conn_string", "mem_ram")
+
+# App keys describing the container's state rather than how it is created,
+# changed by starting or stopping it, never by recreating it
+STATE_KEYS = ("running",)
+
+
+class AkiraEdgeManager:
+    """
+    Manages Docker applications on the remote host.
+    """
+
+    DOCKER_IMAGE_NAME = "p100x-app:latest"
+
+    # Home directory of admin_sumato per host, gathered on first use
+    _home_dirs = {}
+
+    @property
+    def DOCKERFILE_DIR(self):
+        if host.name not in self._home_dirs:
+            self._home_dirs[host.name] = host.get_fact(
+                server_facts.Home, user="admin_sumato"
+            )
+        return f"{self._home_dirs[host.name]}/akira-edge"
+
+    @property
+    def DOCKERFILE_PATH(self):
+        return f"{self.DOCKERFILE_DIR}/Dockerfile"
+
+    def __init__(self, engine_api=False, port_range=DEFAULT_PORT_RANGE):
+        """
+        :param engine_api: If True, containers are listed, started, stopped and
+                           removed through the Docker Engine API over the host's
+                           SSH connection instead of the docker CLI.
+        :param port_range: (first, last) host ports handed out to apps created
+                           without a 'host_port'.
+        """
+        self.engine_api = engine_api
+        self.port_allocator = PortAllocator(port_range)
+        self._bound_ports = None
+        # Ensure Docker is installed (can be moved to a separate setup operation if preferred)
+        self._container_index = None
+        self._ensure_docker_installation()
+
+    def _ensure_docker_installation(self):
+
+        check_docker_systemd = files.file(
+            name="Check if Docker systemd service file exists",
+            path="/lib/systemd/system/docker.service",
+            present=True,
+        )
+
+        if not check_docker_systemd.changed:
+            start_docker = systemd.service(
+                name="Starting docker service",
+                service="docker",
+                running=True,
+                _sudo=True,
+                # running=True,
+                # reloaded=True,
+                # _if=remove_default_site.did_change,
+            )
+            invalidate_on_change(start_docker, *SYSTEMD_FACTS)
+
+    def build_image(self):
+        """
+        Builds the Docker image 'p100x-app:latest', tagged as well with a hash of
+        the build context. The build is skipped, and 'latest' only retagged, when
+        an image for the same context already exists on the host.
+        """
+        logger.info(
+            f">>>>>>> Attempting to build Docker image '{self.DOCKER_IMAGE_NAME}'..."
+        )
+
+        logger.info(
+            f">>>>>>>>    This is the docker file path dir {self.DOCKERFILE_DIR}"
+        )
+        if not host.get_fact(server_facts.File, path=self.DOCKERFILE_PATH):
+            logger.info(f"No Dockerfile found at '{self.DOCKERFILE_PATH}'.")
+            return
+
+        context_hash = host.get_fact(BuildContextHash, path=self.DOCKERFILE_DIR)
+        repository = self.DOCKER_IMAGE_NAME.split(":")[0]
+        content_tag = f"{repository}:ctx-{context_hash}"
+
+        if host.get_fact(DockerImageLayers, image=content_tag):
+            logger.info(f"Image '{content_tag}' is up to date, skipping the build.")
+            server.shell(
+                name=f"Tagging {content_tag} as {self.DOCKER_IMAGE_NAME}",
+                commands=[f"docker tag {content_tag} {self.DOCKER_IMAGE_NAME}"],
+            )
+            return
+
+        logger.info(f"Navigating to '{self.DOCKERFILE_DIR}' and building image...")
+        # BuildKit keeps the apt downloads in cache mounts (see the Dockerfile) and
+        # the inline cache lets the previous 'latest' seed the layer cache
+        server.shell(
+            name="Building the docker image.",
+            commands=[
+                "DOCKER_BUILDKIT=1 docker build "
+                "--build-arg BUILDKIT_INLINE_CACHE=1 "
+                f"--cache-from {self.DOCKER_IMAGE_NAME} "
+                f"-t {content_tag} -t {self.DOCKER_IMAGE_NAME} {self.DOCKERFILE_DIR}"
+            ],
+        )
+        print(
+            f"Docker image '{content_tag}' build operation initiated. Check logs for status."
+        )
+
+    def _containers(self):
+        """
+        Returns the container snapshot of the host, indexed by name and by state.
+        A single `docker ps -a` per host backs every lifecycle operation of the run.
+        """
+        if self._container_index is None:
+            if self.engine_api:
+                by_name = DockerEngineClient.for_host(host).container_snapshot()
+            else:
+                by_name = host.get_fact(DockerContainerSnapshot)
+            by_state = {}
+            for name, container in by_name.items():
+                by_state.setdefault(container["state"], set()).add(name)
+            self._container_index = (by_name, by_state)
+        return self._container_index
+
+    def _get_container_names(self, running_only=False):
+        """
+        Helper to get the Docker container names.
+        :param running_only: If True, only returns running container names.
+        """
+        by_name, by_state = self._containers()
+        if running_only:
+            return by_state.get("running", set())
+        return by_name.keys()
+
+    def _is_running(self, name):
+        by_name, _ = self._containers()
+        return name in by_name and by_name[name]["state"] == "running"
+
+    @staticmethod
+    def _engine_action(action, container):
+        getattr(DockerEngineClient.for_host(host), action)(container)
+        logger.info(f"[{host.name}] {action} {container}: done")
+
+    def _container_action(self, action, name, commands):
+        """
+        Runs a lifecycle action on a container, through the Engine API client
+        when enabled or else with the docker CLI `commands`.
+        """
+        if self.engine_api:
+            python.call(
+                name=f"{action.capitalize()} {name}",
+                function=self._engine_action,
+                action=action,
+                container=name,
+            )
+        else:
+            server.shell(name=f"{action.capitalize()} {name}", commands=commands)
+
+    def _show_apps(self, running_only):
+        by_name, _ = self._containers()
+        print(f"--- Docker Apps on {host.name} ---")
+        print(f"{'NAMES':<30}{'ID':<14}{'IMAGE':<25}{'STATUS':<30}PORTS")
+        for name in sorted(self._get_container_names(running_only)):
+            container = by_name[name]
+            print(
+                f"{name:<30}{container['id'][:12]:<14}{container['image']:<25}"
+                f"{container['status']:<30}{container['ports']}"
+            )
+        print("-------------------------------------")
+
+    def show_running_apps(self):
+        """Displays currently running Docker applications."""
+        self._show_apps(running_only=True)
+
+    def show_all_apps(self):
+        """Displays all Docker applications (running and stopped)."""
+        self._show_apps(running_only=False)
+
+    def _run_command(self, config, labels=None):
+        """
+        Builds the `docker run` command of a p100x-app container from an app
+        configuration: {'name', 'host_port', 'conn_string', 'mem_ram'} plus the
+        optional 'volumes', 'image' and 'gpu_device', the GPU index to pin the
+        container to (all GPUs otherwise).
+        """
+        app_name = config["name"]
+        gpus = "all"
+        if config.get("gpu_device") is not None:
+            gpus = shlex.quote(f'"device={config["gpu_device"]}"')
+        host_port = config["host_port"]
+        volumes = [
+            "/etc/localtime:/etc/localtime:ro",
+            "/etc/timezone:/etc/timezone:ro",
+            *config.get("volumes", []),
+        ]
+        return " ".join(
+            [
+                f"docker run -d --gpus {gpus}",
+                f"--memory={config['mem_ram']}",
+                f"--name {app_name} --hostname {app_name}",
+                f"-p {host_port}:{host_port}",
+                "--restart unless-stopped",
+                *(f"-v {volume}" for volume in volumes),
+                *(
+                    f"--label {key}={value}"
+                    for key, value in {
+                        HTTP_PORT_LABEL: host_port,
+                        **(labels or {}),
+                    }.items()
+                ),
+                "-e TZ=America/Santiago",
+                f"-e AKIRAEDGE_HTTP_PORT={host_port}",
+                f"-e AKIRAEDGE_IOT_CONN_STRING={shlex.quote(config['conn_string'])}",
+                config.get("image", self.DOCKER_IMAGE_NAME),
+            ]
+        )
+
+    def create_containers(self, app_configs):
+        """
+        Creates new Docker containers based on provided configurations.
+        :param app_configs: A list of dictionaries, each containing:
+                            {'name', 'host_port', 'conn_string', 'mem_ram'}
+                            and optionally 'gpu_device', as set by the
+                            PlacementScheduler. Apps without 'host_port' get
+                            a free port of the manager's port range.
+        """
+        if not app_configs:
+            print("No app configurations provided. Skipping container creation.")
+            return
+
+        # Verify that the required image exists
+        if not host.get_fact(DockerImageLayers, image=self.DOCKER_IMAGE_NAME):
+            print(f"Error: Docker image '{self.DOCKER_IMAGE_NAME}' not found.")
+            print("Please build the image first.")
+            return
+
+        print("\nStarting new app(s)...")
+        existing_container_names = self._get_container_names()
+
+        for i, config in enumerate(app_configs):
+            app_name = config.get("name")
+            host_port = config.get("host_port")
+            conn_string = config.get("conn_string")
+            mem_ram = config.get("mem_ram")
+
+            print(f"--- Configuration for New App #{i+1} ---")
+
+            if not all([app_name, conn_string, mem_ram]):
+                print(f"Skipping app due to missing configuration: {config}")
+                continue
+
+            try:
+                host_port = int(host_port) if host_port else None
+                # docker expects the memory as a string like '2g' '512m'
+                if not isinstance(mem_ram, str) or not mem_ram.endswith(("g", "m")):
+                    raise ValueError("Memory RAM must be a string like '2g' or '512m'")
+            except ValueError as e:
+                print(f"Invalid input for app '{app_name}': {e}. Skipping this app.")
+                continue
+
+            if app_name in existing_container_names:
+                print(
+                    f"Error: Container with name '{app_name}' already exists. "
+                    "Skipping this app."
+                )
+                continue
+
+            host_port = self._claim_port(app_name, host_port)
+            if host_port is None:
+                continue
+
+            print(
+                f"Setting up '{app_name}' with host/container port {host_port} "
+                f"and connection string: {conn_string}"
+            )
+            server.shell(
+                name=f"Create and start {app_name}",
+                commands=[
+                    PortAllocator.guarded(
+                        host_port,
+                        self._run_command({**config, "host_port": host_port}),
+                    )
+                ],
+            )
+            print("---")
+        print(
+            "New app creation process completed. "
+            "Check 'show running containers' to confirm."
+        )
+
+    def _claim_port(self, app_name, host_port):
+        """
+        Reserves the port of an app, allocating a free one when it has none.
+        Returns None, after saying why, if the app has to be skipped.
+        """
+        if self._bound_ports is None:
+            by_name, _ = self._containers()
+            self._bound_ports = PortAllocator.bound_ports(
+                by_name, host.get_fact(ListeningPorts)
+            )
+
+        if host_port is None:
+            host_port = self.port_allocator.allocate(host.name, self._bound_ports)
+            if host_port is None:
+                print(f"Error: No free port left for '{app_name}'. Skipping this app.")
+            return host_port
+
+        if host_port in self._bound_ports or not self.port_allocator.reserve(
+            host.name, host_port
+        ):
+            print(
+                f"Error: Port {host_port} is already in use on {host.name}. "
+                f"Skipping '{app_name}'."
+            )
+            return None
+        return host_port
+
+    def _select(self, app_names, candidates, missing_warning):
+        """
+        Resolves the requested names against the candidate containers, 'all'
+        selecting every candidate.
+        """
+        if "all" in [name.lower() for name in app_names]:
+            return sorted(candidates)
+
+        missing_apps = [name for name in app_names if name not in candidates]
+        if missing_apps:
+            print(f"Warning: Containers {', '.join(missing_apps)} {missing_warning}.")
+        return [name for name in app_names if name in candidates]
+
+    def stop_containers(self, app_names):
+        """
+        Stops Docker containers.
+        :param app_names: A list of container names to stop. Use ['all'] to stop all running.
+        """
+        if not app_names:
+            print("No app names provided. Skipping stop operation.")
+            return
+
+        containers_to_stop = self._select(
+            app_names,
+            self._get_container_names(running_only=True),
+            "are not running or do not exist",
+        )
+
+        for name in containers_to_stop:
+            print(f"Stopping '{name}'...")
+            self._container_action("stop", name, [f"docker stop {name}"])
+        print("Stop operation completed.")
+
+    def remove_containers(self, app_names):
+        """
+        Removes Docker containers.
+        :param app_names: A list of container names to remove. Use ['all'] to remove all.
+        """
+        if not app_names:
+            print("No app names provided. Skipping remove operation.")
+            return
+
+        containers_to_remove = self._select(
+            app_names, self._get_container_names(), "do not exist"
+        )
+
+        for name in containers_to_remove:
+            print(f"Stopping and removing '{name}'...")
+            commands = [f"docker rm {name}"]
+            if self._is_running(name):
+                commands.insert(0, f"docker stop {name}")
+            self._container_action("remove", name, commands)
+        print("Remove operation completed.")
+
+    def restart_containers(self, app_names):
+        """
+        Restarts Docker containers.
+        :param app_names: A list of container names to restart. Use ['all'] to restart all running.
+        """
+        if not app_names:
+            print("No app names provided. Skipping restart operation.")
+            return
+
+        containers_to_restart = self._select(
+            app_names,
+            self._get_container_names(running_only=True),
+            "are not running or do not exist",
+        )
+
+        for name in containers_to_restart:
+            print(f"Restarting '{name}'...")
+            self._container_action("restart", name, [f"docker restart {name}"])
+        print("Restart operation completed.")
+
+    def start_containers(self, app_names):
+        """
+        Starts Docker containers.
+        :param app_names: A list of container names to start. Use ['all'] to start all stopped.
+        """
+        if not app_names:
+            print("No app names provided. Skipping start operation.")
+            return
+
+        all_container_names = self._get_container_names()
+        running_container_names = self._get_container_names(running_only=True)
+        stopped_container_names = all_container_names - running_container_names
+
+        containers_to_start = self._select(
+            app_names, stopped_container_names, "do not exist or are already running"
+        )
+
+        for name in containers_to_start:
+            print(f"Starting '{name}'...")
+            self._container_action("start", name, [f"docker start {name}"])
+        print("Start operation completed.")
+
+    @staticmethod
+    def config_hash(config):
+        """Hashes everything an app's container is created from, to spot drift."""
+        creation = {
+            key: value for key, value in config.items() if key not in STATE_KEYS
+        }
+        return hashlib.sha256(
+            json.dumps(creation, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+
+    @staticmethod
+    def check_desired(desired_apps):
+        """
+        Rejects desired apps missing a key of REQUIRED_APP_KEYS, e.g. a connection
+        string whose environment variable is unset. Planning with it would change
+        the config hash and recreate the container without it.
+        """
+        for config in desired_apps:
+            missing = [
+                key for key in REQUIRED_APP_KEYS if config.get(key) in (None, "")
+            ]
+            if missing:
+                raise ValueError(
+                    f"App {config.get('name', '?')} on {host.name} has no "
+                    f"{', '.join(missing)}, refusing to reconcile it"
+                )
+
+    def plan_reconcile(self, desired_apps):
+        """
+        Diffs the desired apps of the host against its container snapshot and
+        returns the minimal plan as (action, name, config) steps:
+        create missing apps, recreate apps whose configuration drifted, start or
+        stop apps not in their desired state, and remove containers this manager
+        created that are no longer in the spec.
+        """
+        self.check_desired(desired_apps)
+        by_name, _ = self._containers()
+        plan = []
+
+        for config in desired_apps:
+            name = config["name"]
+            current = by_name.get(name)
+            should_run = config.get("running", True)
+
+            if current is None:
+                plan.append(("create", name, config))
+            elif current["labels"].get(CONFIG_HASH_LABEL) != self.config_hash(config):
+                plan.append(("recreate", name, config))
+            elif should_run and current["state"] != "running":
+                plan.append(("start", name, config))
+            elif not should_run and current["state"] == "running":
+                plan.append(("stop", name, config))
+
+        desired_names = {config["name"] for config in desired_apps}
+        for name, current in sorted(by_name.items()):
+            if CONFIG_HASH_LABEL in current["labels"] and name not in desired_names:
+                plan.append(("remove", name, None))
+
+        return plan
+
+    def _plan_commands(self, action, name, config):
+        if action in ("create", "recreate"):
+            labels = {CONFIG_HASH_LABEL: self.config_hash(config)}
+            commands = [self._run_command(config, labels)]
+            if action == "recreate":
+                commands.insert(0, f"docker rm -f {name}")
+            if not config.get("running", True):
+                commands.append(f"docker stop {name}")
+            return commands
+        if action == "remove":
+            return [f"docker rm -f {name}"]
+        return [f"docker {action} {name}"]
+
+    def reconcile(self, desired_apps):
+        """
+        Converges the host to its desired apps. The whole plan runs as a single
+        operation, and a converged host gets no operation at all.
+        :param desired_apps: A list of app configurations, as for
+                             create_containers, plus optional 'volumes', 'image'
+                             and 'running' (default True).
+        """
+        plan = self.plan_reconcile(desired_apps)
+        if not plan:
+            logger.info(f"[{host.name}] apps already converged")
+            return
+
+        for action, name, _ in plan:
+            logger.info(f"[{host.name}] {action} {name}")
+
+        server.shell(
+            name=f"Reconcile {len(plan)} app change(s)",
+            commands=[
+                command for step in plan for command in self._plan_commands(*step)
+            ],
+        )
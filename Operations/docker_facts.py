@@ -0,0 +1,169 @@
+import hashlib
+import json
+
+from pyinfra.api import FactBase
+
+
+def chain_ids(diff_ids):
+    """
+    Computes the layer chain IDs Docker uses to identify a layer together with all
+    of its parents: the first chain ID is the layer's diff ID, every following one
+    is sha256("<parent chain ID> <diff ID>").
+    """
+    chain = []
+    for diff_id in diff_ids:
+        if chain:
+            digest = hashlib.sha256(f"{chain[-1]} {diff_id}".encode()).hexdigest()
+            diff_id = f"sha256:{digest}"
+        chain.append(diff_id)
+    return chain
+
+
+def parse_labels(labels):
+    """Parses the `key=value,key=value` labels column of `docker ps`."""
+    return dict(label.split("=", 1) for label in labels.split(",") if "=" in label)
+
+
+class DockerImageLayers(FactBase):
+    """
+    Returns the ordered layer diff IDs of a local image, empty if it is missing.
+    """
+
+    def requires_command(self, *args, **kwargs):
+        return "docker"
+
+    @staticmethod
+    def default():
+        return []
+
+    def command(self, image):
+        return (
+            "docker image inspect "
+            "--format '{{range .RootFS.Layers}}{{println .}}{{end}}' "
+            f"{image} 2>/dev/null || true"
+        )
+
+    def process(self, output):
+        return [line.strip() for line in output if line.strip()]
+
+
+class DockerLayerChains(FactBase):
+    """
+    Returns the chain IDs of every layer held by the local image store.
+    """
+
+    def requires_command(self, *args, **kwargs):
+        return "docker"
+
+    @staticmethod
+    def default():
+        return set()
+
+    def command(self):
+        return (
+            "docker image inspect "
+            "--format '{{range .RootFS.Layers}}{{.}} {{end}}' "
+            "$(docker images -aq | sort -u) 2>/dev/null || true"
+        )
+
+    def process(self, output):
+        chains = set()
+        for line in output:
+            chains.update(chain_ids(line.split()))
+        return chains
+
+
+class DockerContainerSnapshot(FactBase):
+    """
+    Returns every container, running or not, from a single `docker ps -a` call,
+    keyed by container name.
+    """
+
+    def requires_command(self, *args, **kwargs):
+        return "docker"
+
+    @staticmethod
+    def default():
+        return {}
+
+    def command(self):
+        return "docker ps -a --no-trunc --format '{{json .}}'"
+
+    def process(self, output):
+        containers = {}
+        for line in output:
+            container = json.loads(line)
+            containers[container["Names"]] = {
+                "id": container["ID"],
+                "image": container["Image"],
+                "state": container["State"],
+                "status": container["Status"],
+                "ports": container["Ports"],
+                "labels": parse_labels(container["Labels"]),
+            }
+        return containers
+
+
+class BuildContextHash(FactBase):
+    """
+    Returns a short content hash of a build context directory, Dockerfile
+    included, or None if the directory is missing. Only file paths and contents
+    count, so copying the same context again keeps the same hash.
+    """
+
+    def command(self, path):
+        return (
+            f"test -d {path} && cd {path} && "
+            "find . -type f ! -path './.git/*' -print0 | LC_ALL=C sort -z "
+            "| xargs -0 sha256sum | sha256sum | cut -c1-16 || true"
+        )
+
+    def process(self, output):
+        return output[0].strip() if output and output[0].strip() else None
+
+
+def device_requests(requests):
+    """
+    Reads the GPUs of a container from its HostConfig.DeviceRequests JSON: 'all',
+    or the list of GPU indexes (int) and UUIDs it was started with.
+    """
+    gpus = []
+    for request in json.loads(requests) or []:
+        if request.get("Count") == -1:
+            return "all"
+        for device in request.get("DeviceIDs") or []:
+            gpus.extend(
+                int(part) if part.isdigit() else part for part in device.split(",")
+            )
+    return gpus
+
+
+class DockerContainerReservations(FactBase):
+    """
+    Returns the memory limit, in bytes (0 if unlimited), and the GPUs of every
+    running container, keyed by container name.
+    """
+
+    def requires_command(self, *args, **kwargs):
+        return "docker"
+
+    @staticmethod
+    def default():
+        return {}
+
+    def command(self):
+        return (
+            "docker inspect --format "
+            "'{{.Name}} {{.HostConfig.Memory}} {{json .HostConfig.DeviceRequests}}' "
+            "$(docker ps -q) 2>/dev/null || true"
+        )
+
+    def process(self, output):
+        containers = {}
+        for line in output:
+            name, memory, requests = line.split(" ", 2)
+            containers[name.lstrip("/")] = {
+                "memory": int(memory),
+                "gpus": device_requests(requests),
+            }
+        return containers
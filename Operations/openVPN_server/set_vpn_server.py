@@ -1,5 +1,5 @@
 from pyinfra import host
-from pyinfra.operations import files, docker, server
+from pyinfra.operations import docker, files, server
 
 # Variables
 OVPN_DATA = "ovpn-data-docker"
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Installs the host's NetworkManager profiles as soon as their interfaces appear,
+changing only what differs from what NetworkManager already has.
+
+    set_network_agent.py [--profiles /etc/p100x/network]
+                         [--timeout 600] [--nmcli /usr/bin/nmcli]
+
+The deploy side stages one keyfile per connection of the host, bound to its MAC
+address (Operations/NetworkProfiles.py). Once NetworkManager lists a device with
+that MAC (`nmcli -t device show`, polled with a backoff from 0.5s up to 10s):
+
+- a profile identical to NetworkManager's and active is left alone,
+- an identical but inactive one is brought up,
+- a new or changed one is written, loaded and brought up.
+
+Profiles whose MAC is not on the machine (/sys/class/net) are skipped, not waited
+for. Profiles the agent installed before, or that the former set_network.sh
+created (*-eno*), and that are no longer staged are deleted. A converged host thus
+gets no link reset. Boot-to-network time is logged. The agent exits 1 if some MACs
+never appear within --timeout, so systemd restarts it.
+
+Runs on the edge boxes with the stock python3, standard library only.
+"""
+
+import argparse
+import configparser
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROFILES_DIR = "/etc/p100x/network"
+SYSTEM_CONNECTIONS = "/etc/NetworkManager/system-connections"
+SYS_CLASS_NET = "/sys/class/net"
+
+# Names of the profiles installed by the agent, kept in the profiles directory
+INSTALLED_INDEX = ".installed"
+
+# Connections created by the former set_network.sh
+LEGACY_MARKER = "-eno"
+
+
+def log(message):
+    print(message, flush=True)
+
+
+def seconds_since_boot():
+    with open("/proc/uptime") as uptime:
+        return float(uptime.read().split()[0])
+
+
+def local_macs(sys_class_net=SYS_CLASS_NET):
+    """Returns the MAC addresses of the machine's interfaces, lower case."""
+    macs = set()
+    for address in Path(sys_class_net).glob("*/address"):
+        try:
+            macs.add(address.read_text().strip().lower())
+        except OSError:
+            continue
+    return macs
+
+
+def select_local(profiles, macs):
+    """
+    Keeps the profiles whose MAC is on this machine. Waiting for a MAC the
+    machine does not have would only time out, and the restart that follows
+    would reapply every profile again.
+    """
+    local = [profile for profile in profiles if profile["mac"] in macs]
+    for profile in profiles:
+        if profile["mac"] not in macs:
+            log(f"Skipping connection {profile['name']}, no interface {profile['mac']}")
+    return local
+
+
+def split_terse(line):
+    """Splits a `nmcli -t` line on unescaped colons."""
+    fields, current, escaped = [], "", False
+    for char in line:
+        if escaped:
+            current += char
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == ":":
+            fields.append(current)
+            current = ""
+        else:
+            current += char
+    fields.append(current)
+    return fields
+
+
+def read_profile(path):
+    """Reads a staged keyfile into a profile dict."""
+    content = Path(path).read_text()
+    keyfile = configparser.ConfigParser(interpolation=None)
+    keyfile.read_string(content)
+    return {
+        "name": keyfile["connection"]["id"],
+        "uuid": keyfile["connection"]["uuid"],
+        "mac": keyfile["ethernet"]["mac-address"].lower(),
+        "file": Path(path).name,
+        "content": content,
+    }
+
+
+def run_nmcli(nmcli="nmcli"):
+    """Returns a runner executing nmcli with the given arguments, for the agent."""
+
+    def run(*args):
+        return subprocess.run(
+            [nmcli, *args], check=True, capture_output=True, text=True
+        ).stdout
+
+    return run
+
+
+class NetworkAgent:
+    """
+    Reconciles NetworkManager with the staged profiles as their MAC addresses show
+    up. nmcli, the clock, sleep and the boot time are injected, so the agent runs
+    against a fake nmcli and a scratch system-connections directory.
+    """
+
+    def __init__(
+        self,
+        profiles,
+        nmcli=None,
+        system_dir=SYSTEM_CONNECTIONS,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        since_boot=seconds_since_boot,
+        min_interval=0.5,
+        max_interval=10.0,
+    ):
+        self.profiles = list(profiles)
+        self.pending = list(profiles)
+        self.nmcli = nmcli or run_nmcli()
+        self.system_dir = Path(system_dir)
+        self.clock = clock
+        self.sleep = sleep
+        self.since_boot = since_boot
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.actions = {"unchanged": 0, "activated": 0, "installed": 0, "removed": 0}
+
+    def devices(self):
+        """Returns {mac: device} of the devices NetworkManager knows."""
+        output = self.nmcli(
+            "-t", "-f", "GENERAL.DEVICE,GENERAL.HWADDR", "device", "show"
+        )
+        devices, device = {}, None
+        for line in output.splitlines():
+            key, _, value = line.partition(":")
+            if key == "GENERAL.DEVICE":
+                device = value
+            elif key == "GENERAL.HWADDR" and device:
+                devices[split_terse(value)[0].lower()] = device
+        return devices
+
+    def connections(self):
+        """Returns (name, uuid, active) of every NetworkManager profile."""
+        output = self.nmcli("-t", "-f", "NAME,UUID,ACTIVE", "connection", "show")
+        rows = []
+        for line in output.splitlines():
+            name, connection_uuid, active = (split_terse(line) + ["", ""])[:3]
+            rows.append((name, connection_uuid, active == "yes"))
+        return rows
+
+    def remove_stale(self, previously_installed):
+        """Deletes the managed profiles that are no longer staged."""
+        staged = {profile["name"] for profile in self.profiles}
+        for name, connection_uuid, _ in self.connections():
+            managed = name in previously_installed or LEGACY_MARKER in name
+            if managed and name not in staged:
+                log(f"Deleting connection {name}, no longer configured")
+                self.nmcli("connection", "delete", "uuid", connection_uuid)
+                self.actions["removed"] += 1
+
+    def install(self, profile, device, connections):
+        """Applies one profile, touching NetworkManager only where it differs."""
+        name = profile["name"]
+        target = self.system_dir / profile["file"]
+        try:
+            current = target.read_text()
+        except OSError:
+            current = None
+
+        # Same name, other UUID: created by the former script, replaced below
+        for other_name, connection_uuid, _ in connections:
+            if other_name == name and connection_uuid != profile["uuid"]:
+                log(f"Replacing connection {name} ({connection_uuid})")
+                self.nmcli("connection", "delete", "uuid", connection_uuid)
+                current = None
+
+        active = any(
+            connection_uuid == profile["uuid"] and is_active
+            for _, connection_uuid, is_active in connections
+        )
+        if current == profile["content"] and active:
+            self.actions["unchanged"] += 1
+            return
+
+        if current != profile["content"]:
+            log(f"Installing connection {name} for {device} ({profile['mac']})")
+            target.write_text(profile["content"])
+            os.chmod(target, 0o600)
+            self.nmcli("connection", "load", str(target))
+            self.actions["installed"] += 1
+        else:
+            self.actions["activated"] += 1
+        self.nmcli("connection", "up", "uuid", profile["uuid"])
+        log(f"Connection {name} up {self.since_boot():.1f}s after boot")
+
+    def run(self, timeout=600):
+        """Returns True once every profile is applied, False on timeout."""
+        start = self.clock()
+        interval = self.min_interval
+        while self.pending:
+            present = self.devices()
+            ready = [profile for profile in self.pending if profile["mac"] in present]
+            if ready:
+                connections = self.connections()
+            for profile in ready:
+                self.install(profile, present[profile["mac"]], connections)
+                self.pending.remove(profile)
+
+            if not self.pending:
+                break
+            if self.clock() - start > timeout:
+                missing = ", ".join(profile["mac"] for profile in self.pending)
+                log(f"Gave up after {timeout}s, no device with MAC {missing}")
+                return False
+            # Poll fast while devices keep appearing, back off while nothing does
+            interval = (
+                self.min_interval if ready else min(interval * 2, self.max_interval)
+            )
+            self.sleep(interval)
+
+        summary = ", ".join(
+            f"{count} {action}" for action, count in self.actions.items()
+        )
+        log(f"Network configured {self.since_boot():.1f}s after boot ({summary})")
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profiles", default=PROFILES_DIR)
+    parser.add_argument("--system-connections", default=SYSTEM_CONNECTIONS)
+    parser.add_argument("--sys-class-net", default=SYS_CLASS_NET)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--nmcli", default="nmcli")
+    args = parser.parse_args()
+
+    profiles_dir = Path(args.profiles)
+    staged = [
+        read_profile(path) for path in sorted(profiles_dir.glob("*.nmconnection"))
+    ]
+    profiles = select_local(staged, local_macs(args.sys_class_net))
+    index = profiles_dir / INSTALLED_INDEX
+    try:
+        previously_installed = set(index.read_text().split("\n"))
+    except OSError:
+        previously_installed = set()
+    log(f"Waiting for {len(profiles)} network interfaces")
+
+    agent = NetworkAgent(
+        profiles, nmcli=run_nmcli(args.nmcli), system_dir=args.system_connections
+    )
+    agent.remove_stale(previously_installed)
+    completed = agent.run(timeout=args.timeout)
+    index.write_text("\n".join(profile["name"] for profile in profiles))
+    sys.exit(0 if completed else 1)
+
+
+if __name__ == "__main__":
+    main()
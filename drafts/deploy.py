@@ -1,9 +1,10 @@
 # pyinfra_project/deploy.py
 
+import sys
+
+from operations.docker_manager import DockerManager
 from pyinfra import host, local
 from pyinfra.operations import server
-from operations.docker_manager import DockerManager
-import sys
 
 # Ensure PyInfra handles interactive input correctly
 local.set_fact("PYINFRA_ASK_FOR_INPUT", True)
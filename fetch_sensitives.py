@@ -1,4 +1,4 @@
-from pyinfra.operations import files, apt, server
+from pyinfra.operations import apt, files, server
 
 
 def install_azcopy():
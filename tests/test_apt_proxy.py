@@ -0,0 +1,101 @@
+import http.server
+import sys
+import threading
+import urllib.request
+
+import pytest
+
+from Benchmarks import apt_proxy_check
+from Operations.AptCacheProxy import proxied
+from Operations.DockerNvidiaSetup import DOCKER_REPO
+
+
+def test_proxied_rewrites_https_repositories():
+    line = "deb [signed-by=/etc/apt/keyrings/docker.asc] https://download.docker.com/x"
+
+    assert proxied(line, "110.34.35.16") == (
+        "deb [signed-by=/etc/apt/keyrings/docker.asc] "
+        "http://HTTPS///download.docker.com/x"
+    )
+    assert "http://HTTPS///download.docker.com/linux/ubuntu " in proxied(
+        DOCKER_REPO, "110.34.35.16"
+    )
+
+
+def test_proxied_leaves_lines_alone_without_proxy_or_https():
+    line = "deb https://download.docker.com/linux/ubuntu jammy stable"
+    plain = "deb http://archive.ubuntu.com/ubuntu jammy main"
+
+    assert proxied(line, None) == line
+    assert proxied(plain, "110.34.35.16") == plain
+
+
+class StandInProxy(http.server.BaseHTTPRequestHandler):
+    """
+    Forward HTTP proxy standing in for apt-cacher-ng: fetches absolute URLs from
+    the origin, keeping the bodies when `caching` is set.
+    """
+
+    caching = True
+    cache = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        body = self.cache.get(self.path)
+        if body is None:
+            direct = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+            with direct.open(self.path, timeout=30) as response:
+                body = response.read()
+            if self.caching:
+                self.cache[self.path] = body
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def proxy(monkeypatch):
+    for variable in ("no_proxy", "NO_PROXY", "http_proxy", "HTTP_PROXY"):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setattr(apt_proxy_check.StandInRepo, "served", {})
+    monkeypatch.setattr(StandInProxy, "cache", {})
+    monkeypatch.setattr(StandInProxy, "requests", [])
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInProxy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def run_check(monkeypatch, proxy_url):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["apt_proxy_check", "--proxy", proxy_url, "--wan-kbps", "200000"],
+    )
+    with pytest.raises(SystemExit) as result:
+        apt_proxy_check.main()
+    return result.value.code
+
+
+def test_check_passes_through_a_caching_proxy(monkeypatch, proxy, capsys):
+    assert run_check(monkeypatch, proxy) == 0
+
+    # Both hosts' fetches of both files went through the proxy
+    assert len(StandInProxy.requests) == 2 * len(apt_proxy_check.FILES)
+    assert set(apt_proxy_check.StandInRepo.served.values()) == {1}
+    assert "Cache OK" in capsys.readouterr().out
+
+
+def test_check_fails_when_the_proxy_does_not_cache(monkeypatch, proxy, capsys):
+    monkeypatch.setattr(StandInProxy, "caching", False)
+
+    assert run_check(monkeypatch, proxy) == 1
+
+    assert set(apt_proxy_check.StandInRepo.served.values()) == {2}
+    assert "Cache MISSED" in capsys.readouterr().out
@@ -0,0 +1,222 @@
+import json
+import shutil
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from pyinfra.connectors.local import LocalConnector
+
+from Operations.DockerEngineClient import (
+    API_VERSION,
+    DockerEngineClient,
+    DockerEngineError,
+    unix_socket,
+)
+
+CONTAINERS = [
+    {
+        "Id": "0123456789ab",
+        "Names": ["/SRV-SOD-0XX-AKIRA1"],
+        "Image": "p100x-app:latest",
+        "State": "running",
+        "Status": "Up 2 hours",
+        "Ports": [
+            {"IP": "0.0.0.0", "PrivatePort": 9595, "PublicPort": 9595, "Type": "tcp"}
+        ],
+        "Labels": {"akira.http-port": "9595"},
+    },
+    {
+        "Id": "ba9876543210",
+        "Names": ["/SRV-SOD-0XX-AKIRA2"],
+        "Image": "p100x-app:latest",
+        "State": "exited",
+        "Status": "Exited (0) 5 minutes ago",
+        "Ports": [{"PrivatePort": 9696, "Type": "tcp"}],
+        "Labels": None,
+    },
+]
+
+
+class EngineStub(BaseHTTPRequestHandler):
+    """Answers the few Engine API endpoints the client uses, keep-alive."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def address_string(self):
+        return "docker.sock"
+
+    def _reply(self, status, body=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self):
+        self.server.requests.append((self.command, self.path))
+        path = self.path.split("?")[0].removeprefix(f"/{API_VERSION}")
+        name = path.split("/")[2] if path.count("/") >= 2 else None
+        known = {container["Names"][0][1:] for container in CONTAINERS}
+
+        if path == "/_ping":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"OK")
+        elif path == "/containers/json":
+            self._reply(200, CONTAINERS)
+        elif name not in known:
+            self._reply(404, {"message": f"No such container: {name}"})
+        elif path.endswith("/json"):
+            self._reply(200, {"Name": f"/{name}", "State": {"Running": True}})
+        elif path.endswith("/stop") and name == "SRV-SOD-0XX-AKIRA2":
+            self._reply(304)
+        else:
+            self._reply(204)
+
+    do_GET = do_POST = do_DELETE = _handle
+
+
+class EngineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(path, EngineStub)
+        self.requests = []
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+@pytest.fixture
+def engine():
+    # Unix socket paths are limited to ~100 characters, keep it short
+    directory = tempfile.mkdtemp(prefix="engine")
+    server = EngineServer(str(Path(directory) / "docker.sock"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = DockerEngineClient(unix_socket(server.server_address, timeout=5))
+    yield client, server
+    client.close()
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(directory)
+
+
+def test_list_and_snapshot(engine):
+    client, server = engine
+
+    assert client.ping()
+    assert [c["Id"] for c in client.containers()] == ["0123456789ab", "ba9876543210"]
+    snapshot = client.container_snapshot()
+
+    assert snapshot["SRV-SOD-0XX-AKIRA1"] == {
+        "id": "0123456789ab",
+        "image": "p100x-app:latest",
+        "state": "running",
+        "status": "Up 2 hours",
+        "ports": "0.0.0.0:9595->9595/tcp",
+        "labels": {"akira.http-port": "9595"},
+    }
+    assert snapshot["SRV-SOD-0XX-AKIRA2"]["ports"] == "9696/tcp"
+    assert snapshot["SRV-SOD-0XX-AKIRA2"]["labels"] == {}
+    assert ("GET", f"/{API_VERSION}/containers/json?all=1") in server.requests
+
+
+def test_inspect_start_stop_remove(engine):
+    client, server = engine
+
+    assert client.inspect_container("SRV-SOD-0XX-AKIRA1")["State"]["Running"]
+    client.start("SRV-SOD-0XX-AKIRA2")
+    client.stop("SRV-SOD-0XX-AKIRA1", timeout=3)
+    # 304, already stopped, is not an error
+    client.stop("SRV-SOD-0XX-AKIRA2")
+    client.remove("SRV-SOD-0XX-AKIRA2")
+
+    prefix = f"/{API_VERSION}/containers"
+    assert server.requests == [
+        ("GET", f"{prefix}/SRV-SOD-0XX-AKIRA1/json"),
+        ("POST", f"{prefix}/SRV-SOD-0XX-AKIRA2/start"),
+        ("POST", f"{prefix}/SRV-SOD-0XX-AKIRA1/stop?t=3"),
+        ("POST", f"{prefix}/SRV-SOD-0XX-AKIRA2/stop?t=10"),
+        ("DELETE", f"{prefix}/SRV-SOD-0XX-AKIRA2?force=1"),
+    ]
+    # Every call went over the same keep-alive connection
+    assert server.connections == 1
+
+
+def test_error_status_raises(engine):
+    client, _ = engine
+
+    with pytest.raises(DockerEngineError) as error:
+        client.start("missing")
+
+    assert error.value.status == 404
+    assert error.value.message == "No such container: missing"
+    # The connection stays usable after an error
+    assert client.ping()
+
+
+class SSHConnector:
+    def __init__(self, client=None):
+        self.client = client
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(DockerEngineClient, "_pool", {})
+    return DockerEngineClient._pool
+
+
+def test_for_host_local_uses_the_local_socket(pool):
+    local = SimpleNamespace(
+        name="@local", connector=LocalConnector.__new__(LocalConnector)
+    )
+
+    client = DockerEngineClient.for_host(local)
+
+    assert DockerEngineClient.for_host(local) is client
+    assert pool == {"@local": client}
+
+
+def test_for_host_tunnels_over_ssh(pool):
+    commands = []
+
+    class Channel:
+        def exec_command(self, command):
+            commands.append(command)
+
+    transport = SimpleNamespace(open_session=Channel)
+    ssh_client = SimpleNamespace(get_transport=lambda: transport)
+    edge = SimpleNamespace(name="edge1", connector=SSHConnector(ssh_client))
+
+    client = DockerEngineClient.for_host(edge)
+    client.connection.connect()
+
+    assert commands == ["docker system dial-stdio"]
+    assert pool == {"edge1": client}
+
+
+@pytest.mark.parametrize(
+    "connector", [SSHConnector(client=None), SimpleNamespace()], ids=["ssh", "other"]
+)
+def test_for_host_without_ssh_connection_raises(pool, connector):
+    edge = SimpleNamespace(name="edge1", connector=connector)
+
+    with pytest.raises(RuntimeError, match="Docker daemon of edge1"):
+        DockerEngineClient.for_host(edge)
+
+    # Nothing pooled, a later call once connected gets the real tunnel
+    assert pool == {}
@@ -0,0 +1,73 @@
+import json
+from types import SimpleNamespace
+
+from Operations.FactCache import FactCache
+
+
+class Packages:
+    pass
+
+
+class Status:
+    pass
+
+
+TTLS = {"Packages": 3600, "Status": 600}
+
+
+def fleet_host(name):
+    return SimpleNamespace(name=name, data={})
+
+
+def gather(value):
+    return lambda: value
+
+
+def test_concurrent_saves_merge(tmp_path):
+    path = tmp_path / "facts.json"
+    first = FactCache(path, ttls=TTLS)
+    first.get(fleet_host("edge1"), Status, (), {}, gather({"docker": True}))
+    first.get(fleet_host("edge2"), Status, (), {}, gather({"docker": True}))
+    first.save()
+
+    # Two processes of the same rollout, both started from that file
+    wave_a = FactCache(path, ttls=TTLS)
+    wave_b = FactCache(path, ttls=TTLS)
+    wave_a.get(fleet_host("edge1"), Packages, (), {}, gather({"zstd": ["1.5"]}))
+    wave_a.invalidate("edge1", "Status")
+    wave_b.get(fleet_host("edge3"), Status, (), {}, gather({"docker": False}))
+    wave_a.save()
+    wave_b.save()
+
+    entries = json.loads(path.read_text())
+    hosts_facts = {tuple(key.split("|")[:2]) for key in entries}
+    assert hosts_facts == {
+        ("edge1", f"{__name__}.Packages"),
+        ("edge2", f"{__name__}.Status"),
+        ("edge3", f"{__name__}.Status"),
+    }
+    # The entry wave_a invalidated did not come back from wave_b's copy
+    assert (
+        FactCache(path, ttls=TTLS).get(
+            fleet_host("edge1"), Status, (), {}, gather("gathered again")
+        )
+        == "gathered again"
+    )
+
+
+def test_invalidated_then_gathered_again_is_kept(tmp_path):
+    path = tmp_path / "facts.json"
+    cache = FactCache(path, ttls=TTLS)
+    cache.get(fleet_host("edge1"), Status, (), {}, gather("before"))
+    cache.invalidate("edge1", "Status")
+    cache.get(fleet_host("edge1"), Status, (), {}, gather("after"))
+    cache.save()
+
+    reloaded = FactCache(path, ttls=TTLS)
+    assert reloaded.get(fleet_host("edge1"), Status, (), {}, gather("miss")) == "after"
+    assert reloaded.hits == 1
+    # Only facts.json and its lock file, no temporary file left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "facts.json",
+        "facts.json.lock",
+    ]
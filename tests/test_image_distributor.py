@@ -0,0 +1,234 @@
+import json
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from Operations import ImageDistributor as distributor_module
+from Operations.ImageDistributor import (
+    ImageDistributor,
+    bounded_parallel,
+    tree_schedule,
+)
+
+HOSTS = ["edge1", "edge2", "edge3"]
+
+
+class Recorder:
+    """Stands in for a pyinfra operations module, recording every call."""
+
+    def __init__(self, module, calls, changed=True):
+        self.module = module
+        self.calls = calls
+        self.changed = changed
+
+    def __getattr__(self, operation):
+        def record(**kwargs):
+            self.calls.append((f"{self.module}.{operation}", kwargs))
+            return SimpleNamespace(
+                did_change=lambda: self.changed, changed=self.changed
+            )
+
+        return record
+
+
+@pytest.fixture
+def operations(monkeypatch):
+    """Returns a function running deploy code as a host, giving its calls."""
+
+    def run_as(host_name, deploy, facts=None, changed=True):
+        calls = []
+        fleet_host = SimpleNamespace(
+            name=host_name,
+            get_fact=lambda fact, **kwargs: (facts or {}).get(fact.__name__),
+        )
+        monkeypatch.setattr(distributor_module, "host", fleet_host)
+        for module in ("files", "server", "python", "apt", "systemd", "docker"):
+            monkeypatch.setattr(
+                distributor_module, module, Recorder(module, calls, changed)
+            )
+        deploy()
+        return calls
+
+    return run_as
+
+
+def test_direct_fetches_the_tar_before_pushing_it(operations, tmp_path):
+    distributor = ImageDistributor(
+        "p100x-app:latest", HOSTS, source="edge1", workdir=str(tmp_path)
+    )
+
+    source = operations("edge1", lambda: distributor.distribute("direct"))
+    target = operations("edge2", lambda: distributor.distribute("direct"))
+
+    assert [name for name, _ in source] == [
+        "server.shell",
+        "files.get",
+        "files.file",
+        "python.call",
+    ]
+    save, fetch = source[0][1], source[1][1]
+    assert save["commands"] == [
+        f"docker save -o {distributor.tar_path} p100x-app:latest"
+    ]
+    assert fetch["src"] == distributor.tar_path
+
+    assert [name for name, _ in target] == ["files.put", "server.shell", "files.file"]
+    push = target[0][1]
+    # Pushes the very file fetched to the control node
+    assert push["src"] == fetch["dest"]
+    assert push["dest"] == distributor.tar_path
+    assert push["assume_exists"]
+    assert target[1][1]["commands"] == [f"docker load -i {distributor.tar_path}"]
+
+
+def test_direct_removes_the_control_node_copy(operations, tmp_path):
+    distributor = ImageDistributor(
+        "p100x-app:latest", HOSTS, source="edge1", workdir=str(tmp_path)
+    )
+    tar = tmp_path / distributor.tar_filename
+    tar.write_bytes(b"image")
+
+    source = operations("edge1", lambda: distributor.distribute("direct"))
+    source[-1][1]["function"]()
+
+    assert not tar.exists()
+
+
+def test_tree_schedule_doubles_holders():
+    rounds = tree_schedule("edge1", [f"edge{number}" for number in range(1, 9)])
+
+    assert len(rounds) == 3
+    assert rounds[0] == [("edge1", "edge2")]
+    assert [len(hops) for hops in rounds] == [1, 2, 4]
+
+
+def test_delta_ships_every_target_in_one_bounded_fan_out(operations, monkeypatch):
+    distributor = ImageDistributor(
+        "p100x-app:latest", HOSTS, source="edge1", delta_parallel=2
+    )
+    chains = {"edge2": ["sha256:a"], "edge3": []}
+    monkeypatch.setattr(
+        distributor_module,
+        "inventory",
+        SimpleNamespace(
+            get_host=lambda name: SimpleNamespace(get_fact=lambda fact: chains[name])
+        ),
+    )
+
+    assert operations("edge2", distributor.ship_delta) == []
+    calls = operations("edge1", distributor.ship_delta)
+
+    assert [name for name, _ in calls] == [
+        "files.put",
+        "server.shell",
+        "files.put",
+        "files.put",
+        "server.shell",
+        "server.shell",
+    ]
+    ship = calls[4][1]
+    assert ship["_shell_executable"] == "bash"
+    (script,) = ship["commands"]
+    assert sum(line.startswith("( ") for line in script.splitlines()) == 2
+    assert "edge2.chains" in script and "edge3.chains" in script
+
+
+def test_bounded_parallel_limits_and_fails(tmp_path):
+    log = tmp_path / "log"
+    commands = [
+        f"echo start >> {log} && sleep 0.2 && echo end >> {log}" for _ in range(5)
+    ]
+
+    def run(script):
+        return subprocess.run(["bash", "-c", script], capture_output=True)
+
+    assert run(bounded_parallel(commands, 2)).returncode == 0
+    running, most = 0, 0
+    for line in log.read_text().split():
+        running += 1 if line == "start" else -1
+        most = max(most, running)
+    assert most == 2
+
+    assert run(bounded_parallel(["true", "false", "true"], 2)).returncode == 1
+    assert run(bounded_parallel(["true", "true", "false"], 1)).returncode == 1
+
+
+NVIDIA_DAEMON_JSON = {
+    "runtimes": {"nvidia": {"path": "nvidia-container-runtime", "runtimeArgs": []}}
+}
+
+
+def test_trust_registry_keeps_daemon_json_and_restarts_on_change(operations):
+    distributor = ImageDistributor("p100x-app:latest", HOSTS, source="edge1")
+    daemon_json = json.dumps(NVIDIA_DAEMON_JSON, indent=2).splitlines()
+
+    calls = operations(
+        "edge2", distributor.trust_registry, facts={"FileContents": daemon_json}
+    )
+
+    assert [name for name, _ in calls] == ["files.put", "systemd.service"]
+    written = json.loads(calls[0][1]["src"].getvalue())
+    assert written == {**NVIDIA_DAEMON_JSON, "insecure-registries": ["edge1:5000"]}
+    assert calls[1][1]["_if"]()
+
+
+def test_trust_registry_does_not_restart_docker_unchanged(operations):
+    distributor = ImageDistributor("p100x-app:latest", HOSTS, source="edge1")
+    trusted = {**NVIDIA_DAEMON_JSON, "insecure-registries": ["edge1:5000"]}
+    untrusted_but_equal = json.dumps(NVIDIA_DAEMON_JSON).splitlines()
+
+    assert not operations(
+        "edge2",
+        distributor.trust_registry,
+        facts={"FileContents": json.dumps(trusted).splitlines()},
+    )
+    # daemon.json rewritten to the same content: the put reports no change
+    calls = operations(
+        "edge2",
+        distributor.trust_registry,
+        facts={"FileContents": untrusted_but_equal},
+        changed=False,
+    )
+    assert not calls[1][1]["_if"]()
+
+
+def test_registry_on_an_inventory_host(operations):
+    distributor = ImageDistributor(
+        "p100x-app:latest", HOSTS, source="edge1", registry_host="edge3"
+    )
+
+    assert not distributor.registry_on_control_node
+    assert operations("edge1", distributor.run_registry) == []
+    calls = operations(
+        "edge3", distributor.run_registry, facts={"DockerImageLayers": ["sha256:a"]}
+    )
+    assert [name for name, _ in calls] == ["docker.container"]
+    assert calls[0][1]["ports"] == ["5000:5000"]
+
+
+def test_registry_on_the_control_node(operations, monkeypatch):
+    distributor = ImageDistributor(
+        "p100x-app:latest", HOSTS, source="edge1", registry_host="10.0.0.5"
+    )
+    commands = []
+
+    def docker_cli(command, **kwargs):
+        commands.append(command[1:])
+        # No registry container yet, registry:2 loaded
+        returncode = 1 if command[1:3] == ["container", "inspect"] else 0
+        return subprocess.CompletedProcess(command, returncode, "", "")
+
+    monkeypatch.setattr(distributor_module.subprocess, "run", docker_cli)
+
+    assert distributor.registry_on_control_node
+    assert distributor.registry == "10.0.0.5:5000"
+    assert operations("edge2", distributor.run_registry) == []
+    calls = operations("edge1", distributor.run_registry)
+    assert [name for name, _ in calls] == ["python.call"]
+
+    calls[0][1]["function"]()
+
+    assert commands[-1][:3] == ["run", "-d", "--name"]
+    assert "5000:5000" in commands[-1]
+    assert commands[-1][-1] == "registry:2"
@@ -0,0 +1,209 @@
+import pytest
+
+from Operations.docker_facts import DockerContainerReservations
+from Operations.PlacementScheduler import (
+    GpuInventory,
+    MemoryInfo,
+    PlacementScheduler,
+    parse_nvidia_smi_csv,
+    parse_size,
+)
+
+GIB = 1024**3
+MIB = 1024**2
+
+# nvidia-smi --query-gpu=index,uuid,name,memory.total,memory.used,memory.free
+#   --format=csv
+NVIDIA_SMI_CSV = [
+    "index, uuid, name, memory.total [MiB], memory.used [MiB], memory.free [MiB]",
+    "0, GPU-5f1c0e4a-1b2c, NVIDIA A100 80GB PCIe, 81920 MiB, 20480 MiB, 61440 MiB",
+    "1, GPU-9d8e7f6a-3c4d, NVIDIA A100 80GB PCIe, 81920 MiB, 4 MiB, 81916 MiB",
+]
+
+# Same query with --format=csv,noheader,nounits, as GpuInventory runs it
+NVIDIA_SMI_NOUNITS = [
+    "0, GPU-5f1c0e4a-1b2c, NVIDIA A100 80GB PCIe, 81920, 20480, 61440",
+    "1, GPU-9d8e7f6a-3c4d, NVIDIA A100 80GB PCIe, [N/A], [N/A], [N/A]",
+]
+
+MEMINFO = [
+    "MemTotal:       131891608 kB",
+    "MemAvailable:    98304000 kB",
+]
+
+# docker inspect --format '{{.Name}} {{.HostConfig.Memory}} {{json ...}}'
+DOCKER_RESERVATIONS = [
+    '/SRV-SOD-0XX-AKIRA1 53687091200 [{"Driver":"","Count":-1,"DeviceIDs":null,'
+    '"Capabilities":[["gpu"]],"Options":{}}]',
+    '/SRV-SOD-0XX-AKIRA2 26843545600 [{"Driver":"","Count":0,'
+    '"DeviceIDs":["1"],"Capabilities":[["gpu"]],"Options":{}}]',
+    "/registry 0 null",
+]
+
+
+@pytest.mark.parametrize(
+    "value, size",
+    [
+        ("50g", 50 * GIB),
+        ("512m", 512 * MIB),
+        ("65536 kB", 65536 * 1024),
+        ("81920 MiB", 81920 * MIB),
+        (0, 0),
+    ],
+)
+def test_parse_size(value, size):
+    assert parse_size(value) == size
+
+
+def test_parse_nvidia_smi_csv_with_header_and_units():
+    gpus = parse_nvidia_smi_csv(NVIDIA_SMI_CSV)
+
+    assert gpus == [
+        {
+            "index": 0,
+            "uuid": "GPU-5f1c0e4a-1b2c",
+            "name": "NVIDIA A100 80GB PCIe",
+            "memory.total": 81920 * MIB,
+            "memory.used": 20480 * MIB,
+            "memory.free": 61440 * MIB,
+        },
+        {
+            "index": 1,
+            "uuid": "GPU-9d8e7f6a-3c4d",
+            "name": "NVIDIA A100 80GB PCIe",
+            "memory.total": 81920 * MIB,
+            "memory.used": 4 * MIB,
+            "memory.free": 81916 * MIB,
+        },
+    ]
+
+
+def test_gpu_inventory_without_units_or_values():
+    gpus = GpuInventory().process(NVIDIA_SMI_NOUNITS)
+
+    assert gpus[0]["memory.free"] == 61440 * MIB
+    # Unsupported queries read [N/A], counted as no memory
+    assert gpus[1]["memory.free"] == 0
+
+
+def test_memory_info():
+    assert MemoryInfo().process(MEMINFO) == {
+        "total": 131891608 * 1024,
+        "available": 98304000 * 1024,
+    }
+
+
+def test_docker_reservations():
+    reservations = DockerContainerReservations().process(DOCKER_RESERVATIONS)
+
+    assert reservations == {
+        "SRV-SOD-0XX-AKIRA1": {"memory": 50 * GIB, "gpus": "all"},
+        "SRV-SOD-0XX-AKIRA2": {"memory": 25 * GIB, "gpus": [1]},
+        "registry": {"memory": 0, "gpus": []},
+    }
+
+
+def node(total, available, gpus_free=(), reservations=None):
+    return {
+        "memory": {"total": total * GIB, "available": available * GIB},
+        "gpus": [
+            {"index": index, "uuid": f"GPU-{index}", "memory.free": free * GIB}
+            for index, free in enumerate(gpus_free)
+        ],
+        "reservations": reservations or {},
+    }
+
+
+def app(name, mem_ram, gpu_mem=None):
+    config = {"name": name, "mem_ram": mem_ram}
+    if gpu_mem:
+        config["gpu_mem"] = gpu_mem
+    return config
+
+
+def test_free_memory_counts_reservations_and_headroom():
+    scheduler = PlacementScheduler(
+        {
+            "reserved": node(
+                128, 120, [80], {"app": {"memory": 100 * GIB, "gpus": []}}
+            ),
+            "busy": node(128, 40, [80]),
+        },
+        headroom="4g",
+    )
+
+    # The larger of the --memory reservations and what the kernel has in use
+    assert scheduler.free_memory == {"reserved": 24 * GIB, "busy": 36 * GIB}
+
+
+def test_best_fit_decreasing():
+    scheduler = PlacementScheduler(
+        {
+            "large": node(132, 132, [80]),
+            "small": node(36, 36, [80]),
+        }
+    )
+
+    placements, unplaced = scheduler.place(
+        [app("akira-s", "10g"), app("akira-l", "100g"), app("akira-m", "20g")]
+    )
+
+    # Largest first, 100g only fits on large. 20g best fits the 28g left there
+    # over the 32g of small, and 10g no longer fitting on large goes to small.
+    assert [config["name"] for config in placements["large"]] == [
+        "akira-l",
+        "akira-m",
+    ]
+    assert [config["name"] for config in placements["small"]] == ["akira-s"]
+    assert unplaced == []
+    assert scheduler.free_memory == {"large": 8 * GIB, "small": 22 * GIB}
+
+
+def test_app_fitting_nowhere_is_left_unplaced():
+    scheduler = PlacementScheduler({"edge": node(68, 68, [16])})
+
+    placements, unplaced = scheduler.place(
+        [
+            app("too-much-ram", "80g"),
+            app("too-much-gpu", "8g", gpu_mem="24g"),
+            app("fits", "8g", gpu_mem="8g"),
+        ]
+    )
+
+    assert [config["name"] for config in unplaced] == [
+        "too-much-ram",
+        "too-much-gpu",
+    ]
+    assert placements == {"edge": [{**app("fits", "8g", "8g"), "gpu_device": 0}]}
+    # Nothing was reserved for the apps left out
+    assert scheduler.free_memory["edge"] == 56 * GIB
+    assert scheduler.gpus["edge"][0]["free"] == 8 * GIB
+
+
+def test_gpu_pinned_by_best_fit_on_gpu_memory():
+    scheduler = PlacementScheduler({"edge": node(132, 132, [40, 20])})
+
+    placements, _ = scheduler.place(
+        [app("needs-30", "8g", gpu_mem="30g"), app("needs-16", "4g", gpu_mem="16g")]
+    )
+
+    # 30g only fits GPU 0; 16g best fits GPU 1 (4g spare) over GPU 0 (10g spare)
+    assert [config["gpu_device"] for config in placements["edge"]] == [0, 1]
+
+
+def test_gpu_ties_go_to_the_gpu_serving_fewer_apps():
+    reservations = {
+        "everywhere": {"memory": 0, "gpus": "all"},
+        "pinned": {"memory": 0, "gpus": ["GPU-0"]},
+    }
+    scheduler = PlacementScheduler({"edge": node(132, 132, [40, 40], reservations)})
+
+    # --gpus all counts on both GPUs, the UUID pinned one on GPU 0 only
+    assert {index: gpu["apps"] for index, gpu in scheduler.gpus["edge"].items()} == {
+        0: 2,
+        1: 1,
+    }
+
+    placements, _ = scheduler.place([app("new", "8g")])
+
+    assert placements["edge"][0]["gpu_device"] == 1
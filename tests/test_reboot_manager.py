@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+from Operations import RebootManager as reboot_module
+from Operations.RebootManager import RebootManager, app_http_ports
+
+# docker ps --format '{{.Image}}|{{.Label "akira.http-port"}}|{{.Ports}}'
+RUNNING = [
+    "p100x-app:latest|9595|0.0.0.0:9595->9595/tcp, :::9595->9595/tcp",
+    # Created before the port label existed
+    "110.34.35.16:5000/p100x-app:2.0.0||0.0.0.0:9696->8080/tcp, :::9696->8080/tcp",
+    "registry:2||0.0.0.0:5000->5000/tcp",
+    "p100x-app:latest||",
+]
+
+
+def test_unlabelled_app_falls_back_to_published_ports():
+    assert app_http_ports(RUNNING) == [9595, 9696]
+
+
+def test_record_ports_waits_for_unlabelled_apps(monkeypatch):
+    commands = []
+
+    def run_shell_command(command, **kwargs):
+        commands.append(command)
+        return True, SimpleNamespace(stdout_lines=RUNNING)
+
+    monkeypatch.setattr(
+        reboot_module, "host", SimpleNamespace(run_shell_command=run_shell_command)
+    )
+    manager = RebootManager()
+
+    manager._record_ports()
+
+    assert manager.ports == [9595, 9696]
+    assert commands == [reboot_module.RUNNING_CONTAINERS]
+    # Ports given up front are kept, nothing is asked from Docker
+    fixed = RebootManager(ports=[8080])
+    fixed._record_ports()
+    assert fixed.ports == [8080] and len(commands) == 1
@@ -0,0 +1,193 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+AGENT_PATH = Path(__file__).parent.parent / "Resources/set_network_agent.py"
+spec = importlib.util.spec_from_file_location("set_network_agent", AGENT_PATH)
+agent_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(agent_module)
+
+NetworkAgent = agent_module.NetworkAgent
+
+
+def keyfile(name, connection_uuid, mac):
+    return (
+        "[connection]\n"
+        f"id={name}\n"
+        f"uuid={connection_uuid}\n"
+        "type=ethernet\n"
+        "\n"
+        "[ethernet]\n"
+        f"mac-address={mac.upper()}\n"
+    )
+
+
+def profile(name, connection_uuid, mac):
+    return {
+        "name": name,
+        "uuid": connection_uuid,
+        "mac": mac,
+        "file": f"{name}.nmconnection",
+        "content": keyfile(name, connection_uuid, mac),
+    }
+
+
+class FakeNmcli:
+    """
+    Answers the nmcli calls of the agent. Each device appears after a number of
+    `device show` polls, connections are (name, uuid, active) rows.
+    """
+
+    def __init__(self, devices=None, connections=None):
+        self.devices = devices or {}
+        self.connections = list(connections or [])
+        self.polls = 0
+        self.calls = []
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        if args[-2:] == ("device", "show"):
+            self.polls += 1
+            lines = []
+            for device, (mac, appears_after) in self.devices.items():
+                if self.polls > appears_after:
+                    escaped = mac.upper().replace(":", "\\:")
+                    lines += [f"GENERAL.DEVICE:{device}", f"GENERAL.HWADDR:{escaped}"]
+            return "\n".join(lines)
+        if args[-2:] == ("connection", "show"):
+            return "\n".join(
+                f"{name}:{connection_uuid}:{'yes' if active else 'no'}"
+                for name, connection_uuid, active in self.connections
+            )
+        return ""
+
+    def ups(self):
+        return [call for call in self.calls if call[:2] == ("connection", "up")]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_agent(profiles, nmcli, system_dir, clock):
+    return NetworkAgent(
+        profiles,
+        nmcli=nmcli,
+        system_dir=system_dir,
+        clock=clock,
+        sleep=clock.sleep,
+        since_boot=lambda: 42.0,
+    )
+
+
+def test_mac_appearing_after_polls_is_installed(tmp_path):
+    eth = profile("office", "uuid-1", "aa:bb:cc:00:00:01")
+    nmcli = FakeNmcli(devices={"eth1": ("aa:bb:cc:00:00:01", 3)})
+    clock = FakeClock()
+
+    assert make_agent([eth], nmcli, tmp_path, clock).run(timeout=60)
+
+    assert nmcli.polls == 4
+    # Backs off while nothing appears
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+    assert (tmp_path / "office.nmconnection").read_text() == eth["content"]
+    assert ("connection", "load", str(tmp_path / "office.nmconnection")) in (
+        nmcli.calls
+    )
+    assert nmcli.ups() == [("connection", "up", "uuid", "uuid-1")]
+
+
+def test_timeout_returns_false(tmp_path):
+    eth = profile("office", "uuid-1", "aa:bb:cc:00:00:01")
+    nmcli = FakeNmcli()
+    clock = FakeClock()
+
+    assert not make_agent([eth], nmcli, tmp_path, clock).run(timeout=30)
+
+    assert clock.now > 30
+    assert max(clock.sleeps) == 10.0
+    assert nmcli.ups() == []
+    assert not (tmp_path / "office.nmconnection").exists()
+
+
+def test_converged_host_is_left_alone(tmp_path):
+    eth = profile("office", "uuid-1", "aa:bb:cc:00:00:01")
+    (tmp_path / "office.nmconnection").write_text(eth["content"])
+    nmcli = FakeNmcli(
+        devices={"eth1": ("aa:bb:cc:00:00:01", 0)},
+        connections=[("office", "uuid-1", True)],
+    )
+    agent = make_agent([eth], nmcli, tmp_path, FakeClock())
+
+    agent.remove_stale({"office"})
+    assert agent.run(timeout=60)
+
+    # Only read NetworkManager's state, never touched it
+    assert {call[-1] for call in nmcli.calls} == {"show"}
+    assert agent.actions["unchanged"] == 1
+
+
+def test_inactive_profile_is_only_brought_up(tmp_path):
+    eth = profile("office", "uuid-1", "aa:bb:cc:00:00:01")
+    (tmp_path / "office.nmconnection").write_text(eth["content"])
+    nmcli = FakeNmcli(
+        devices={"eth1": ("aa:bb:cc:00:00:01", 0)},
+        connections=[("office", "uuid-1", False)],
+    )
+
+    assert make_agent([eth], nmcli, tmp_path, FakeClock()).run(timeout=60)
+
+    assert nmcli.ups() == [("connection", "up", "uuid", "uuid-1")]
+    assert not [call for call in nmcli.calls if call[1] == "load"]
+
+
+def test_stale_and_legacy_profiles_are_removed(tmp_path):
+    eth = profile("office", "uuid-1", "aa:bb:cc:00:00:01")
+    nmcli = FakeNmcli(
+        connections=[
+            ("office", "uuid-1", True),
+            ("lab", "uuid-2", True),
+            ("static-eno1", "uuid-3", False),
+            ("Wired connection 1", "uuid-4", True),
+        ]
+    )
+    agent = make_agent([eth], nmcli, tmp_path, FakeClock())
+
+    agent.remove_stale({"office", "lab"})
+
+    deleted = [call[-1] for call in nmcli.calls if call[1] == "delete"]
+    assert deleted == ["uuid-2", "uuid-3"]
+
+
+def test_select_local_skips_foreign_macs(tmp_path):
+    for device, mac in (("eth0", "AA:BB:CC:00:00:01"), ("lo", "00:00:00:00:00:00")):
+        (tmp_path / device).mkdir()
+        (tmp_path / device / "address").write_text(f"{mac}\n")
+    local = profile("office", "uuid-1", "aa:bb:cc:00:00:01")
+    foreign = profile("lab", "uuid-2", "aa:bb:cc:00:00:02")
+
+    macs = agent_module.local_macs(tmp_path)
+
+    assert "aa:bb:cc:00:00:01" in macs
+    assert agent_module.select_local([local, foreign], macs) == [local]
+
+
+@pytest.mark.parametrize(
+    "line, fields",
+    [
+        ("office:uuid-1:yes", ["office", "uuid-1", "yes"]),
+        ("AA\\:BB\\:CC", ["AA:BB:CC"]),
+    ],
+)
+def test_split_terse(line, fields):
+    assert agent_module.split_terse(line) == fields
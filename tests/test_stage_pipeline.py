@@ -0,0 +1,64 @@
+from Operations.StagePipeline import StagePipeline, load_stages
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def project(root):
+    """Two stages, `unit` importing a helper which uploads a resource."""
+    write(
+        root / "Operations/UnitSetup.py",
+        'UNIT = PROJECT_ROOT / "Resources/app.service"\n',
+    )
+    write(root / "Resources/app.service", "[Service]\nExecStart=/bin/app\n")
+    write(root / "Resources/other.service", "[Service]\n")
+    write(
+        root / "stages/unit.py",
+        "from Operations.UnitSetup import UNIT\n\nDEPENDS = []\n",
+    )
+    write(root / "stages/motd.py", "DEPENDS = []\n")
+    return load_stages(root / "stages", project_root=root)
+
+
+def run_stages(pipeline, host_name="edge1"):
+    """Runs the pipeline on a host, with stages that succeed, returning their names."""
+    ran = []
+
+    def run_stage(host_name, name, command):
+        ran.append(name)
+        return True, 0.1
+
+    pipeline._run_stage = run_stage
+    assert pipeline._run_host(host_name, ["pyinfra"])
+    return sorted(ran)
+
+
+def test_stage_inputs_follow_imports_and_resources(tmp_path):
+    stages = project(tmp_path)
+
+    assert stages["unit"]["inputs"] == [
+        str(tmp_path / "Operations/UnitSetup.py"),
+        str(tmp_path / "Resources/app.service"),
+    ]
+    assert stages["motd"]["inputs"] == []
+
+
+def test_changed_dependency_reruns_the_stage(tmp_path):
+    stages = project(tmp_path)
+    pipeline = StagePipeline(stages, ["edge1"], checkpoint_dir=tmp_path / "done")
+
+    assert run_stages(pipeline) == ["motd", "unit"]
+    assert run_stages(pipeline) == []
+
+    # An unrelated resource changing reruns nothing
+    write(tmp_path / "Resources/other.service", "[Service]\nType=oneshot\n")
+    assert run_stages(pipeline) == []
+
+    write(tmp_path / "Resources/app.service", "[Service]\nExecStart=/bin/app -v\n")
+    assert run_stages(pipeline) == ["unit"]
+
+    write(tmp_path / "Operations/UnitSetup.py", "UNIT = None\n")
+    assert run_stages(pipeline) == ["unit"]
+    assert set(pipeline.completed("edge1")) == {"motd", "unit"}